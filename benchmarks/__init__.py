@@ -0,0 +1 @@
+"""Offline benchmarks for the QA pipeline (no Gemini/Pinecone keys needed)."""
@@ -0,0 +1,124 @@
+"""
+Load benchmark: async QA pipeline vs thread-per-request.
+
+Runs the full four-stage graph against stubbed Gemini/Pinecone backends
+with fixed latencies, so the numbers only reflect how many questions the
+process can keep in flight.
+
+- threaded: each question holds a worker thread for its whole duration,
+  like the old synchronous /api/qa route on FastAPI's 40-thread pool.
+- async: questions go through the async /api/qa route on one event loop.
+
+Usage:
+    python -m benchmarks.concurrency --requests 200 --concurrency 200
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Benchmark the pipeline itself, not the caches (retrieval limits keep their defaults)
+os.environ.setdefault("ANSWER_CACHE_SIZE", "0")
+os.environ.setdefault("PLANNER_CACHE_SIZE", "0")
+os.environ.setdefault("PLANNER_FAST_PATH", "false")
+
+from benchmarks.stubs import install_stubs
+
+
+def make_questions(n: int) -> list[str]:
+    return [
+        f"How do vector databases compare to relational databases and how do they scale? (#{i})"
+        for i in range(n)
+    ]
+
+
+def summarize(name: str, latencies: list[float], wall: float) -> dict:
+    ordered = sorted(latencies)
+    return {
+        "mode": name,
+        "requests": len(latencies),
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(latencies) / wall, 2),
+        "p50_ms": round(statistics.median(ordered) * 1000, 1),
+        "p95_ms": round(ordered[int(0.95 * (len(ordered) - 1))] * 1000, 1),
+    }
+
+
+def run_threaded(questions: list[str], threads: int) -> dict:
+    """Old model: one worker thread blocked per in-flight question."""
+    from src.app.api import build_initial_state
+    from src.app.core.agents.graph import qa_graph
+    
+    def one(question: str) -> float:
+        start = time.perf_counter()
+        asyncio.run(qa_graph.ainvoke(build_initial_state(question)))
+        return time.perf_counter() - start
+    
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        latencies = list(pool.map(one, questions))
+    return summarize(f"threaded ({threads} threads)", latencies, time.perf_counter() - start)
+
+
+async def run_async(questions: list[str], concurrency: int) -> dict:
+    """New model: async /api/qa route on a single event loop."""
+    import httpx
+    from src.app.api import app
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(question: str) -> float:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/qa", json={"question": question})
+                response.raise_for_status()
+                return time.perf_counter() - start
+        
+        start = time.perf_counter()
+        latencies = await asyncio.gather(*(one(q) for q in questions))
+    
+    return summarize(f"async (concurrency {concurrency})", list(latencies), time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--threads", type=int, default=40, help="worker threads for the threaded baseline")
+    parser.add_argument("--llm-latency", type=float, default=1.0)
+    parser.add_argument("--search-latency", type=float, default=0.05)
+    args = parser.parse_args()
+    
+    install_stubs(llm_latency=args.llm_latency, search_latency=args.search_latency,
+                  embed_latency=args.search_latency)
+    questions = make_questions(args.requests)
+    
+    # The pipeline prints a lot; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = [
+            run_threaded(questions, args.threads),
+            asyncio.run(run_async(questions, args.concurrency)),
+        ]
+    
+    print(f"{'mode':<28}{'requests':>10}{'wall_s':>10}{'rps':>10}{'p50_ms':>10}{'p95_ms':>10}")
+    for r in results:
+        print(f"{r['mode']:<28}{r['requests']:>10}{r['wall_s']:>10}{r['throughput_rps']:>10}"
+              f"{r['p50_ms']:>10}{r['p95_ms']:>10}")
+    
+    speedup = results[1]["throughput_rps"] / results[0]["throughput_rps"]
+    print(f"\nAsync throughput gain: {speedup:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
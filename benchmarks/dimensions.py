@@ -0,0 +1,130 @@
+"""
+Retrieval benchmark: Matryoshka search dimension vs recall and latency.
+
+Builds a local vector index and runs the same queries with full-vector
+exact search (the ground truth) and with two-stage search over codes of
+each candidate dimension, rescored with the full vectors. Reports
+recall@k against the ground truth, both with rescoring (the default
+shortlist) and from the candidate stage alone, plus per-query latency
+and search memory per vector.
+
+Synthetic vectors mimic Matryoshka embeddings: clustered, with variance
+concentrated in the leading dimensions. Pass --index to benchmark the
+vectors of an existing local index (it is copied, not modified).
+
+Usage:
+    python -m benchmarks.dimensions --vectors 50000 --dims 64,128,256,768
+    python -m benchmarks.dimensions --index local_index --quantization none,int8
+"""
+
+import argparse
+import contextlib
+import io
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from src.app.core.retrieval.local_store import LocalVectorIndex
+
+
+def synthetic_vectors(n: int, dimension: int, queries: int, seed: int = 0):
+    """Clustered vectors whose per-dimension scale decays like a Matryoshka embedding."""
+    rng = np.random.default_rng(seed)
+    clusters = max(n // 100, 1)
+    centers = rng.standard_normal((clusters, dimension))
+    decay = 1 / np.sqrt(1 + np.arange(dimension) / 32)
+
+    def sample(count: int) -> np.ndarray:
+        points = centers[rng.integers(0, clusters, count)] + 0.8 * rng.standard_normal((count, dimension))
+        return (points * decay).astype(np.float32)
+
+    return sample(n), sample(queries)
+
+
+def index_vectors(path: str, queries: int, seed: int = 0):
+    """Vectors of an existing index; queries are perturbed stored vectors."""
+    source = LocalVectorIndex(path)
+    live = np.setdiff1d(np.arange(source.count), list(source.deleted_rows))
+    vectors = np.asarray(source.matrix())[live]
+
+    rng = np.random.default_rng(seed)
+    picks = vectors[rng.choice(len(vectors), queries, replace=len(vectors) < queries)]
+    noise = rng.standard_normal(picks.shape).astype(np.float32) * picks.std()
+    return vectors, picks + noise
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[int(fraction * (len(ordered) - 1))]
+
+
+def run_queries(index: LocalVectorIndex, queries: np.ndarray, k: int, **search_kwargs):
+    results = []
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        hits = index.search(query, k=k, mode="exact", **search_kwargs)
+        latencies.append(time.perf_counter() - start)
+        results.append({row for row, _ in hits})
+    return results, sorted(latencies)
+
+
+def recall(results: list, truth: list, k: int) -> float:
+    return statistics.mean(len(found & expected) / k for found, expected in zip(results, truth))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--vectors", type=int, default=20000, help="synthetic corpus size")
+    parser.add_argument("--dimension", type=int, default=768, help="synthetic full dimension")
+    parser.add_argument("--index", help="benchmark the vectors of this local index instead")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--dims", default="64,128,256,512", help="candidate search dimensions")
+    parser.add_argument("--quantization", default="none", help="comma-separated: none,int8,binary")
+    parser.add_argument("--rescore-factor", type=int, default=0, help="0: per-quantization default")
+    args = parser.parse_args()
+
+    if args.index:
+        vectors, queries = index_vectors(args.index, args.queries)
+    else:
+        vectors, queries = synthetic_vectors(args.vectors, args.dimension, args.queries)
+    dimension = vectors.shape[1]
+    dims = sorted({min(int(d), dimension) for d in args.dims.split(",")} | {dimension})
+
+    with tempfile.TemporaryDirectory() as tmp, contextlib.redirect_stdout(io.StringIO()):
+        index = LocalVectorIndex(tmp, dimension=dimension, model="benchmark")
+        ids = [f"v{i}" for i in range(len(vectors))]
+        index.add(ids, vectors, [""] * len(ids), [{}] * len(ids))
+
+        truth, latencies = run_queries(index, queries, args.k)
+        rows = [("full", "none", dimension, index.bytes_per_vector, 1.0, 1.0, latencies)]
+
+        for quantization in args.quantization.split(","):
+            for search_dimension in dims:
+                if search_dimension == dimension and quantization == "none":
+                    continue
+                index.encode(quantization, search_dimension)
+                candidates, _ = run_queries(index, queries, args.k, rescore_factor=1)
+                rescored, latencies = run_queries(index, queries, args.k,
+                                                  rescore_factor=args.rescore_factor)
+                rows.append((
+                    "two-stage", quantization, search_dimension, index.bytes_per_vector,
+                    recall(candidates, truth, args.k), recall(rescored, truth, args.k), latencies
+                ))
+
+    print(f"{len(vectors)} vectors x {dimension} dims, {len(queries)} queries, k={args.k}\n")
+    print(f"{'search':<11}{'codes':<8}{'dims':>6}{'bytes/vec':>11}{'recall@k':>10}"
+          f"{'rescored':>10}{'p50_ms':>9}{'p95_ms':>9}")
+    for mode, quantization, dims_used, size, stage_one, rescored, latencies in rows:
+        print(f"{mode:<11}{quantization:<8}{dims_used:>6}{size:>11}{stage_one:>10.3f}{rescored:>10.3f}"
+              f"{percentile(latencies, 0.5) * 1000:>9.2f}{percentile(latencies, 0.95) * 1000:>9.2f}")
+
+
+if __name__ == "__main__":
+    main()
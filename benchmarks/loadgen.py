@@ -0,0 +1,391 @@
+"""
+HTTP load generator: replay a question file against a running API.
+
+Reads questions lazily from a JSONL file (a "question" or "title" field per
+line) or a plain-text file (one question per line) and sends them to
+/api/qa, /api/qa/stream or both (alternating) with an asyncio HTTP client.
+
+Modes:
+- open:   fixed arrival rate (--rate requests/second), whether or not earlier
+          requests have finished; shows what a deployment does when traffic
+          arrives faster than it can answer. Latency is measured from each
+          request's scheduled send time, so delays in the generator itself
+          (a busy event loop, a slow client pool) count against the
+          latency instead of hiding it (coordinated omission)
+- closed: fixed concurrency (--concurrency workers, each sending its next
+          question as soon as the previous one is answered)
+
+Give several comma-separated rates (or concurrencies) to step the load up;
+each step runs for --duration seconds or --requests requests (whichever
+comes first), continuing through the file. Throughput flattening while
+p95 and errors climb marks the saturation point.
+
+The JSON report (--report) has one entry per step: achieved throughput,
+latency histograms and percentiles per endpoint (plus time to first token
+for the streaming endpoint), errors by kind with a sample message, and a
+per-second timeline.
+
+Usage:
+    python -m benchmarks.loadgen requests.jsonl --url http://localhost:8000 --mode open --rate 1,2,4,8 --duration 60
+    python -m benchmarks.loadgen requests.jsonl --mode closed --concurrency 1,4,16 --requests 100 --endpoint both
+"""
+
+import argparse
+import asyncio
+import itertools
+import json
+import math
+import random
+import time
+from typing import Iterator, Optional
+
+import httpx
+
+
+# Upper bounds (ms) of the latency histogram buckets
+HISTOGRAM_BOUNDS_MS = [50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000]
+
+ENDPOINTS = {"qa": "/api/qa", "stream": "/api/qa/stream"}
+
+
+def iter_questions(path: str, loop: bool = False) -> Iterator[str]:
+    """
+    Yield questions from a file one line at a time.
+    
+    Args:
+        path: JSONL ("question" or "title" field) or plain-text file
+        loop: Start over at the end of the file instead of stopping
+    """
+    while True:
+        found = False
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("{"):
+                    record = json.loads(line)
+                    line = (record.get("question") or record.get("title") or "").strip()
+                if line:
+                    found = True
+                    yield line
+        if not loop or not found:
+            return
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def histogram(latencies_ms: list) -> dict:
+    """Latency counts per bucket ("<=50", ..., ">60000") plus percentiles."""
+    counts = {f"<={bound}": 0 for bound in HISTOGRAM_BOUNDS_MS}
+    counts[f">{HISTOGRAM_BOUNDS_MS[-1]}"] = 0
+    for value in latencies_ms:
+        bound = next((b for b in HISTOGRAM_BOUNDS_MS if value <= b), None)
+        counts[f"<={bound}" if bound is not None else f">{HISTOGRAM_BOUNDS_MS[-1]}"] += 1
+    
+    if not latencies_ms:
+        return {"count": 0, "buckets_ms": counts}
+    
+    ordered = sorted(latencies_ms)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered), 1),
+        "min_ms": round(ordered[0], 1),
+        "p50_ms": round(percentile(ordered, 0.50), 1),
+        "p90_ms": round(percentile(ordered, 0.90), 1),
+        "p95_ms": round(percentile(ordered, 0.95), 1),
+        "p99_ms": round(percentile(ordered, 0.99), 1),
+        "max_ms": round(ordered[-1], 1),
+        "buckets_ms": counts
+    }
+
+
+class StepResults:
+    """Outcomes of one load step."""
+    
+    def __init__(self, mode: str, load: float):
+        self.mode = mode
+        self.load = load
+        self.started = time.perf_counter()
+        self.finished: Optional[float] = None
+        
+        self.sent = 0
+        self.dropped = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # Open mode: how far behind schedule requests were actually sent
+        self.max_send_lag_ms = 0.0
+        
+        self.latencies: dict = {}
+        self.first_token: list = []
+        self.errors: dict = {}
+        self.timeline: dict = {}
+    
+    def second(self) -> dict:
+        index = int(time.perf_counter() - self.started)
+        return self.timeline.setdefault(index, {"sent": 0, "ok": 0, "errors": 0, "latencies": []})
+    
+    def record_ok(self, endpoint: str, latency_ms: float, first_token_ms: Optional[float]):
+        self.latencies.setdefault(endpoint, []).append(latency_ms)
+        if first_token_ms is not None:
+            self.first_token.append(first_token_ms)
+        slot = self.second()
+        slot["ok"] += 1
+        slot["latencies"].append(latency_ms)
+    
+    def record_error(self, endpoint: str, kind: str, message: str):
+        entry = self.errors.setdefault(kind, {"count": 0, "endpoints": {}, "sample": message[:300]})
+        entry["count"] += 1
+        entry["endpoints"][endpoint] = entry["endpoints"].get(endpoint, 0) + 1
+        self.second()["errors"] += 1
+    
+    def report(self) -> dict:
+        wall = (self.finished or time.perf_counter()) - self.started
+        ok = sum(len(values) for values in self.latencies.values())
+        errors = sum(entry["count"] for entry in self.errors.values())
+        
+        timeline = []
+        for index in range(max(self.timeline, default=-1) + 1):
+            slot = self.timeline.get(index, {"sent": 0, "ok": 0, "errors": 0, "latencies": []})
+            ordered = sorted(slot["latencies"])
+            timeline.append({
+                "second": index,
+                "sent": slot["sent"],
+                "ok": slot["ok"],
+                "errors": slot["errors"],
+                "p50_ms": round(percentile(ordered, 0.5), 1) if ordered else None
+            })
+        
+        return {
+            "mode": self.mode,
+            "offered_rate_rps" if self.mode == "open" else "concurrency": self.load,
+            "wall_s": round(wall, 3),
+            "sent": self.sent,
+            "ok": ok,
+            "errors": errors,
+            "dropped": self.dropped,
+            "error_rate": round(errors / self.sent, 4) if self.sent else 0.0,
+            "throughput_rps": round(ok / wall, 3) if wall else 0.0,
+            "max_in_flight": self.max_in_flight,
+            "max_send_lag_ms": round(self.max_send_lag_ms, 1),
+            "latency": {endpoint: histogram(values) for endpoint, values in self.latencies.items()},
+            "first_token": histogram(self.first_token) if self.first_token else None,
+            "errors_by_kind": self.errors,
+            "timeline": timeline
+        }
+
+
+class StreamError(Exception):
+    """The streaming endpoint reported an error event."""
+
+
+async def send_qa(client: httpx.AsyncClient, question: str) -> Optional[float]:
+    response = await client.post(ENDPOINTS["qa"], json={"question": question})
+    response.raise_for_status()
+    response.json()
+    return None
+
+
+async def send_stream(client: httpx.AsyncClient, question: str, start: float) -> Optional[float]:
+    """Consume one SSE response; returns the time to the first answer token (ms)."""
+    first_token_ms = None
+    event = None
+    async with client.stream("POST", ENDPOINTS["stream"], json={"question": question}) as response:
+        if response.is_error:
+            # Read the body so the error report can include it
+            await response.aread()
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if line.startswith("event: "):
+                event = line[7:]
+                if event in ("token", "answer") and first_token_ms is None:
+                    first_token_ms = (time.perf_counter() - start) * 1000
+            elif line.startswith("data: ") and event == "error":
+                raise StreamError(json.loads(line[6:]).get("detail", "error event"))
+    return first_token_ms
+
+
+async def send_one(client: httpx.AsyncClient, endpoint: str, question: str, results: StepResults,
+                   scheduled: Optional[float] = None):
+    """
+    Send one question and record its outcome.
+    
+    Args:
+        scheduled: Open mode: when the request was due; latency (and time to
+            first token) are measured from it rather than from the actual send
+    """
+    results.sent += 1
+    results.second()["sent"] += 1
+    results.in_flight += 1
+    results.max_in_flight = max(results.max_in_flight, results.in_flight)
+    
+    start = time.perf_counter()
+    if scheduled is not None:
+        results.max_send_lag_ms = max(results.max_send_lag_ms, (start - scheduled) * 1000)
+        start = min(start, scheduled)
+    try:
+        if endpoint == "stream":
+            first_token_ms = await send_stream(client, question, start)
+        else:
+            first_token_ms = await send_qa(client, question)
+        results.record_ok(endpoint, (time.perf_counter() - start) * 1000, first_token_ms)
+    except httpx.HTTPStatusError as e:
+        results.record_error(endpoint, f"http_{e.response.status_code}", e.response.text or str(e))
+    except StreamError as e:
+        results.record_error(endpoint, "stream_error", str(e))
+    except Exception as e:
+        results.record_error(endpoint, type(e).__name__, str(e) or repr(e))
+    finally:
+        results.in_flight -= 1
+
+
+def endpoint_cycle(choice: str) -> Iterator[str]:
+    return itertools.cycle(["qa", "stream"]) if choice == "both" else itertools.repeat(choice)
+
+
+async def run_open_step(client, questions, endpoints, rate: float, args, rng) -> StepResults:
+    """Send at a fixed arrival rate until the step's duration or request count is reached."""
+    results = StepResults("open", rate)
+    deadline = results.started + args.duration if args.duration else math.inf
+    tasks = set()
+    next_send = time.perf_counter()
+    
+    for _ in (range(args.requests) if args.requests else itertools.count()):
+        if next_send >= deadline:
+            break
+        question = next(questions, None)
+        if question is None:
+            break
+        
+        delay = next_send - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        
+        # Poisson arrivals have exponential gaps; uniform ones a constant gap
+        scheduled = next_send
+        gap = rng.expovariate(rate) if args.arrival == "poisson" else 1 / rate
+        next_send += gap
+        
+        if args.max_in_flight and results.in_flight >= args.max_in_flight:
+            results.dropped += 1
+            continue
+        
+        task = asyncio.create_task(
+            send_one(client, next(endpoints), question, results, scheduled=scheduled)
+        )
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+    
+    if tasks:
+        await asyncio.wait(tasks)
+    results.finished = time.perf_counter()
+    return results
+
+
+async def run_closed_step(client, questions, endpoints, concurrency: int, args) -> StepResults:
+    """Keep `concurrency` requests in flight until the step's duration or request count is reached."""
+    results = StepResults("closed", concurrency)
+    deadline = results.started + args.duration if args.duration else math.inf
+    budget = iter(range(args.requests)) if args.requests else itertools.count()
+    
+    async def worker():
+        while time.perf_counter() < deadline and next(budget, None) is not None:
+            question = next(questions, None)
+            if question is None:
+                return
+            await send_one(client, next(endpoints), question, results)
+    
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    results.finished = time.perf_counter()
+    return results
+
+
+def print_step(step: dict):
+    load = (f"{step['offered_rate_rps']} req/s offered" if step["mode"] == "open"
+            else f"concurrency {step['concurrency']}")
+    print(f"\n[{step['mode']}] {load}: {step['sent']} sent, {step['ok']} ok, {step['errors']} errors, "
+          f"{step['dropped']} dropped in {step['wall_s']} s -> {step['throughput_rps']} req/s "
+          f"(max in flight {step['max_in_flight']})")
+    if step["mode"] == "open":
+        # Latencies already include this; a large lag means the generator could not keep up
+        print(f"   sent up to {step['max_send_lag_ms']} ms behind schedule")
+    for endpoint, latency in step["latency"].items():
+        print(f"   {endpoint:<7} p50 {latency['p50_ms']} ms  p95 {latency['p95_ms']} ms  "
+              f"p99 {latency['p99_ms']} ms  max {latency['max_ms']} ms")
+    if step["first_token"]:
+        print(f"   first token p50 {step['first_token']['p50_ms']} ms  p95 {step['first_token']['p95_ms']} ms")
+    for kind, entry in step["errors_by_kind"].items():
+        print(f"   {kind}: {entry['count']} ({entry['sample'][:80]})")
+
+
+async def run(args) -> dict:
+    questions = iter_questions(args.file, loop=args.loop)
+    endpoints = endpoint_cycle(args.endpoint)
+    rng = random.Random(args.seed)
+    
+    loads = args.rate if args.mode == "open" else args.concurrency
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=args.max_keepalive)
+    
+    steps = []
+    async with httpx.AsyncClient(base_url=args.url, timeout=args.timeout, limits=limits) as client:
+        for load in loads:
+            if args.mode == "open":
+                results = await run_open_step(client, questions, endpoints, load, args, rng)
+            else:
+                results = await run_closed_step(client, questions, endpoints, int(load), args)
+            
+            step = results.report()
+            steps.append(step)
+            print_step(step)
+            
+            if results.sent == 0:
+                print("\nQuestion file exhausted (use --loop to replay it)")
+                break
+    
+    return {
+        "url": args.url,
+        "file": args.file,
+        "mode": args.mode,
+        "endpoint": args.endpoint,
+        "arrival": args.arrival if args.mode == "open" else None,
+        "duration_s": args.duration,
+        "requests_per_step": args.requests,
+        "steps": steps
+    }
+
+
+def parse_loads(text: str) -> list[float]:
+    return [float(value) for value in text.split(",") if value.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file", help="JSONL (question/title fields) or text file of questions")
+    parser.add_argument("--url", default="http://localhost:8000", help="API base URL")
+    parser.add_argument("--endpoint", choices=["qa", "stream", "both"], default="qa")
+    parser.add_argument("--mode", choices=["open", "closed"], default="closed")
+    parser.add_argument("--rate", type=parse_loads, default=[1.0], help="open: requests/second per step, e.g. 1,2,4")
+    parser.add_argument("--arrival", choices=["uniform", "poisson"], default="uniform", help="open: arrival spacing")
+    parser.add_argument("--max-in-flight", type=int, default=0, help="open: drop arrivals beyond this (0: never)")
+    parser.add_argument("--concurrency", type=parse_loads, default=[4.0], help="closed: workers per step, e.g. 1,4,16")
+    parser.add_argument("--duration", type=float, default=0, help="seconds per step (0: no limit)")
+    parser.add_argument("--requests", type=int, default=0, help="requests per step (0: no limit)")
+    parser.add_argument("--loop", action="store_true", help="replay the file from the start when it runs out")
+    parser.add_argument("--timeout", type=float, default=120, help="per-request timeout in seconds")
+    parser.add_argument("--max-keepalive", type=int, default=100, help="idle connections kept open")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the Poisson arrivals")
+    parser.add_argument("--report", default="loadgen_report.json", help="JSON report path")
+    args = parser.parse_args()
+    
+    if not args.duration and not args.requests and args.loop:
+        parser.error("--loop needs --duration or --requests to end each step")
+    
+    report = asyncio.run(run(args))
+    
+    with open(args.report, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nReport written to {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,243 @@
+"""
+Offline pipeline benchmark: throughput, per-stage latency and memory.
+
+Drives the QA pipeline with deterministic stand-ins for Gemini and
+Pinecone (see stubs.py), so it runs on any machine without API keys:
+
+- graph: qa_graph.ainvoke() directly, each run traced like a request
+- app:   the FastAPI /api/qa route in process (ASGI transport, debug=true)
+
+Questions come from a workload file (--workload), one JSON object per line
+with a "question" (or "title") field, or one question per plain-text line;
+without one, a built-in mix of simple and multi-part questions is used.
+The workload is repeated or cut to --requests questions.
+
+Reports throughput, p50/p95/p99 of the end-to-end latency and of every
+stage (from the per-request traces of metrics.py), LLM tokens, and memory:
+peak RSS of the process and, with --trace-memory, the peak Python heap.
+
+Usage:
+    python -m benchmarks.pipeline --requests 500 --concurrency 50
+    python -m benchmarks.pipeline --target app --workload requests.jsonl --json report.json
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+DEFAULT_QUESTIONS = [
+    "What is a vector database?",
+    "How do vector databases compare to relational databases and how do they scale?",
+    "Explain approximate nearest neighbour search",
+    "What are the pros and cons of HNSW versus IVF indexes?",
+    "How are embeddings stored?",
+    "Compare cosine similarity and dot product scoring, and when should each be used?",
+]
+
+
+def load_workload(path: str = None) -> list[str]:
+    """Questions from a JSONL or plain-text file (built-in questions without one)."""
+    if not path:
+        return list(DEFAULT_QUESTIONS)
+    
+    questions = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                record = json.loads(line)
+                line = record.get("question") or record.get("title") or record.get("body") or ""
+            if line:
+                questions.append(line)
+    
+    if not questions:
+        raise SystemExit(f"No questions in {path}")
+    return questions
+
+
+def percentile(ordered: list, fraction: float) -> float:
+    return ordered[min(len(ordered) - 1, int(round(fraction * (len(ordered) - 1))))]
+
+
+def latency_summary(values: list) -> dict:
+    ordered = sorted(values)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(sum(ordered) / len(ordered) * 1000, 2),
+        "p50_ms": round(percentile(ordered, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(ordered, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(ordered, 0.99) * 1000, 2),
+    }
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+async def run_graph(questions: list[str], concurrency: int) -> list[dict]:
+    """Invoke the compiled graph directly; returns one trace per question."""
+    from src.app.api import build_initial_state
+    from src.app.core.agents.graph import qa_graph
+    from src.app.core.metrics import track_request
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def one(question: str) -> dict:
+        async with semaphore:
+            with track_request("benchmark") as trace:
+                await qa_graph.ainvoke(build_initial_state(question))
+            return trace.to_dict()
+    
+    return await asyncio.gather(*(one(q) for q in questions))
+
+
+async def run_app(questions: list[str], concurrency: int) -> list[dict]:
+    """POST every question to the in-process app; returns one trace per question."""
+    import httpx
+    from src.app.api import app
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    transport = httpx.ASGITransport(app=app)
+    
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        async def one(question: str) -> dict:
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.post("/api/qa", json={"question": question, "debug": True})
+                response.raise_for_status()
+                trace = response.json()["debug"]
+                # Include HTTP handling and serialization in the end-to-end time
+                trace["total_seconds"] = time.perf_counter() - start
+                return trace
+        
+        return await asyncio.gather(*(one(q) for q in questions))
+
+
+STAGE_ORDER = ["answer_cache", "planning", "retrieval", "summarization", "verification"]
+
+
+def build_report(traces: list[dict], wall: float, args) -> dict:
+    stages = {}
+    for trace in traces:
+        for stage, seconds in trace["stages"].items():
+            stages.setdefault(stage, []).append(seconds)
+    stages = dict(sorted(
+        stages.items(),
+        key=lambda item: STAGE_ORDER.index(item[0]) if item[0] in STAGE_ORDER else len(STAGE_ORDER)
+    ))
+    
+    tokens = {"prompt": 0, "completion": 0}
+    for trace in traces:
+        for usage in trace["llm"].values():
+            tokens["prompt"] += usage["prompt_tokens"]
+            tokens["completion"] += usage["completion_tokens"]
+    
+    return {
+        "target": args.target,
+        "requests": len(traces),
+        "concurrency": args.concurrency,
+        "workload": args.workload or "built-in",
+        "stub_latency_s": {"llm": args.llm_latency, "llm_jitter": args.llm_jitter,
+                           "search": args.search_latency, "embed": args.embed_latency},
+        "wall_s": round(wall, 3),
+        "throughput_rps": round(len(traces) / wall, 2),
+        "latency": latency_summary([trace["total_seconds"] for trace in traces]),
+        # Stages a request skipped (fast path, verification policy) are not counted
+        "stages": {stage: latency_summary(values) for stage, values in stages.items()},
+        "llm_tokens": tokens,
+        "memory": {"peak_rss_mb": peak_rss_mb()},
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['requests']} requests via {report['target']}, concurrency {report['concurrency']}, "
+          f"workload: {report['workload']}")
+    print(f"wall {report['wall_s']} s, throughput {report['throughput_rps']} req/s\n")
+    
+    print(f"{'stage':<16}{'count':>8}{'mean_ms':>10}{'p50_ms':>10}{'p95_ms':>10}{'p99_ms':>10}")
+    rows = [("end-to-end", report["latency"])] + list(report["stages"].items())
+    for name, row in rows:
+        print(f"{name:<16}{row['count']:>8}{row['mean_ms']:>10}{row['p50_ms']:>10}"
+              f"{row['p95_ms']:>10}{row['p99_ms']:>10}")
+    
+    tokens = report["llm_tokens"]
+    print(f"\nLLM tokens: {tokens['prompt']} prompt, {tokens['completion']} completion")
+    memory = report["memory"]
+    line = f"Memory: peak RSS {memory['peak_rss_mb']} MB"
+    if "python_heap_peak_mb" in memory:
+        line += f", peak Python heap {memory['python_heap_peak_mb']} MB"
+    print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--target", choices=["graph", "app"], default="graph")
+    parser.add_argument("--requests", type=int, default=200, help="0: run the workload once")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--workload", help="JSONL (question/title fields) or text file of questions")
+    parser.add_argument("--llm-latency", type=float, default=0.2)
+    parser.add_argument("--llm-jitter", type=float, default=0.0, help="extra chat latency, up to this much")
+    parser.add_argument("--search-latency", type=float, default=0.02)
+    parser.add_argument("--embed-latency", type=float, default=0.02)
+    parser.add_argument("--docs", type=int, default=2000, help="chunks in the in-memory vector store")
+    parser.add_argument("--caches", action="store_true", help="keep the answer/planner caches on")
+    parser.add_argument("--trace-memory", action="store_true", help="track the Python heap (slower)")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args()
+    
+    # Measure the pipeline itself unless the caches are asked for
+    # (settings are read at import time, so set them before importing the app)
+    if not args.caches:
+        os.environ.setdefault("ANSWER_CACHE_SIZE", "0")
+        os.environ.setdefault("PLANNER_CACHE_SIZE", "0")
+    os.environ.setdefault("WARM_UP_ON_STARTUP", "false")
+    
+    from benchmarks.stubs import install_stubs
+    
+    install_stubs(llm_latency=args.llm_latency, search_latency=args.search_latency,
+                  embed_latency=args.embed_latency, llm_jitter=args.llm_jitter, num_docs=args.docs)
+    
+    workload = load_workload(args.workload)
+    count = args.requests or len(workload)
+    questions = [workload[i % len(workload)] for i in range(count)]
+    
+    runner = run_graph if args.target == "graph" else run_app
+    
+    if args.trace_memory:
+        tracemalloc.start()
+    
+    # The pipeline prints a lot; keep the report readable
+    with contextlib.redirect_stdout(io.StringIO()):
+        start = time.perf_counter()
+        traces = asyncio.run(runner(questions, args.concurrency))
+        wall = time.perf_counter() - start
+    
+    report = build_report(traces, wall, args)
+    if args.trace_memory:
+        report["memory"]["python_heap_peak_mb"] = round(tracemalloc.get_traced_memory()[1] / 2 ** 20, 1)
+        tracemalloc.stop()
+    
+    print_report(report)
+    
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""
+Deterministic local stand-ins for Gemini and Pinecone.
+
+install_stubs() installs the fakes into the lazily created clients
+(the vector store and the Gemini chat models in agents.py) before their
+first use, so no Pinecone or Gemini client is ever built.
+"""
+
+import asyncio
+import hashlib
+import os
+import time
+from typing import Any, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.callbacks import (
+    AsyncCallbackManagerForLLMRun,
+    CallbackManagerForLLMRun,
+)
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+from src.app.core.retrieval.base import VectorStoreBackend
+
+
+PLANNER_OUTPUT = """PLAN:
+Search for the core definition, then for the comparison and scalability aspects.
+
+SUB_QUESTIONS:
+- vector database definition
+- vector database vs relational database
+- vector database scalability architecture
+"""
+
+ANSWER_OUTPUT = (
+    "Vector databases store embeddings and answer similarity queries with "
+    "approximate nearest neighbour indexes, which lets them scale horizontally."
+)
+
+
+def stable_fraction(text: str) -> float:
+    """Deterministic value in [0, 1) derived from text."""
+    return int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little") / 2 ** 64
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model that sleeps and returns canned text.
+    
+    Each call takes latency seconds plus up to `jitter` seconds derived from
+    the prompt, so a given workload always produces the same latencies.
+    Responses carry usage metadata (about 4 characters per token) like
+    Gemini's, so token metrics are populated.
+    """
+    
+    response: str = ANSWER_OUTPUT
+    latency: float = 0.0
+    jitter: float = 0.0
+    model: str = "fake-chat"
+    
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+    
+    def _delay(self, messages: List[BaseMessage]) -> float:
+        if not self.jitter:
+            return self.latency
+        return self.latency + self.jitter * stable_fraction(str(messages[-1].content))
+    
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt_tokens = max(1, sum(len(str(message.content)) for message in messages) // 4)
+        completion_tokens = max(1, len(self.response) // 4)
+        message = AIMessage(
+            content=self.response,
+            usage_metadata={
+                "input_tokens": prompt_tokens,
+                "output_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens
+            }
+        )
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None,
+                  **kwargs: Any) -> ChatResult:
+        time.sleep(self._delay(messages))
+        return self._result(messages)
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+                         **kwargs: Any) -> ChatResult:
+        await asyncio.sleep(self._delay(messages))
+        return self._result(messages)
+
+
+class FakeEmbeddings(Embeddings):
+    """Deterministic hash-seeded unit vectors."""
+    
+    def __init__(self, dimension: int = 768, latency: float = 0.0):
+        self.dimension = dimension
+        self.latency = latency
+    
+    def _vector(self, text: str) -> List[float]:
+        seed = int(stable_fraction(text) * 2 ** 63)
+        vector = np.random.default_rng(seed).standard_normal(self.dimension).astype(np.float32)
+        return (vector / np.linalg.norm(vector)).tolist()
+    
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        time.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+    
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        return self.embed_documents([text])[0]
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents(texts)
+    
+    async def aembed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        await asyncio.sleep(self.latency)
+        return [self._vector(text) for text in texts]
+    
+    async def aembed_query(self, text: str, **kwargs) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+    
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        return await self.aembed_documents(texts)
+
+
+class FakeVectorStoreManager(VectorStoreBackend):
+    """In-memory exact-search stand-in for PineconeVectorStoreManager."""
+    
+    def __init__(self, num_docs: int = 200, dimension: int = 768,
+                 search_latency: float = 0.0, embed_latency: float = 0.0):
+        self.index_name = "fake-index"
+        self.search_latency = search_latency
+        self.embeddings = FakeEmbeddings(dimension, embed_latency)
+        
+        self.documents = [
+            Document(
+                id=f"doc_{i}",
+                page_content=f"Chunk {i}: vector databases, indexing and scalability notes. " * 8,
+                metadata={"page": i // 4, "source": "fake.pdf"}
+            )
+            for i in range(num_docs)
+        ]
+        self.matrix = np.asarray(
+            self.embeddings.embed_documents([doc.page_content + str(i) for i, doc in enumerate(self.documents)]),
+            dtype=np.float32
+        )
+    
+    def _top_k(self, embedding: List[float], k: int) -> List[Tuple[Document, float]]:
+        scores = self.matrix @ np.asarray(embedding, dtype=np.float32)
+        top = np.argsort(-scores)[:k]
+        return [(self.documents[i], float(scores[i])) for i in top]
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        return self.embeddings.embed_queries(queries)
+    
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        return await self.embeddings.aembed_queries(queries)
+    
+    def search_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        time.sleep(self.search_latency)
+        return self._top_k(embedding, k)
+    
+    async def asearch_by_vector_with_score(self, embedding: List[float], k: int = 4) -> List[Tuple[Document, float]]:
+        await asyncio.sleep(self.search_latency)
+        return self._top_k(embedding, k)
+    
+    def add_documents(self, documents: List[Document], save_keyword_index: bool = True):
+        vectors = np.asarray(
+            self.embeddings.embed_documents([doc.page_content for doc in documents]),
+            dtype=np.float32
+        )
+        self.documents.extend(documents)
+        self.matrix = np.vstack([self.matrix, vectors])
+    
+    def delete_documents(self, ids: List[str], save_keyword_index: bool = True):
+        keep = [i for i, doc in enumerate(self.documents) if doc.id not in set(ids)]
+        self.documents = [self.documents[i] for i in keep]
+        self.matrix = self.matrix[keep]
+    
+    def stats(self) -> dict:
+        return {"backend": "fake", "index_name": self.index_name, "total_vectors": len(self.documents)}
+
+
+def install_stubs(llm_latency: float = 0.2, search_latency: float = 0.05,
+                  embed_latency: float = 0.05, llm_jitter: float = 0.0,
+                  num_docs: int = 200) -> FakeVectorStoreManager:
+    """
+    Replace Gemini and Pinecone with local fakes.
+    
+    Args:
+        llm_latency: Seconds per chat model call
+        search_latency: Seconds per vector search
+        embed_latency: Seconds per embedding call
+        llm_jitter: Extra chat latency, up to this many seconds (deterministic per prompt)
+        num_docs: Chunks in the in-memory vector store
+    
+    Returns:
+        The fake vector store manager
+    """
+    os.environ.setdefault("GOOGLE_API_KEY", "offline-benchmark")
+    
+    manager = FakeVectorStoreManager(
+        num_docs=num_docs,
+        search_latency=search_latency,
+        embed_latency=embed_latency
+    )
+    
+    from src.app.core.retrieval.vector_store import vector_store_manager
+    vector_store_manager.set(manager)
+    
+    from src.app.core.agents import agents
+    for lazy, response in (
+        (agents.planner_llm, PLANNER_OUTPUT),
+        (agents.summarization_llm, ANSWER_OUTPUT),
+        (agents.verification_llm, ANSWER_OUTPUT)
+    ):
+        lazy.set(FakeChatModel(response=response, latency=llm_latency, jitter=llm_jitter))
+    
+    return manager
@@ -4,6 +4,9 @@ from pinecone import Pinecone
 from dotenv import load_dotenv
 import os
 
+from src.app.core.retrieval.bm25 import get_bm25_index
+from src.app.core.retrieval.manifest import index_manifest, pinecone_target
+
 load_dotenv()
 
 def clear_index():
@@ -31,6 +34,12 @@ def clear_index():
         # Delete all vectors
         index.delete(delete_all=True)
         
+        # Forget what was indexed so the next run re-embeds every file,
+        # and drop the keyword index so BM25 stops returning deleted chunks
+        target = pinecone_target(index_name)
+        index_manifest.clear(target)
+        get_bm25_index(target).clear()
+        
         print(f"✅ Index cleared!")
         print(f"\nRun setup_pinecone.py to add new documents.\n")
         
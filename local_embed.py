@@ -10,7 +10,10 @@ import os
 import sys
 import time
 import math
+import queue
 import hashlib
+import itertools
+import threading
 from typing import List
 
 from dotenv import load_dotenv
@@ -19,6 +22,18 @@ from sentence_transformers import SentenceTransformer
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
+from src.app.core.retrieval.ingestion import (
+    PARSE_WORKERS,
+    iter_parsed_pdfs,
+    resolve_pdf_paths,
+)
+from src.app.core.retrieval.manifest import (
+    chunk_id,
+    index_manifest,
+    local_target,
+    pinecone_target,
+)
+
 # Load environment variables
 load_dotenv()
 
@@ -31,6 +46,11 @@ PINECONE_NAMESPACE = os.getenv("PINECONE_NAMESPACE", "")
 PINECONE_CLOUD = os.getenv("PINECONE_CLOUD", "aws")
 PINECONE_REGION = os.getenv("PINECONE_REGION", "us-east-1")
 
+# "pinecone" uploads to Pinecone; "local" writes the in-process NumPy index
+# that the API serves with VECTOR_BACKEND=local
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+
 LOCAL_EMBED_MODEL = os.getenv("LOCAL_EMBED_MODEL", "BAAI/bge-base-en-v1.5")
 EMBED_DIM = int(os.getenv("EMBED_DIM", "768"))
 
@@ -40,17 +60,23 @@ CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
 EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "32"))
 UPSERT_BATCH_SIZE = int(os.getenv("UPSERT_BATCH_SIZE", "100"))
 
+# Upserts run on worker threads while the model embeds the next batches;
+# at most UPSERT_QUEUE_SIZE finished batches wait in memory
+UPSERT_WORKERS = int(os.getenv("UPSERT_WORKERS", "4"))
+UPSERT_QUEUE_SIZE = int(os.getenv("UPSERT_QUEUE_SIZE", "8"))
+UPSERT_MAX_RETRIES = int(os.getenv("UPSERT_MAX_RETRIES", "3"))
+
 # =========================
 # CHECK ENV
 # =========================
-if not PINECONE_API_KEY:
+if VECTOR_BACKEND != "local" and not PINECONE_API_KEY:
     print("❌ Error: PINECONE_API_KEY not found in .env")
     sys.exit(1)
 
 # =========================
 # PINECONE
 # =========================
-pc = Pinecone(api_key=PINECONE_API_KEY)
+pc = Pinecone(api_key=PINECONE_API_KEY) if VECTOR_BACKEND != "local" else None
 
 
 def print_header(title: str):
@@ -90,7 +116,11 @@ def load_embedding_model():
 
     print(f"📏 Embedding dimension from model: {actual_dim}")
 
-    if actual_dim != EMBED_DIM:
+    if actual_dim > EMBED_DIM:
+        # Only meaningful for Matryoshka-trained models (e.g. nomic-embed,
+        # mxbai-embed); others lose accuracy when truncated
+        print(f"✂️ Truncating embeddings to the first {EMBED_DIM} dimensions (renormalized)")
+    elif actual_dim != EMBED_DIM:
         raise ValueError(
             f"Embedding dimension mismatch. Model outputs {actual_dim}, "
             f"but EMBED_DIM is set to {EMBED_DIM}."
@@ -141,7 +171,44 @@ def get_index_dimension(index_name: str):
         return None
 
 
+def open_local_index():
+    from src.app.core.retrieval.local_store import (
+        LOCAL_INDEX_QUANTIZATION,
+        LOCAL_INDEX_SEARCH_DIM,
+        LocalVectorIndex,
+    )
+
+    local_index = LocalVectorIndex(
+        LOCAL_INDEX_DIR,
+        dimension=EMBED_DIM,
+        model=LOCAL_EMBED_MODEL,
+        quantization=LOCAL_INDEX_QUANTIZATION or None,
+        search_dimension=LOCAL_INDEX_SEARCH_DIM or None,
+    )
+    if local_index.model != LOCAL_EMBED_MODEL:
+        raise ValueError(
+            f"Local index {LOCAL_INDEX_DIR} was built with {local_index.model}, "
+            f"not {LOCAL_EMBED_MODEL}. Use another LOCAL_INDEX_DIR."
+        )
+    return local_index
+
+
 def check_index_stats():
+    if VECTOR_BACKEND == "local":
+        print_header("📊 CURRENT LOCAL INDEX STATUS")
+        print(f"Directory: {LOCAL_INDEX_DIR}")
+        if os.path.exists(os.path.join(LOCAL_INDEX_DIR, "meta.json")):
+            local_index = open_local_index()
+            print(f"Total vectors: {local_index.size}")
+            print(f"Dimension: {local_index.dimension}")
+            print(f"IVF: {'on' if local_index.has_ivf else 'off'}")
+            print(f"Quantization: {local_index.quantization} ({local_index.bytes_per_vector} bytes/vector)")
+            print(f"Search dimension: {local_index.search_dimension}")
+        else:
+            print("Total vectors: 0")
+        print("=" * 70 + "\n")
+        return
+
     try:
         index = pc.Index(PINECONE_INDEX_NAME)
         stats = index.describe_index_stats()
@@ -183,23 +250,249 @@ def enrich_chunk_metadata(chunks, pdf_path: str):
         chunk.metadata["source_path"] = pdf_path
         chunk.metadata["file_hash"] = file_hash
         chunk.metadata["chunk_index"] = i
+        chunk.id = make_vector_id(chunk)
 
     return chunks, file_hash
 
 
-def make_vector_id(file_hash: str, chunk_index: int) -> str:
-    return f"{file_hash}_{chunk_index}"
+def make_vector_id(chunk) -> str:
+    # Content-addressed: an unchanged chunk keeps its ID across runs
+    return chunk_id(chunk.metadata["source_file"], chunk.metadata.get("page"), chunk.page_content)
+
+
+def get_manifest_target() -> str:
+    if VECTOR_BACKEND == "local":
+        return local_target(LOCAL_INDEX_DIR)
+    return pinecone_target(PINECONE_INDEX_NAME, PINECONE_NAMESPACE)
 
 
 def embed_texts(model: SentenceTransformer, texts: List[str], batch_size: int):
+    from src.app.core.retrieval.local_store import truncate_rows
+
     # BGE models work well with normalized embeddings for cosine similarity
-    return model.encode(
+    embeddings = model.encode(
         texts,
         batch_size=batch_size,
         normalize_embeddings=True,
         show_progress_bar=False,
         convert_to_numpy=True,
     )
+    if embeddings.shape[1] > EMBED_DIM:
+        embeddings = truncate_rows(embeddings, EMBED_DIM)
+    return embeddings
+
+
+def get_keyword_index():
+    """BM25 keyword index of the destination index (one per manifest target)."""
+    from src.app.core.retrieval.bm25 import get_bm25_index
+
+    return get_bm25_index(get_manifest_target())
+
+
+def update_keyword_index(vectors):
+    """Add the chunks to the BM25 keyword index used for hybrid search (saved by the caller)."""
+    get_keyword_index().add_documents(
+        ids=[v["id"] for v in vectors],
+        texts=[v["metadata"]["text"] for v in vectors],
+        metadatas=[
+            {k: val for k, val in v["metadata"].items() if k != "text"}
+            for v in vectors
+        ],
+    )
+
+
+def iter_vector_batches(model: SentenceTransformer, chunks):
+    """
+    Embed chunks batch by batch and yield upsert batches of UPSERT_BATCH_SIZE vectors.
+
+    `chunks` may be a list or any iterable (e.g. chunks streaming in from
+    the parser processes of a bulk run).
+    """
+    pending = []
+
+    total_embed_batches = math.ceil(len(chunks) / EMBED_BATCH_SIZE) if hasattr(chunks, "__len__") else None
+    chunks = iter(chunks)
+    batch_num = 0
+    while True:
+        batch = list(itertools.islice(chunks, EMBED_BATCH_SIZE))
+        if not batch:
+            break
+        batch_num += 1
+
+        texts = [doc.page_content for doc in batch]
+
+        print(f"⚙️ Embedding batch {batch_num}/{total_embed_batches or '?'} ({len(batch)} chunks)")
+        embeddings = embed_texts(model, texts, EMBED_BATCH_SIZE)
+
+        for chunk, emb in zip(batch, embeddings):
+            metadata = dict(chunk.metadata)
+            metadata["text"] = chunk.page_content
+
+            # Kept as float32 arrays; only the Pinecone writer needs lists
+            pending.append({
+                "id": chunk.id,
+                "values": emb,
+                "metadata": metadata
+            })
+
+        while len(pending) >= UPSERT_BATCH_SIZE:
+            yield pending[:UPSERT_BATCH_SIZE]
+            pending = pending[UPSERT_BATCH_SIZE:]
+
+    if pending:
+        yield pending
+
+
+def upsert_with_retry(upsert, batch, batch_num: int):
+    """Upsert one batch, retrying with exponential backoff."""
+    for attempt in range(UPSERT_MAX_RETRIES + 1):
+        try:
+            upsert(batch)
+            return
+        except Exception as e:
+            if attempt == UPSERT_MAX_RETRIES:
+                raise
+            wait_time = 2 ** attempt
+            print(f"⚠️ Upsert batch {batch_num} failed ({e}); retrying in {wait_time}s...")
+            time.sleep(wait_time)
+
+
+def run_upsert_pipeline(vector_batches, upsert, workers: int) -> int:
+    """
+    Producer/consumer embed -> upsert pipeline.
+
+    The calling thread produces vector batches (embedding) into a bounded
+    queue while `workers` threads upsert them, so embedding and uploading
+    overlap. When the queue is full the producer blocks (backpressure),
+    which keeps at most UPSERT_QUEUE_SIZE batches of vectors in memory.
+
+    Returns:
+        Number of vectors upserted
+    """
+    work = queue.Queue(maxsize=UPSERT_QUEUE_SIZE)
+    errors = []
+    upserted = 0
+    lock = threading.Lock()
+
+    def consume():
+        nonlocal upserted
+        while True:
+            item = work.get()
+            if item is None:
+                return
+            batch_num, batch = item
+            if errors:
+                continue
+            try:
+                upsert_with_retry(upsert, batch, batch_num)
+                with lock:
+                    upserted += len(batch)
+                print(f"📦 Upserted batch {batch_num} ({len(batch)} vectors)")
+            except Exception as e:
+                errors.append(e)
+
+    threads = [
+        threading.Thread(target=consume, name=f"upsert-{n}", daemon=True)
+        for n in range(max(workers, 1))
+    ]
+    for thread in threads:
+        thread.start()
+
+    try:
+        for batch_num, batch in enumerate(vector_batches, start=1):
+            if errors:
+                break
+            work.put((batch_num, batch))
+    finally:
+        for _ in threads:
+            work.put(None)
+        for thread in threads:
+            thread.join()
+
+    if errors:
+        raise errors[0]
+
+    return upserted
+
+
+def check_pinecone_index() -> bool:
+    """Create the Pinecone index if needed and check its dimension (no-op for the local backend)."""
+    if VECTOR_BACKEND == "local":
+        return True
+
+    ensure_index_exists(PINECONE_INDEX_NAME, EMBED_DIM)
+
+    actual_dim = get_index_dimension(PINECONE_INDEX_NAME)
+    print(f"📏 Pinecone index dimension: {actual_dim}")
+
+    if actual_dim is not None and actual_dim != EMBED_DIM:
+        print(
+            f"❌ Dimension mismatch: Pinecone index is {actual_dim}, "
+            f"but local embedding model is {EMBED_DIM}"
+        )
+        print("   Delete/recreate the index or use a model with matching dimension.")
+        return False
+
+    return True
+
+
+def open_destination():
+    """
+    Open the index vectors are written to.
+
+    Returns:
+        (local index or None, write(batch), delete(ids), upsert workers)
+    """
+    if VECTOR_BACKEND == "local":
+        print(f"\n💾 Writing vectors to local index: {LOCAL_INDEX_DIR}")
+        local_index = open_local_index()
+
+        def write(batch):
+            local_index.add(
+                ids=[v["id"] for v in batch],
+                vectors=[v["values"] for v in batch],
+                texts=[v["metadata"]["text"] for v in batch],
+                metadatas=[
+                    {k: val for k, val in v["metadata"].items() if k != "text"}
+                    for v in batch
+                ],
+            )
+            update_keyword_index(batch)
+
+        def delete(ids):
+            local_index.delete(ids)
+
+        # The local index serializes writes, so more workers would not help
+        workers = 1
+        return local_index, write, delete, workers
+
+    print("\n📤 Uploading vectors to Pinecone...")
+    index = pc.Index(PINECONE_INDEX_NAME)
+
+    def write(batch):
+        index.upsert(
+            vectors=[{**v, "values": v["values"].tolist()} for v in batch],
+            namespace=PINECONE_NAMESPACE if PINECONE_NAMESPACE else None,
+        )
+        update_keyword_index(batch)
+
+    def delete(ids):
+        for i in range(0, len(ids), 1000):
+            index.delete(
+                ids=ids[i:i + 1000],
+                namespace=PINECONE_NAMESPACE if PINECONE_NAMESPACE else None,
+            )
+
+    workers = UPSERT_WORKERS
+    return None, write, delete, workers
+
+
+def build_ivf_if_large(local_index):
+    from src.app.core.retrieval.local_store import IVF_MIN_VECTORS
+
+    # Approximate search pays off once the corpus is large
+    if not local_index.has_ivf and local_index.count >= IVF_MIN_VECTORS:
+        local_index.build_ivf()
 
 
 def index_pdf_local(pdf_path: str):
@@ -215,29 +508,26 @@ def index_pdf_local(pdf_path: str):
 
     try:
         print(f"PDF: {pdf_path}")
-        print(f"Index: {PINECONE_INDEX_NAME}")
-        print(f"Namespace: {PINECONE_NAMESPACE or '(default)'}")
+        if VECTOR_BACKEND == "local":
+            print(f"Local index: {LOCAL_INDEX_DIR}")
+        else:
+            print(f"Index: {PINECONE_INDEX_NAME}")
+            print(f"Namespace: {PINECONE_NAMESPACE or '(default)'}")
         print(f"Embedding model: {LOCAL_EMBED_MODEL}")
         print(f"Expected dimension: {EMBED_DIM}")
         print(f"Embed batch size: {EMBED_BATCH_SIZE}")
-        print(f"Upsert batch size: {UPSERT_BATCH_SIZE}\n")
-
-        # 1. Load local model
-        model, device = load_embedding_model()
-
-        # 2. Ensure Pinecone index exists
-        ensure_index_exists(PINECONE_INDEX_NAME, EMBED_DIM)
-
-        # 3. Confirm index dimension
-        actual_dim = get_index_dimension(PINECONE_INDEX_NAME)
-        print(f"📏 Pinecone index dimension: {actual_dim}")
-
-        if actual_dim is not None and actual_dim != EMBED_DIM:
-            print(
-                f"❌ Dimension mismatch: Pinecone index is {actual_dim}, "
-                f"but local embedding model is {EMBED_DIM}"
-            )
-            print("   Delete/recreate the index or use a model with matching dimension.")
+        print(f"Upsert batch size: {UPSERT_BATCH_SIZE}")
+        print(f"Upsert workers: {UPSERT_WORKERS if VECTOR_BACKEND != 'local' else 1}\n")
+
+        # 1. Skip the file if this exact version is already indexed
+        source = os.path.basename(pdf_path)
+        target = get_manifest_target()
+        if index_manifest.file_hash(target, source) == get_file_hash(pdf_path):
+            print(f"✅ {source} is unchanged since it was last indexed. Nothing to do.")
+            return True
+
+        # 2-3. Ensure the Pinecone index exists with the model's dimension
+        if not check_pinecone_index():
             return False
 
         # 4. Load and split PDF
@@ -253,63 +543,220 @@ def index_pdf_local(pdf_path: str):
         print(f"   Chunk index: {chunks[0].metadata.get('chunk_index')}")
         print(f"   Text: {chunks[0].page_content[:150]}...")
 
-        # 5. Embed all chunks in local batches
-        print("\n🧠 Generating embeddings locally...")
-        all_vectors = []
+        # Only chunks missing from the manifest are embedded; chunks the
+        # new version no longer produces are deleted afterwards
+        chunks_by_id = {}
+        for chunk in chunks:
+            chunks_by_id.setdefault(chunk.id, chunk)
+
+        indexed = index_manifest.chunk_ids(target, source)
+        new_chunks = [chunk for cid, chunk in chunks_by_id.items() if cid not in indexed]
+        stale_ids = sorted(indexed - set(chunks_by_id))
+        print(f"\n🔁 {len(chunks_by_id) - len(new_chunks)} chunks unchanged, "
+              f"{len(new_chunks)} to embed, {len(stale_ids)} to delete")
+
+        # 4b. Load local model (only needed when something changed)
+        model, device = load_embedding_model() if new_chunks else (None, "-")
+
+        # 5. Open the destination; upserts run on worker threads
+        local_index, write, delete, workers = open_destination()
+
+        bm25_index = get_keyword_index()
+
+        written = set()
+        written_lock = threading.Lock()
+
+        def upsert(batch):
+            write(batch)
+            with written_lock:
+                written.update(v["id"] for v in batch)
+
+        # 6. Embed on this thread while workers upsert finished batches
+        print("\n🧠 Generating embeddings locally (upserts overlap)...")
+        vector_batches = iter_vector_batches(model, new_chunks)
+        try:
+            upserted = run_upsert_pipeline(vector_batches, upsert, workers)
+        except Exception:
+            # Remember what made it in; the next run re-checks the rest
+            index_manifest.record(target, source, None, indexed | written)
+            bm25_index.save()
+            raise
+
+        print(f"✅ Embedded and upserted {upserted} vectors on {device}")
+
+        # 7. Delete chunks the new version of the file no longer produces
+        if stale_ids:
+            print(f"🗑️ Deleting {len(stale_ids)} stale chunks...")
+            delete(stale_ids)
+            bm25_index.delete(stale_ids)
+
+        bm25_index.save()
+        index_manifest.record(target, source, file_hash, chunks_by_id)
+
+        if VECTOR_BACKEND == "local":
+            build_ivf_if_large(local_index)
+
+            print("\n✅ Indexing complete!")
+            print(f"   Pages: {len(documents)}")
+            print(f"   Chunks: {len(chunks)}")
+            print(f"   Local index: {LOCAL_INDEX_DIR} ({local_index.size} vectors)")
+            print(f"   Model: {LOCAL_EMBED_MODEL}")
+            print(f"   Device used: {device}")
+            print("=" * 70 + "\n")
+
+            return True
 
-        total_embed_batches = math.ceil(len(chunks) / EMBED_BATCH_SIZE)
-        for i in range(0, len(chunks), EMBED_BATCH_SIZE):
-            batch = chunks[i:i + EMBED_BATCH_SIZE]
-            batch_num = (i // EMBED_BATCH_SIZE) + 1
+        print("\n✅ Indexing complete!")
+        print(f"   Pages: {len(documents)}")
+        print(f"   Chunks: {len(chunks)}")
+        print(f"   Index: {PINECONE_INDEX_NAME}")
+        print(f"   Namespace: {PINECONE_NAMESPACE or '(default)'}")
+        print(f"   Model: {LOCAL_EMBED_MODEL}")
+        print(f"   Device used: {device}")
+        print("=" * 70 + "\n")
 
-            texts = [doc.page_content for doc in batch]
+        return True
 
-            print(f"⚙️ Embedding batch {batch_num}/{total_embed_batches} ({len(batch)} chunks)")
-            embeddings = embed_texts(model, texts, EMBED_BATCH_SIZE)
+    except Exception as e:
+        print(f"\n❌ Error during indexing: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
 
-            for j, emb in enumerate(embeddings):
-                chunk = batch[j]
-                vector_id = make_vector_id(file_hash, chunk.metadata["chunk_index"])
 
-                metadata = dict(chunk.metadata)
-                metadata["text"] = chunk.page_content
+def index_corpus_local(pattern: str, parse_workers: int = PARSE_WORKERS):
+    """
+    Bulk-index every PDF under a directory or matching a glob.
 
-                all_vectors.append({
-                    "id": vector_id,
-                    "values": emb.tolist(),
-                    "metadata": metadata
-                })
+    PDFs are parsed and split in a pool of `parse_workers` processes and
+    their chunks stream, as each file finishes, into one shared embedding
+    stage (a single model on this process) and the threaded upsert
+    pipeline. Files whose hash matches the manifest are skipped without
+    being parsed.
+    """
+    print_header("🚀 BULK INDEXING WITH LOCAL GPU EMBEDDINGS")
 
-        print(f"✅ Generated {len(all_vectors)} vectors locally on {device}")
+    paths = resolve_pdf_paths(pattern)
+    if not paths:
+        print(f"❌ Error: No PDF files found for: {pattern}")
+        return False
 
-        # 6. Upsert to Pinecone
-        print("\n📤 Uploading vectors to Pinecone...")
-        index = pc.Index(PINECONE_INDEX_NAME)
+    # The manifest is keyed by file name, so two files with the same name
+    # would overwrite each other's chunks
+    by_source = {}
+    for path in paths:
+        by_source.setdefault(os.path.basename(path), path)
+    if len(by_source) < len(paths):
+        print(f"⚠️ Skipping {len(paths) - len(by_source)} files whose names duplicate another file")
+        paths = sorted(by_source.values())
 
-        total_upsert_batches = math.ceil(len(all_vectors) / UPSERT_BATCH_SIZE)
-        for i in range(0, len(all_vectors), UPSERT_BATCH_SIZE):
-            batch = all_vectors[i:i + UPSERT_BATCH_SIZE]
-            batch_num = (i // UPSERT_BATCH_SIZE) + 1
+    try:
+        print(f"Files: {len(paths)} PDFs from {pattern}")
+        print(f"Parse workers: {parse_workers}")
+        print(f"Embedding model: {LOCAL_EMBED_MODEL}")
+        print(f"Embed batch size: {EMBED_BATCH_SIZE}")
+        print(f"Upsert batch size: {UPSERT_BATCH_SIZE}\n")
 
-            print(f"📦 Upserting batch {batch_num}/{total_upsert_batches} ({len(batch)} vectors)")
-            index.upsert(
-                vectors=batch,
-                namespace=PINECONE_NAMESPACE if PINECONE_NAMESPACE else None,
-            )
+        if not check_pinecone_index():
+            return False
 
-        print("\n✅ Indexing complete!")
-        print(f"   Pages: {len(documents)}")
-        print(f"   Chunks: {len(chunks)}")
-        print(f"   Index: {PINECONE_INDEX_NAME}")
-        print(f"   Namespace: {PINECONE_NAMESPACE or '(default)'}")
-        print(f"   Model: {LOCAL_EMBED_MODEL}")
+        target = get_manifest_target()
+        known_hashes = {source: index_manifest.file_hash(target, source) for source in by_source}
+
+        # Per parsed file: its hash, current chunk IDs and the IDs indexed before
+        files = {}
+        counts = {"unchanged": 0, "failed": 0, "pages": 0, "chunks": 0, "to_embed": 0}
+
+        def iter_new_chunks():
+            for result in iter_parsed_pdfs(paths, known_hashes, parse_workers):
+                source = result["source"]
+                if "error" in result:
+                    counts["failed"] += 1
+                    print(f"❌ Could not parse {result['path']}: {result['error']}")
+                    continue
+                if result["chunks"] is None:
+                    counts["unchanged"] += 1
+                    continue
+
+                chunks_by_id = {}
+                for chunk in result["chunks"]:
+                    chunks_by_id.setdefault(chunk.id, chunk)
+                indexed = index_manifest.chunk_ids(target, source)
+                files[source] = {
+                    "file_hash": result["file_hash"],
+                    "ids": set(chunks_by_id),
+                    "indexed": indexed,
+                }
+
+                new_chunks = [chunk for cid, chunk in chunks_by_id.items() if cid not in indexed]
+                counts["pages"] += result["pages"]
+                counts["chunks"] += len(chunks_by_id)
+                counts["to_embed"] += len(new_chunks)
+                print(f"📖 Parsed {source}: {result['pages']} pages, "
+                      f"{len(chunks_by_id)} chunks, {len(new_chunks)} to embed")
+                yield from new_chunks
+
+        # Only load the model once a file actually has something to embed
+        new_chunks = iter_new_chunks()
+        first = next(new_chunks, None)
+        model, device = load_embedding_model() if first is not None else (None, "-")
+        if first is not None:
+            new_chunks = itertools.chain([first], new_chunks)
+
+        local_index, write, delete, workers = open_destination()
+
+        bm25_index = get_keyword_index()
+
+        written = set()
+        written_lock = threading.Lock()
+
+        def upsert(batch):
+            write(batch)
+            with written_lock:
+                written.update(v["id"] for v in batch)
+
+        print("\n🧠 Embedding chunks as files finish parsing (upserts overlap)...")
+        try:
+            upserted = run_upsert_pipeline(iter_vector_batches(model, new_chunks), upsert, workers)
+        except Exception:
+            # Remember what made it in; the next run re-checks the rest
+            for source, info in files.items():
+                index_manifest.record(target, source, None, info["indexed"] | (written & info["ids"]))
+            bm25_index.save()
+            raise
+
+        print(f"✅ Embedded and upserted {upserted} vectors on {device}")
+
+        stale_total = 0
+        for source, info in files.items():
+            stale_ids = sorted(info["indexed"] - info["ids"])
+            if stale_ids:
+                delete(stale_ids)
+                bm25_index.delete(stale_ids)
+                stale_total += len(stale_ids)
+        if stale_total:
+            print(f"🗑️ Deleted {stale_total} stale chunks")
+
+        bm25_index.save()
+        for source, info in files.items():
+            index_manifest.record(target, source, info["file_hash"], info["ids"])
+
+        if local_index is not None:
+            build_ivf_if_large(local_index)
+
+        print("\n✅ Bulk indexing complete!")
+        print(f"   Files indexed: {len(files)}")
+        print(f"   Files unchanged: {counts['unchanged']}")
+        print(f"   Files failed: {counts['failed']}")
+        print(f"   Pages: {counts['pages']}")
+        print(f"   Chunks: {counts['chunks']} ({counts['to_embed']} embedded)")
         print(f"   Device used: {device}")
         print("=" * 70 + "\n")
 
-        return True
+        return counts["failed"] == 0
 
     except Exception as e:
-        print(f"\n❌ Error during indexing: {e}")
+        print(f"\n❌ Error during bulk indexing: {e}")
         import traceback
         traceback.print_exc()
         return False
@@ -321,16 +768,21 @@ if __name__ == "__main__":
     check_index_stats()
 
     if len(sys.argv) < 2:
-        print("Usage: python scripts/setup_pinecone_local.py <path_to_pdf>")
-        print("\nExample:")
-        print('  python scripts/setup_pinecone_local.py "documents/AI.pdf"')
+        print("Usage: python local_embed.py <path_to_pdf | directory | glob>")
+        print("\nExamples:")
+        print('  python local_embed.py "documents/AI.pdf"')
+        print('  python local_embed.py documents/')
+        print('  python local_embed.py "documents/**/*.pdf"')
         sys.exit(1)
 
-    pdf_path = sys.argv[1]
+    path = sys.argv[1]
 
-    success = index_pdf_local(pdf_path)
+    if os.path.isfile(path):
+        success = index_pdf_local(path)
+    else:
+        success = index_corpus_local(path)
 
     if success:
         check_index_stats()
     else:
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
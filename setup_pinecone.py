@@ -1,17 +1,22 @@
 """
 INDEXING SCRIPT: Using official google-genai SDK
-Target: Gemini Free Tier (100 RPM limit) with Auto-Retries
+Target: Gemini Free Tier (100 RPM limit), paced by the shared rate limiter
+(EMBEDDING_RPM / EMBEDDING_TPM) with backoff on RESOURCE_EXHAUSTED
 """
 
 import os
 import sys
-import time
+import hashlib
 from dotenv import load_dotenv
 from pinecone import Pinecone
 from google import genai
 from google.genai import types
 from langchain_community.document_loaders import PyPDFLoader
 from langchain_text_splitters import RecursiveCharacterTextSplitter
+from src.app.core.retrieval.bm25 import get_bm25_index
+from src.app.core.ratelimit import estimate_tokens, get_rate_limiter
+from src.app.core.retrieval.manifest import chunk_id, index_manifest, pinecone_target
+from src.app.core.retrieval.local_store import truncate_rows
 
 # Load environment variables
 load_dotenv()
@@ -21,76 +26,129 @@ pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
 client = genai.Client(api_key=os.getenv("GOOGLE_API_KEY"))
 index_name = os.getenv("PINECONE_INDEX_NAME", "ikms-rag")
 index = pc.Index(index_name)
+embedding_limiter = get_rate_limiter("gemini-embedding-001", "embed")
+
+# Must match the Pinecone index dimension (and EMBEDDING_DIM of the API)
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "768"))
+
+def get_file_hash(file_path: str) -> str:
+    sha256 = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha256.update(block)
+    return sha256.hexdigest()
 
 def index_pdf_with_genai_sdk(pdf_path: str):
     print(f"\n🚀 Starting Indexing: {pdf_path}")
     
+    # Skip the file entirely if this exact version is already indexed
+    source = os.path.basename(pdf_path)
+    target = pinecone_target(index_name)
+    bm25_index = get_bm25_index(target)
+    file_hash = get_file_hash(pdf_path)
+    if index_manifest.file_hash(target, source) == file_hash:
+        print(f"✅ {source} is unchanged since it was last indexed. Nothing to do.")
+        return
+    
     # 1. Load and Split
     loader = PyPDFLoader(pdf_path)
     documents = loader.load()
     splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=200)
     chunks = splitter.split_documents(documents)
     print(f"✅ Split PDF into {len(chunks)} chunks.")
+    
+    # Content-addressed IDs: unchanged chunks keep their ID across runs,
+    # so only new or edited chunks need embedding
+    chunks_by_id = {}
+    for chunk in chunks:
+        chunk.metadata["source_file"] = source
+        chunks_by_id.setdefault(
+            chunk_id(source, chunk.metadata.get("page"), chunk.page_content), chunk
+        )
+    
+    indexed = index_manifest.chunk_ids(target, source)
+    new_ids = [cid for cid in chunks_by_id if cid not in indexed]
+    stale_ids = sorted(indexed - set(chunks_by_id))
+    print(f"🔁 {len(chunks_by_id) - len(new_ids)} chunks unchanged, "
+          f"{len(new_ids)} to embed, {len(stale_ids)} to delete.")
 
-    # 2. Adjusted Batch Processing for 100 RPM limit
-    batch_size = 20 # Lowered to 20 chunks per batch
+    # 2. Batch Processing (the limiter keeps us under the RPM/TPM quota)
+    batch_size = 20
+    written = set()
+    failed = False
     
-    for i in range(0, len(chunks), batch_size):
-        batch = chunks[i : i + batch_size]
+    for i in range(0, len(new_ids), batch_size):
+        batch_ids = new_ids[i : i + batch_size]
+        batch = [chunks_by_id[cid] for cid in batch_ids]
         texts = [chunk.page_content for chunk in batch]
         batch_num = (i // batch_size) + 1
-        total_batches = (len(chunks) // batch_size) + 1
+        total_batches = (len(new_ids) + batch_size - 1) // batch_size
         
         print(f"📤 Processing batch {batch_num} of {total_batches}...")
 
-        # 3. Automatic Retry Loop
-        success = False
-        retries = 0
-        
-        while not success and retries < 5:
-            try:
-                # Generate Embeddings
-                result = client.models.embed_content(
+        try:
+            # 3. Generate Embeddings (the shared limiter waits only as long as
+            # the quota requires and backs off on RESOURCE_EXHAUSTED)
+            result = embedding_limiter.call(
+                lambda: client.models.embed_content(
                     model="gemini-embedding-001",
                     contents=texts,
-                    config=types.EmbedContentConfig(output_dimensionality=768)
-                )
-                
-                # Extract embeddings from result
-                embeddings_list = [e.values for e in result.embeddings]
+                    config=types.EmbedContentConfig(output_dimensionality=EMBEDDING_DIM)
+                ),
+                requests=len(texts),
+                tokens=sum(estimate_tokens(text) for text in texts),
+                background=True
+            )
+            
+            # Extract embeddings from result (reduced dimensions come back
+            # unnormalized, so renormalize like the API's query embeddings)
+            embeddings_list = truncate_rows(
+                [e.values for e in result.embeddings], EMBEDDING_DIM
+            ).tolist()
+            
+            # Prepare and Upsert to Pinecone
+            vectors_to_upsert = []
+            for j, emb in enumerate(embeddings_list):
+                metadata = dict(batch[j].metadata)
+                metadata["text"] = texts[j] 
                 
-                # Prepare and Upsert to Pinecone
-                vectors_to_upsert = []
-                for j, emb in enumerate(embeddings_list):
-                    chunk_id = f"id_{i + j}"
-                    metadata = batch[j].metadata
-                    metadata["text"] = texts[j] 
-                    
-                    vectors_to_upsert.append({
-                        "id": chunk_id,
-                        "values": emb,
-                        "metadata": metadata
-                    })
-                
-                index.upsert(vectors=vectors_to_upsert)
-                success = True # Break out of the retry loop
-                
-                # Normal sleep to maintain ~80 requests per minute
-                if i + batch_size < len(chunks):
-                    print("💤 Normal wait: Sleeping 15s...")
-                    time.sleep(15)
-
-            except Exception as e:
-                error_msg = str(e)
-                if "429" in error_msg or "RESOURCE_EXHAUSTED" in error_msg:
-                    retries += 1
-                    wait_time = 20 * retries # Progressively wait longer (20s, 40s, 60s)
-                    print(f"⚠️ Rate limit hit. Waiting {wait_time}s before retrying batch {batch_num}...")
-                    time.sleep(wait_time)
-                else:
-                    print(f"❌ Fatal error in batch {batch_num}: {e}")
-                    break # Break on non-rate-limit errors
+                vectors_to_upsert.append({
+                    "id": batch_ids[j],
+                    "values": emb,
+                    "metadata": metadata
+                })
+            
+            index.upsert(vectors=vectors_to_upsert)
+            written.update(batch_ids)
+            
+            # Keep the BM25 keyword index in sync for hybrid search
+            bm25_index.add_documents(
+                batch_ids,
+                texts,
+                [{k: val for k, val in v["metadata"].items() if k != "text"} for v in vectors_to_upsert]
+            )
 
+        except Exception as e:
+            print(f"❌ Fatal error in batch {batch_num}: {e}")
+            failed = True
+            break
+    
+    if failed:
+        # Remember what made it in; the next run re-checks the rest
+        index_manifest.record(target, source, None, indexed | written)
+        bm25_index.save()
+        print("\n⚠️ Indexing stopped early. Re-run to finish the remaining chunks.")
+        return
+    
+    # 4. Delete chunks the new version of the file no longer produces
+    if stale_ids:
+        print(f"🗑️ Deleting {len(stale_ids)} stale chunks...")
+        for i in range(0, len(stale_ids), 1000):
+            index.delete(ids=stale_ids[i : i + 1000])
+        bm25_index.delete(stale_ids)
+    
+    index_manifest.record(target, source, file_hash, chunks_by_id)
+    bm25_index.save()
     print("\n✅ Indexing Complete!")
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
 """FastAPI application."""
 
 import os
+import json
+from contextlib import asynccontextmanager
 from pathlib import Path
 
 # Load .env only in local development (Vercel provides env vars natively)
@@ -17,13 +19,34 @@ if not os.getenv("GOOGLE_API_KEY"):
     print("WARNING: GOOGLE_API_KEY not found. Set it in Vercel Environment Variables.")
 from fastapi import FastAPI, HTTPException, UploadFile, File
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from .models import QARequest, QAResponse
 from .core.agents.graph import qa_graph
-import shutil
-from .core.retrieval.vector_store import vector_store_manager
+from .core.retrieval.vector_store import VECTOR_BACKEND, vector_store_manager
+from .core.answer_cache import answer_cache
+from .core.jobs import ingestion_jobs
+from .core.lazy import readiness, start_warm_up
+from .core.llm import llm_registry
+from .core.metrics import metrics, record_cache, track_request, track_stage
+from .core.ratelimit import rate_limiters
 
 
-app = FastAPI(title="IKMS Query Planner", version="1.0.0")
+# Connect to the vector store and build the LLM clients in the background
+# at startup; requests arriving earlier initialize them on demand
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() == "true"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if WARM_UP_ON_STARTUP:
+        start_warm_up()
+    yield
+    if vector_store_manager.ready:
+        await vector_store_manager.get().aclose()
+    await llm_registry.aclose()
+
+
+app = FastAPI(title="IKMS Query Planner", version="1.0.0", lifespan=lifespan)
 
 # Enable CORS for frontend
 app.add_middleware(
@@ -45,47 +68,112 @@ def root():
         "version": "1.0.0"
     }
 
-@app.post("/api/index-pdf")
-async def index_pdf(file: UploadFile = File(...)):
+@app.post("/api/index-pdf", status_code=202)
+def index_pdf(file: UploadFile = File(...)):
     """
-    Upload and index a PDF file.
+    Upload a PDF and queue it for indexing.
     
-    The PDF will be:
-    1. Split into chunks
-    2. Embedded using Gemini
-    3. Stored in Pinecone
+    The PDF is indexed by a background worker, page by page:
+    1. Each page is split into chunks as it is read
+    2. Chunks are embedded in bounded batches (rate limited)
+    3. Each batch is upserted as soon as it is ready
+    
+    Poll /api/index-jobs/{job_id} for progress.
     """
+    if not (file.filename or "").lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="File must be a PDF")
+    
     try:
-        # Create uploads directory if it doesn't exist
-        upload_dir = Path("uploads")
-        upload_dir.mkdir(exist_ok=True)
-        
-        # Save uploaded file
-        file_path = upload_dir / file.filename
-        
-        with file_path.open("wb") as buffer:
-            shutil.copyfileobj(file.file, buffer)
-        
         print(f"\n📤 Uploaded file: {file.filename}")
         
-        # Index the PDF
-        result = vector_store_manager.index_pdf(str(file_path))
+        job = ingestion_jobs.submit(vector_store_manager.get(), file.file, file.filename)
         
         return {
-            "status": "success",
+            "status": "queued",
+            "job_id": job.id,
             "filename": file.filename,
-            "pages": result["pages"],
-            "chunks": result["chunks"],
-            "message": f"Successfully indexed {result['chunks']} chunks from {result['pages']} pages"
+            "message": f"Queued {file.filename} for indexing"
         }
         
     except Exception as e:
-        print(f"ERROR indexing PDF: {str(e)}")
+        print(f"ERROR queuing PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/index-jobs")
+def list_index_jobs():
+    """Progress of recent ingestion jobs, oldest first."""
+    return {"jobs": [job.to_dict() for job in ingestion_jobs.list_jobs()]}
+
+@app.get("/api/index-jobs/{job_id}")
+def get_index_job(job_id: str):
+    """Progress of one ingestion job (pages parsed, chunks embedded, vectors upserted)."""
+    job = ingestion_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+@app.delete("/api/index-jobs/{job_id}")
+def cancel_index_job(job_id: str):
+    """Cancel a queued or running ingestion job."""
+    job = ingestion_jobs.cancel(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown job")
+    return job.to_dict()
+
+
+def build_initial_state(question: str) -> dict:
+    """Initial graph state for a question."""
+    return {
+        "question": question,
+        "plan": None,
+        "sub_questions": None,
+        "documents": None,
+        "context": None,
+        "citations": None,
+        "answer": None,
+        "verified": None
+    }
+
+
+def build_response(question: str, final_state: dict) -> QAResponse:
+    """Convert the final graph state into a QAResponse."""
+    return QAResponse(
+        question=question,
+        plan=final_state.get("plan"),
+        sub_questions=final_state.get("sub_questions"),
+        answer=final_state["answer"],
+        context=final_state.get("context"),
+        citations=final_state.get("citations"),
+        verified=bool(final_state.get("verified"))
+    )
+
+
+async def lookup_cached_answer(question: str):
+    """
+    Check the semantic answer cache.
+    
+    Returns:
+        Tuple of (cached QAResponse or None, question embedding or None)
+    """
+    if not answer_cache.enabled:
+        return None, None
+    
+    with track_stage("answer_cache"):
+        manager = await vector_store_manager.aget()
+        question_embedding = await manager.embeddings.aembed_query(question)
+        cached = answer_cache.lookup(question_embedding)
+    
+    record_cache("answer", cached is not None)
+    if cached is None:
+        return None, question_embedding
+    
+    print("⚡ Answer cache hit")
+    cached.update(question=question, cached=True)
+    return QAResponse(**cached), question_embedding
+
 
 @app.post("/api/qa", response_model=QAResponse)
-def question_answer(request: QARequest):
+async def question_answer(request: QARequest):
     """
     Main QA endpoint with query planning.
     
@@ -94,73 +182,174 @@ def question_answer(request: QARequest):
     2. Retrieval Agent searches with enhanced queries
     3. Summarization Agent generates answer
     4. Verification Agent checks quality
+    
+    With debug=true the response carries per-stage timings, token counts
+    and cache hits of this request.
     """
     try:
-        print(f"\n{'='*60}")
-        print(f"NEW QUESTION: {request.question}")
-        print(f"{'='*60}")
-        
-        # Run the graph
-        initial_state = {
-            "question": request.question,
-            "plan": None,
-            "sub_questions": None,
-            "context": None,
-            "answer": None
-        }
+        with track_request("qa") as trace:
+            print(f"\n{'='*60}")
+            print(f"NEW QUESTION: {request.question}")
+            print(f"{'='*60}")
+            
+            # Serve semantically equivalent questions from the answer cache
+            generation = answer_cache.generation
+            cached, question_embedding = await lookup_cached_answer(request.question)
+            if cached is not None:
+                trace.outcome = "cached"
+                response = cached
+            else:
+                # Run the graph (async, so the worker is free while LLM calls are in flight)
+                final_state = await qa_graph.ainvoke(build_initial_state(request.question))
+                
+                print(f"\n{'='*60}")
+                print(f"FINAL ANSWER: {final_state['answer'][:100]}...")
+                print(f"{'='*60}\n")
+                
+                response = build_response(request.question, final_state)
+                
+                if question_embedding is not None:
+                    answer_cache.store(question_embedding, response.model_dump(), generation)
         
-        final_state = qa_graph.invoke(initial_state)
+        if request.debug:
+            response.debug = trace.to_dict()
         
-        print(f"\n{'='*60}")
-        print(f"FINAL ANSWER: {final_state['answer'][:100]}...")
-        print(f"{'='*60}\n")
-        
-        return QAResponse(
-            question=request.question,
-            plan=final_state.get("plan"),
-            sub_questions=final_state.get("sub_questions"),
-            answer=final_state["answer"],
-            context=final_state.get("context")
-        )
+        return response
     
         
     except Exception as e:
         print(f"ERROR: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
+
+
+def sse_event(event: str, data) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/qa/stream")
+async def question_answer_stream(request: QARequest):
+    """
+    Streaming QA endpoint (Server-Sent Events).
+    
+    Events, in order:
+    - plan: plan and sub-questions once the Planning Agent finishes
+    - retrieval: one event per search as its results arrive
+    - token: answer tokens from the Summarization Agent
+    - answer: the final (verified) QAResponse
+    - done / error
+    """
+    async def event_stream():
+        try:
+            with track_request("qa_stream") as trace:
+                print(f"\n{'='*60}")
+                print(f"NEW QUESTION (stream): {request.question}")
+                print(f"{'='*60}")
+                
+                generation = answer_cache.generation
+                cached, question_embedding = await lookup_cached_answer(request.question)
+                if cached is not None:
+                    trace.outcome = "cached"
+                    if request.debug:
+                        cached.debug = trace.to_dict()
+                    yield sse_event("answer", cached.model_dump())
+                    yield sse_event("done", {})
+                    return
+                
+                final_state = build_initial_state(request.question)
+                
+                async for mode, chunk in qa_graph.astream(
+                    final_state,
+                    stream_mode=["updates", "custom", "messages"]
+                ):
+                    if mode == "updates":
+                        for node, update in chunk.items():
+                            final_state.update(update or {})
+                            if node == "planning":
+                                yield sse_event("plan", {
+                                    "plan": update.get("plan"),
+                                    "sub_questions": update.get("sub_questions")
+                                })
+                    
+                    elif mode == "custom" and "retrieval" in chunk:
+                        yield sse_event("retrieval", chunk["retrieval"])
+                    
+                    elif mode == "messages":
+                        message, metadata = chunk
+                        if metadata.get("langgraph_node") == "summarization" and message.text:
+                            yield sse_event("token", {"text": message.text})
+                
+                response = build_response(request.question, final_state)
+                
+                if question_embedding is not None:
+                    answer_cache.store(question_embedding, response.model_dump(), generation)
+                
+                if request.debug:
+                    response.debug = trace.to_dict()
+                
+                yield sse_event("answer", response.model_dump())
+                yield sse_event("done", {})
+        
+        except Exception as e:
+            print(f"ERROR: {str(e)}")
+            yield sse_event("error", {"detail": str(e)})
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
     
 
     
 @app.get("/api/index-stats")
 def get_index_stats():
-    """Get statistics about the Pinecone index."""
+    """Get statistics about the vector index."""
     try:
-        index = vector_store_manager.pc.Index(vector_store_manager.index_name)
-        stats = index.describe_index_stats()
-        
-        return {
-            "index_name": vector_store_manager.index_name,
-            "dimension": stats.get("dimension"),
-            "total_vectors": stats.get("total_vector_count", 0),
-            "namespaces": stats.get("namespaces", {})
-        }
+        manager = vector_store_manager.get()
+        stats = manager.stats()
+        stats["bm25"] = manager.keyword_index.stats()
+        stats["answer_cache"] = answer_cache.stats()
+        stats["rate_limits"] = {name: limiter.stats() for name, limiter in rate_limiters.items()}
+        stats["llm"] = llm_registry.stats()
+        return stats
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/api/metrics", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    Prometheus-style metrics: per-stage and end-to-end latency histograms,
+    LLM calls and tokens, retrieval searches and chunks, cache hits.
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
     
 @app.get("/api/health")
 def health_check():
-    """Detailed health check."""
+    """
+    Detailed health check and readiness.
+    
+    Never initializes anything itself: "ready" turns true once the startup
+    warm-up (or the first request) has connected every client.
+    """
+    clients = readiness()
+    ready = all(client["ready"] for client in clients.values())
+    failed = any(client["error"] for client in clients.values())
+    
     return {
-        "status": "healthy",
+        "status": "healthy" if ready else ("degraded" if failed else "starting"),
+        "ready": ready,
         "feature": "Query Planning Agent",
         "llm_provider": "Google Gemini",
-        "embedding_provider": "Google Gemini text-embedding-004",
-        "vector_database": "Pinecone (Cloud)",
+        "embedding_provider": "Google Gemini gemini-embedding-001",
+        "vector_database": "Local index" if VECTOR_BACKEND == "local" else "Pinecone (Cloud)",
         "components": {
-            "planning_agent": True,
-            "retrieval_agent": True,
-            "summarization_agent": True,
-            "verification_agent": True,
-            "pinecone_connected": True,
-            "semantic_search": True
-        }
+            "planning_agent": clients["planner_llm"]["ready"],
+            "retrieval_agent": clients["vector_store"]["ready"],
+            "summarization_agent": clients["summarization_llm"]["ready"],
+            "verification_agent": clients["verification_llm"]["ready"],
+            "pinecone_connected": VECTOR_BACKEND != "local" and clients["vector_store"]["ready"],
+            "semantic_search": clients["vector_store"]["ready"]
+        },
+        "clients": clients
     }
@@ -1,49 +1,253 @@
 
 
-from langchain_google_genai import ChatGoogleGenerativeAI
+import asyncio
+import contextlib
+import os
+import random
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from typing import Callable, Optional
+
 from langchain_core.messages import HumanMessage
+from langgraph.config import get_stream_writer
 from .state import QAState
 from .prompts import (
     QUERY_PLANNER_PROMPT,
     SUMMARIZATION_PROMPT,
     VERIFICATION_PROMPT
 )
-from .tools import retrieval_tool
+from .tools import format_search_results
+from ..ratelimit import estimate_tokens, get_rate_limiter
+from ..retrieval.bm25 import is_keyword_query
+from ..retrieval.ranking import reciprocal_rank_fusion
+from ..retrieval.serialization import build_context
+from ..llm import llm_registry
+from ..metrics import record_cache, record_llm_call, record_retrieval, record_retrieval_error
+from ..retrieval.vector_store import vector_store_manager
 
 
-# Initialize Gemini LLMs 
-planner_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    convert_system_message_to_human=True
-)
+# Gemini LLMs per role, sharing one pooled client per model (see llm.py);
+# built on first use (or by the API's startup warm-up)
+planner_llm = llm_registry.lazy_chat_model("planner_llm", "planner")
+summarization_llm = llm_registry.lazy_chat_model("summarization_llm", "summarizer")
+verification_llm = llm_registry.lazy_chat_model("verification_llm", "verifier")
 
-summarization_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    convert_system_message_to_human=True
-)
 
-verification_llm = ChatGoogleGenerativeAI(
-    model="gemini-2.5-flash",
-    temperature=0,
-    convert_system_message_to_human=True
+async def invoke_llm(llm, prompt: str):
+    """
+    Call a chat model under its model's shared RPM/TPM limiter and
+    concurrency cap, recording its latency and token usage.
+    
+    Token counts come from the response's usage metadata, or are
+    estimated from the text when the model does not report them.
+    
+    Args:
+        llm: Lazy chat model
+        prompt: Prompt sent as a single human message
+        
+    Returns:
+        The model's response message
+    """
+    llm = await llm.aget()
+    model = getattr(llm, "model", "default")
+    limiter = get_rate_limiter(model, "generate")
+    
+    start = time.perf_counter()
+    async with llm_registry.slot(model):
+        response = await limiter.acall(
+            lambda: llm.ainvoke([HumanMessage(content=prompt)]),
+            tokens=estimate_tokens(prompt)
+        )
+    
+    usage = getattr(response, "usage_metadata", None) or {}
+    record_llm_call(
+        model,
+        time.perf_counter() - start,
+        usage.get("input_tokens") or estimate_tokens(prompt),
+        usage.get("output_tokens") or estimate_tokens(response.text)
+    )
+    return response
+
+
+# Concurrent retrieval settings
+# RETRIEVAL_MAX_CONCURRENCY bounds the searches of one request, so users never
+# queue behind each other's searches. RETRIEVAL_GLOBAL_MAX_CONCURRENCY is an
+# optional process-wide cap (one semaphore per event loop, shared by all
+# requests) to size to the Pinecone quota; 0 leaves it off.
+RETRIEVAL_MAX_CONCURRENCY = int(os.getenv("RETRIEVAL_MAX_CONCURRENCY", "4"))
+RETRIEVAL_GLOBAL_MAX_CONCURRENCY = int(os.getenv("RETRIEVAL_GLOBAL_MAX_CONCURRENCY", "0"))
+RETRIEVAL_TIMEOUT_SECONDS = float(os.getenv("RETRIEVAL_TIMEOUT_SECONDS", "15"))
+RETRIEVAL_TOP_K = 4
+MAX_SUB_QUESTIONS = 3
+# Fuse BM25 keyword results with dense results; keyword-style queries skip embedding
+HYBRID_SEARCH = os.getenv("HYBRID_SEARCH", "true").lower() == "true"
+
+# Approximate token budgets for the context given to each LLM
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000"))
+VERIFICATION_CONTEXT_TOKENS = int(os.getenv("VERIFICATION_CONTEXT_TOKENS", "500"))
+
+retrieval_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = (
+    weakref.WeakKeyDictionary()
 )
 
 
-def planning_node(state: QAState) -> dict:
-    """Planning Agent: Analyzes question and creates search plan."""
-    question = state["question"]
+def get_retrieval_semaphore() -> Optional[asyncio.Semaphore]:
+    """Return the process-wide retrieval semaphore for the running event loop (None when uncapped)."""
+    if RETRIEVAL_GLOBAL_MAX_CONCURRENCY <= 0:
+        return None
+    loop = asyncio.get_running_loop()
+    semaphore = retrieval_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(RETRIEVAL_GLOBAL_MAX_CONCURRENCY)
+        retrieval_semaphores[loop] = semaphore
+    return semaphore
+
+
+async def run_retrievals(queries: list[str],
+                         on_result: Optional[Callable[[int, str, list], None]] = None,
+                         keyword_results: Optional[list] = None) -> list[list]:
+    """
+    Run all retrieval queries concurrently.
     
-    print(f"\n PLANNING AGENT: Analyzing question...")
+    Keyword-style queries are answered by the local BM25 index without an
+    embedding call (when HYBRID_SEARCH is on). The remaining queries are
+    embedded in one batch call, then the vector lookups run in parallel
+    with the precomputed vectors. BM25 searches run in worker threads
+    (an indexing script saving or reloading the index must not stall the
+    event loop) and share the request's concurrency limit.
     
-    prompt = f"{QUERY_PLANNER_PROMPT}\n\nUser Question: {question}"
-    response = planner_llm.invoke([HumanMessage(content=prompt)])
+    Args:
+        queries: Search queries, in the order results should be returned
+        on_result: Optional callback(index, query, results) invoked as
+            each search finishes, in completion order
+        keyword_results: Optional list; when hybrid search is on, the BM25
+            rankings of the natural-language queries are appended to it
+            (in query order)
+        
+    Returns:
+        One list of (document, score) pairs per query, in the same order.
+        Searches that fail or exceed RETRIEVAL_TIMEOUT_SECONDS return an
+        empty list instead of failing the request; if the query embedding
+        fails or times out, every query is answered by BM25 alone.
+    """
+    manager = await vector_store_manager.aget()
+    keyword_index = manager.keyword_index
+    use_bm25 = HYBRID_SEARCH and keyword_index.num_docs > 0
+    lexical = [use_bm25 and is_keyword_query(query) for query in queries]
+    dense = [i for i, is_lexical in enumerate(lexical) if not is_lexical]
     
-    text = response.content
-    print(f"Planning output:\n{text}\n")
+    vectors = {}
+    if dense:
+        try:
+            embedded = await asyncio.wait_for(
+                manager.aembed_queries([queries[i] for i in dense]),
+                timeout=RETRIEVAL_TIMEOUT_SECONDS
+            )
+            vectors = dict(zip(dense, embedded))
+        except asyncio.TimeoutError:
+            record_retrieval_error("embedding_timeout")
+            print("WARNING: query embedding timed out, falling back to keyword search")
+        except Exception as e:
+            record_retrieval_error("embedding_failed")
+            print(f"WARNING: query embedding failed, falling back to keyword search ({e!r})")
+    
+    request_slots = asyncio.Semaphore(max(RETRIEVAL_MAX_CONCURRENCY, 1))
+    global_slots = get_retrieval_semaphore() or contextlib.nullcontext()
+    results: list[list] = [[] for _ in queries]
+    hybrid = {}
+    
+    async def keyword_search(query: str) -> list:
+        async with request_slots:
+            return await asyncio.to_thread(keyword_index.search, query, k=RETRIEVAL_TOP_K)
+    
+    async def add_keyword_ranking(i: int):
+        hybrid[i] = await keyword_search(queries[i])
+    
+    async def search(i: int):
+        # Keyword queries, and every query when embedding failed, use BM25 only
+        if lexical[i] or i not in vectors:
+            results[i] = await keyword_search(queries[i])
+        else:
+            async with request_slots, global_slots:
+                try:
+                    results[i] = await asyncio.wait_for(
+                        manager.asearch_by_vector_with_score(vectors[i], k=RETRIEVAL_TOP_K),
+                        timeout=RETRIEVAL_TIMEOUT_SECONDS
+                    )
+                except asyncio.TimeoutError:
+                    record_retrieval_error("search_timeout")
+                    print(f"WARNING: search timed out, continuing without it: {queries[i][:50]}...")
+                except Exception as e:
+                    record_retrieval_error("search_failed")
+                    print(f"WARNING: search failed, continuing without it: {queries[i][:50]}... ({e!r})")
+        
+        if on_result is not None:
+            on_result(i, queries[i], results[i])
+    
+    searches = [search(i) for i in range(len(queries))]
+    if keyword_results is not None and use_bm25:
+        searches += [add_keyword_ranking(i) for i in dense]
+    await asyncio.gather(*searches)
+    
+    if keyword_results is not None:
+        keyword_results.extend(hybrid[i] for i in sorted(hybrid))
+    return results
+
+
+# Planner settings
+PLANNER_CACHE_SIZE = int(os.getenv("PLANNER_CACHE_SIZE", "512"))
+PLANNER_FAST_PATH = os.getenv("PLANNER_FAST_PATH", "true").lower() == "true"
+SIMPLE_QUESTION_MAX_WORDS = int(os.getenv("SIMPLE_QUESTION_MAX_WORDS", "12"))
+
+# Words that usually join several information needs in one question
+COMPLEX_MARKERS = {
+    "and", "or", "vs", "versus", "compare", "compared", "comparison",
+    "difference", "differences", "between", "while", "whereas", "also",
+    "both", "pros", "cons", "advantages", "disadvantages"
+}
+
+planner_cache: "OrderedDict[str, dict]" = OrderedDict()
+planner_cache_lock = threading.Lock()
+
+
+def normalize_question(question: str) -> str:
+    """Lowercase and collapse whitespace so equivalent questions share a key."""
+    return " ".join(question.lower().split())
+
+
+def is_simple_question(question: str) -> bool:
+    """
+    Cheap local complexity check used to skip the planning LLM.
+    
+    A question is simple when it is short, asks one thing and contains
+    no conjunctions or comparison words that would need decomposition.
+    """
+    words = re.findall(r"[a-z0-9']+", question.lower())
+    
+    if not words or len(words) > SIMPLE_QUESTION_MAX_WORDS:
+        return False
+    
+    # Several clauses or several questions
+    if question.count("?") > 1 or re.search(r"[,;:]", question):
+        return False
+    
+    return not COMPLEX_MARKERS.intersection(words)
+
+
+def route_question(state: QAState) -> str:
+    """Graph router: simple questions skip planning and go straight to retrieval."""
+    if PLANNER_FAST_PATH and is_simple_question(state["question"]):
+        print(f"\n⚡ Simple question - skipping planning agent")
+        return "retrieval"
     
-    # Parse response
+    return "planning"
+
+
+def parse_plan(text: str) -> dict:
+    """Parse the PLAN / SUB_QUESTIONS sections of the planner output."""
     plan = ""
     sub_questions = []
     
@@ -65,7 +269,48 @@ def planning_node(state: QAState) -> dict:
     }
 
 
-def retrieval_node(state: QAState) -> dict:
+async def planning_node(state: QAState) -> dict:
+    """Planning Agent: Analyzes question and creates search plan."""
+    question = state["question"]
+    key = normalize_question(question)
+    
+    print(f"\n PLANNING AGENT: Analyzing question...")
+    
+    with planner_cache_lock:
+        cached = planner_cache.get(key)
+        if cached is not None:
+            planner_cache.move_to_end(key)
+    
+    record_cache("planner", cached is not None)
+    if cached is not None:
+        print("⚡ Planner cache hit")
+        return {
+            "plan": cached["plan"],
+            "sub_questions": list(cached["sub_questions"])
+        }
+    
+    prompt = f"{QUERY_PLANNER_PROMPT}\n\nUser Question: {question}"
+    response = await invoke_llm(planner_llm, prompt)
+    
+    text = response.content
+    print(f"Planning output:\n{text}\n")
+    
+    result = parse_plan(text)
+    
+    if PLANNER_CACHE_SIZE > 0:
+        with planner_cache_lock:
+            planner_cache[key] = result
+            planner_cache.move_to_end(key)
+            while len(planner_cache) > PLANNER_CACHE_SIZE:
+                planner_cache.popitem(last=False)
+    
+    return {
+        "plan": result["plan"],
+        "sub_questions": list(result["sub_questions"])
+    }
+
+
+async def retrieval_node(state: QAState) -> dict:
     """Retrieval Agent: Multi-query search in Pinecone."""
     question = state["question"]
     plan = state.get("plan", "")
@@ -73,40 +318,127 @@ def retrieval_node(state: QAState) -> dict:
     
     print(f"\n RETRIEVAL AGENT: Searching Pinecone...")
     
-    # Strategy 1: Search with original question
+    # Original question first, then the planner's sub-questions
+    queries = [question] + list(sub_questions or [])[:MAX_SUB_QUESTIONS]
+    
     print(f"   → Search 1: Original question")
-    context_parts = [retrieval_tool.invoke({"query": question})]
+    for i, sub_q in enumerate(queries[1:], 2):
+        print(f"      • Search {i}: {sub_q[:50]}...")
+    
+    # Stream each search result to /api/qa/stream clients as it arrives
+    writer = get_stream_writer()
+    
+    def emit(index: int, query: str, results: list):
+        context = format_search_results([doc for doc, _ in results])
+        writer({"retrieval": {"index": index, "query": query, "context": context}})
     
-    # Strategy 2: Search with sub-questions
-    if sub_questions:
-        print(f"   → Searches 2-{len(sub_questions)+1}: Sub-questions")
-        for i, sub_q in enumerate(sub_questions[:3], 2):
-            print(f"      • Search {i}: {sub_q[:50]}...")
-            result = retrieval_tool.invoke({"query": sub_q})
-            context_parts.append(result)
+    # Run all searches concurrently; results keep the query order.
+    # Hybrid search: BM25 rankings of the natural-language queries are added too
+    keyword_rankings = []
+    result_lists = await run_retrievals(queries, on_result=emit, keyword_results=keyword_rankings)
+    result_lists += keyword_rankings
     
-    # Combine all context
-    combined_context = "\n\n" + ("="*60 + "\n\n").join(context_parts)
+    keyword_queries = 0
+    keyword_index = (await vector_store_manager.aget()).keyword_index
+    if HYBRID_SEARCH and keyword_index.num_docs > 0:
+        keyword_queries = sum(is_keyword_query(query) for query in queries)
     
-    print(f" Completed {len(context_parts)} Pinecone searches")
+    # Merge duplicates across queries and rank by RRF
+    documents = reciprocal_rank_fusion(result_lists)
+    retrieved = sum(len(results) for results in result_lists)
+    embedding_calls = 1 if keyword_queries < len(queries) else 0
     
-    return {"context": combined_context}
+    record_retrieval(len(queries), keyword_queries, embedding_calls, retrieved, len(documents))
+    
+    print(f" Completed {len(queries)} searches ({keyword_queries} keyword-only, "
+          f"{embedding_calls} embedding call)")
+    print(f" {len(documents)} unique chunks out of {retrieved} retrieved")
+    
+    return {"documents": documents}
 
 
-def summarization_node(state: QAState) -> dict:
+async def summarization_node(state: QAState) -> dict:
     """Summarization Agent: Generate answer."""
     question = state["question"]
-    context = state.get("context", "")
+    
+    # Highest-ranked chunks first, bounded by the token budget
+    context, citations = build_context(state.get("documents") or [], CONTEXT_TOKEN_BUDGET)
     
     print(f"\n SUMMARIZATION AGENT: Generating answer...")
     
     prompt = f"{SUMMARIZATION_PROMPT}\n\nQuestion: {question}\n\nContext:\n{context}"
-    response = summarization_llm.invoke([HumanMessage(content=prompt)])
+    response = await invoke_llm(summarization_llm, prompt)
     
     answer = response.content
     print(f"Generated answer: {answer[:100]}...\n")
     
-    return {"answer": answer}
+    return {
+        "answer": answer,
+        "context": context,
+        "citations": citations,
+        "verified": False
+    }
+
+
+# Verification policy
+# - always:    verify every answer
+# - off:       never verify
+# - sampled:   verify VERIFICATION_SAMPLE_RATE of requests
+# - triggered: verify only when cheap local checks fail
+VERIFICATION_MODE = os.getenv("VERIFICATION_MODE", "triggered").lower()
+VERIFICATION_SAMPLE_RATE = float(os.getenv("VERIFICATION_SAMPLE_RATE", "0.1"))
+VERIFICATION_MIN_ANSWER_CHARS = int(os.getenv("VERIFICATION_MIN_ANSWER_CHARS", "120"))
+VERIFICATION_MIN_OVERLAP = float(os.getenv("VERIFICATION_MIN_OVERLAP", "0.5"))
+
+# Meta-commentary the verification prompt is asked to remove
+ANSWER_META_PHRASES = [
+    "based on the context",
+    "according to the context",
+    "according to the documents",
+    "the provided context"
+]
+
+
+def content_words(text: str) -> set[str]:
+    """Lowercase words of 4+ characters, a cheap proxy for content terms."""
+    return set(re.findall(r"[a-z0-9]{4,}", text.lower()))
+
+
+def lexical_overlap(answer: str, context: str) -> float:
+    """Fraction of the answer's content words that also appear in the context."""
+    answer_words = content_words(answer)
+    if not answer_words:
+        return 0.0
+    return len(answer_words & content_words(context)) / len(answer_words)
+
+
+def needs_verification(answer: str, context: str) -> bool:
+    """Cheap local signals that an answer may be weak."""
+    if len(answer.strip()) < VERIFICATION_MIN_ANSWER_CHARS:
+        return True
+    
+    if any(phrase in answer.lower() for phrase in ANSWER_META_PHRASES):
+        return True
+    
+    return lexical_overlap(answer, context) < VERIFICATION_MIN_OVERLAP
+
+
+def route_verification(state: QAState) -> str:
+    """Graph router: decide whether the Verification Agent runs."""
+    if VERIFICATION_MODE == "off":
+        run = False
+    elif VERIFICATION_MODE == "sampled":
+        run = random.random() < VERIFICATION_SAMPLE_RATE
+    elif VERIFICATION_MODE == "triggered":
+        run = needs_verification(state.get("answer") or "", state.get("context") or "")
+    else:
+        run = True
+    
+    if not run:
+        print(f"\n⏭️  Skipping verification (mode: {VERIFICATION_MODE})")
+        return "skip"
+    
+    return "verification"
 
 
 # def verification_node(state: QAState) -> dict:
@@ -125,14 +457,16 @@ def summarization_node(state: QAState) -> dict:
     
 #     return {"answer": verified_answer}
 
-def verification_node(state: QAState) -> dict:
+async def verification_node(state: QAState) -> dict:
     """
     Verification Agent: Validates and refines the answer.
     Returns the final polished answer.
     """
     question = state["question"]
     answer = state.get("answer", "")
-    context = state.get("context", "")
+    
+    # A smaller budget than summarization: only needed for a sanity check
+    context, _ = build_context(state.get("documents") or [], VERIFICATION_CONTEXT_TOKENS)
     
     print(f"\n✅ VERIFICATION AGENT: Reviewing answer quality...")
     
@@ -146,7 +480,7 @@ Current Answer:
 {answer}
 
 Available Context:
-{context[:500]}...
+{context}
 
 Your task:
 1. If the answer is accurate and complete → Return it EXACTLY as written
@@ -161,7 +495,7 @@ IMPORTANT: Return ONLY the final answer text. Do NOT include:
 
 Final Answer:"""
     
-    response = verification_llm.invoke([HumanMessage(content=verification_prompt)])
+    response = await invoke_llm(verification_llm, verification_prompt)
     verified_answer = response.content.strip()
     
     # Safety check: detect if LLM returned analysis instead of answer
@@ -183,6 +517,6 @@ Final Answer:"""
     
     print()
     
-    return {"answer": verified_answer}
+    return {"answer": verified_answer, "verified": True}
 
 
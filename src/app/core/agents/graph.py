@@ -2,11 +2,14 @@
 
 from langgraph.graph import StateGraph, START, END
 from .state import QAState
+from ..metrics import instrument_node
 from .agents import (
     planning_node,
     retrieval_node,
     summarization_node,
-    verification_node
+    verification_node,
+    route_question,
+    route_verification
 )
 
 
@@ -16,17 +19,27 @@ def create_qa_graph():
     # Initialize graph
     graph = StateGraph(QAState)
     
-    # Add nodes
-    graph.add_node("planning", planning_node)
-    graph.add_node("retrieval", retrieval_node)
-    graph.add_node("summarization", summarization_node)
-    graph.add_node("verification", verification_node)
+    # Add nodes (each run is timed as a pipeline stage, see metrics.py)
+    graph.add_node("planning", instrument_node("planning", planning_node))
+    graph.add_node("retrieval", instrument_node("retrieval", retrieval_node))
+    graph.add_node("summarization", instrument_node("summarization", summarization_node))
+    graph.add_node("verification", instrument_node("verification", verification_node))
     
-    # Define flow: START → planning → retrieval → summarization → verification → END
-    graph.add_edge(START, "planning")
+    # Define flow: START → [planning] → retrieval → summarization → [verification] → END
+    # Simple questions skip planning and retrieve with the question alone
+    graph.add_conditional_edges(
+        START,
+        route_question,
+        {"planning": "planning", "retrieval": "retrieval"}
+    )
     graph.add_edge("planning", "retrieval")
     graph.add_edge("retrieval", "summarization")
-    graph.add_edge("summarization", "verification")
+    # The verification policy decides whether the extra LLM pass runs
+    graph.add_conditional_edges(
+        "summarization",
+        route_verification,
+        {"verification": "verification", "skip": END}
+    )
     graph.add_edge("verification", END)
     
     return graph.compile()
@@ -1,5 +1,7 @@
 from typing import TypedDict
 
+from langchain_core.documents import Document
+
 
 class QAState(TypedDict):
     """State for the QA pipeline."""
@@ -11,8 +13,15 @@ class QAState(TypedDict):
     plan: str | None
     sub_questions: list[str] | None
     
-    # Retrieval
+    # Retrieval (deduplicated, RRF-ranked chunks)
+    documents: list[Document] | None
+    
+    # Context sent to the Summarization Agent and its citation map
     context: str | None
+    citations: dict[str, dict] | None
     
     # Answer Generation
-    answer: str | None
\ No newline at end of file
+    answer: str | None
+    
+    # Verification (False when the policy skipped it)
+    verified: bool | None
\ No newline at end of file
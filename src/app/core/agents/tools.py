@@ -1,26 +1,22 @@
 """Tools for agents - Pinecone with Gemini embeddings."""
 
+from typing import List
+
+from langchain_core.documents import Document
 from langchain_core.tools import tool
-from ..retrieval.vector_store import vector_store_manager
+from ..retrieval.vector_store import get_vector_store_manager
 
 
-@tool
-def retrieval_tool(query: str) -> str:
+def format_search_results(results: List[Document]) -> str:
     """
-    Search Pinecone vector database for relevant information.
-    Uses FREE Gemini embeddings for semantic search.
+    Format search results as a context block with chunk IDs.
     
     Args:
-        query: The search query
+        results: Documents returned by the vector store
         
     Returns:
-        Relevant context from Pinecone
+        Formatted context string
     """
-    print(f" Searching Pinecone for: {query[:60]}...")
-    
-    # Semantic search in Pinecone
-    results = vector_store_manager.search(query, k=4)
-    
     if not results:
         return "No relevant information found in the database."
     
@@ -37,4 +33,24 @@ def retrieval_tool(query: str) -> str:
     
     formatted_context = "\n\n" + ("=" * 60 + "\n\n").join(context_parts)
     
-    return formatted_context
\ No newline at end of file
+    return formatted_context
+
+
+@tool
+def retrieval_tool(query: str) -> str:
+    """
+    Search Pinecone vector database for relevant information.
+    Uses FREE Gemini embeddings for semantic search.
+    
+    Args:
+        query: The search query
+        
+    Returns:
+        Relevant context from Pinecone
+    """
+    print(f" Searching Pinecone for: {query[:60]}...")
+    
+    # Semantic search in Pinecone
+    results = get_vector_store_manager().search(query, k=4)
+    
+    return format_search_results(results)
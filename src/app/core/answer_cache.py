@@ -0,0 +1,144 @@
+"""Semantic answer cache for the QA endpoint."""
+
+import os
+import threading
+import time
+from typing import List, Optional
+
+import numpy as np
+
+
+ANSWER_CACHE_SIZE = int(os.getenv("ANSWER_CACHE_SIZE", "256"))
+ANSWER_CACHE_TTL_SECONDS = float(os.getenv("ANSWER_CACHE_TTL_SECONDS", "3600"))
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", "0.95"))
+
+
+class SemanticAnswerCache:
+    """
+    Caches QA responses keyed on the question embedding.
+    
+    A lookup returns the stored response of the most similar cached
+    question when cosine similarity reaches the threshold. Entries expire
+    after ttl_seconds, and the oldest entry is evicted once max_entries
+    is reached. clear() must be called whenever the corpus changes.
+    """
+    
+    def __init__(self, max_entries: int = 256, ttl_seconds: float = 3600,
+                 threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        
+        self._vectors: List[np.ndarray] = []
+        self._responses: List[dict] = []
+        self._created: List[float] = []
+        self._lock = threading.Lock()
+        
+        # Bumped by clear() so answers computed on an old corpus are dropped
+        self.generation = 0
+        
+        self.hits = 0
+        self.misses = 0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+    
+    def lookup(self, embedding: List[float]) -> Optional[dict]:
+        """
+        Find a cached response for a question embedding.
+        
+        Args:
+            embedding: Question embedding
+            
+        Returns:
+            The cached response dict, or None on a miss
+        """
+        if not self.enabled:
+            return None
+        
+        query = self._normalize(embedding)
+        
+        with self._lock:
+            self._expire()
+            
+            if self._vectors:
+                scores = np.stack(self._vectors) @ query
+                best = int(np.argmax(scores))
+                if scores[best] >= self.threshold:
+                    self.hits += 1
+                    return dict(self._responses[best])
+            
+            self.misses += 1
+            return None
+    
+    def store(self, embedding: List[float], response: dict, generation: int):
+        """
+        Cache a response.
+        
+        Args:
+            embedding: Question embedding
+            response: Serialized QA response
+            generation: Value of self.generation when the answer was computed
+        """
+        if not self.enabled:
+            return
+        
+        with self._lock:
+            if generation != self.generation:
+                return
+            
+            self._expire()
+            
+            while len(self._vectors) >= self.max_entries:
+                self._evict(0)
+            
+            self._vectors.append(self._normalize(embedding))
+            self._responses.append(dict(response))
+            self._created.append(time.monotonic())
+    
+    def clear(self):
+        """Drop every cached answer (call after the corpus changes)."""
+        with self._lock:
+            self._vectors.clear()
+            self._responses.clear()
+            self._created.clear()
+            self.generation += 1
+    
+    def stats(self) -> dict:
+        """Hit/miss counters and current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._vectors),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+    
+    def _expire(self):
+        # Entries are appended in creation order, so expired ones are at the front
+        cutoff = time.monotonic() - self.ttl_seconds
+        while self._created and self._created[0] < cutoff:
+            self._evict(0)
+    
+    def _evict(self, i: int):
+        del self._vectors[i]
+        del self._responses[i]
+        del self._created[i]
+    
+    @staticmethod
+    def _normalize(embedding: List[float]) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+answer_cache = SemanticAnswerCache(
+    max_entries=ANSWER_CACHE_SIZE,
+    ttl_seconds=ANSWER_CACHE_TTL_SECONDS,
+    threshold=ANSWER_CACHE_THRESHOLD
+)
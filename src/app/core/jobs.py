@@ -0,0 +1,188 @@
+"""
+Background PDF ingestion jobs.
+
+/api/index-pdf spools the upload to INGEST_UPLOAD_DIR and enqueues a job;
+a small pool of worker threads indexes queued files one batch at a time
+(see retrieval/ingestion.py), so the request returns immediately and QA
+requests keep being served while large corpora load. Gemini embedding
+requests from every job go through the shared limiter in ratelimit.py.
+"""
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import BinaryIO, List, Optional
+
+from .answer_cache import answer_cache
+from .retrieval.ingestion import IngestionCancelled
+
+
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_UPLOAD_DIR = os.getenv("INGEST_UPLOAD_DIR", "uploads")
+
+# Finished jobs kept for the progress endpoints
+INGEST_JOB_HISTORY = int(os.getenv("INGEST_JOB_HISTORY", "100"))
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+FINISHED = {COMPLETED, FAILED, CANCELLED}
+
+
+class IngestionJob:
+    """State and progress counters of one queued PDF."""
+    
+    def __init__(self, filename: str, path: Path):
+        self.id = uuid.uuid4().hex
+        self.filename = filename
+        self.path = path
+        self.status = QUEUED
+        self.error: Optional[str] = None
+        
+        self.pages_total = 0
+        self.pages_parsed = 0
+        self.chunks_embedded = 0
+        self.vectors_upserted = 0
+        self.vectors_deleted = 0
+        
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        
+        self.cancel_event = threading.Event()
+    
+    def update(self, **counters):
+        """Progress callback for index_pdf_stream."""
+        for name, value in counters.items():
+            setattr(self, name, value)
+    
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "filename": self.filename,
+            "status": self.status,
+            "error": self.error,
+            "cancel_requested": self.cancel_event.is_set(),
+            "pages_total": self.pages_total,
+            "pages_parsed": self.pages_parsed,
+            "chunks_embedded": self.chunks_embedded,
+            "vectors_upserted": self.vectors_upserted,
+            "vectors_deleted": self.vectors_deleted,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+
+class IngestionJobQueue:
+    """Thread pool that indexes uploaded PDFs in the background."""
+    
+    def __init__(self, workers: int = 1, upload_dir: str = "uploads", history: int = 100):
+        self.workers = max(workers, 1)
+        self.upload_dir = Path(upload_dir)
+        self.history = history
+        
+        self._jobs: "OrderedDict[str, IngestionJob]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor: Optional[ThreadPoolExecutor] = None
+    
+    def submit(self, manager, upload: BinaryIO, filename: str) -> IngestionJob:
+        """
+        Spool an upload to disk and queue it for indexing.
+        
+        Args:
+            manager: VectorStoreBackend to index into
+            upload: Binary file object of the uploaded PDF
+            filename: Original file name
+        
+        Returns:
+            The queued job
+        """
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        
+        job = IngestionJob(filename, self.upload_dir / f"{uuid.uuid4().hex}.pdf")
+        with job.path.open("wb") as buffer:
+            shutil.copyfileobj(upload, buffer)
+        
+        with self._lock:
+            self._jobs[job.id] = job
+            self._prune()
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="ingest"
+                )
+            self._executor.submit(self._run, manager, job)
+        
+        print(f" Queued ingestion job {job.id} for {filename}")
+        
+        return job
+    
+    def get(self, job_id: str) -> Optional[IngestionJob]:
+        with self._lock:
+            return self._jobs.get(job_id)
+    
+    def list_jobs(self) -> List[IngestionJob]:
+        with self._lock:
+            return list(self._jobs.values())
+    
+    def cancel(self, job_id: str) -> Optional[IngestionJob]:
+        """
+        Cancel a job. A queued job never starts; a running job stops before
+        its next batch (chunks already upserted stay indexed).
+        """
+        job = self.get(job_id)
+        if job is not None and job.status not in FINISHED:
+            job.cancel_event.set()
+        return job
+    
+    def _run(self, manager, job: IngestionJob):
+        if job.cancel_event.is_set():
+            job.status = CANCELLED
+            job.finished_at = time.time()
+            job.path.unlink(missing_ok=True)
+            return
+        
+        job.status = RUNNING
+        job.started_at = time.time()
+        
+        def on_progress(**counters):
+            job.update(**counters)
+            # A batch changed the corpus, so cached answers may be stale
+            # (clearing also bumps the generation, so answers computed
+            # before the batch are not stored afterwards)
+            if counters.get("vectors_upserted") or counters.get("vectors_deleted"):
+                answer_cache.clear()
+        
+        try:
+            manager.index_pdf(
+                str(job.path), job.filename,
+                on_progress=on_progress, cancel_event=job.cancel_event
+            )
+            job.status = COMPLETED
+            print(f" Ingestion job {job.id} completed: {job.vectors_upserted} vectors")
+        except IngestionCancelled:
+            job.status = CANCELLED
+            print(f" Ingestion job {job.id} cancelled")
+        except Exception as e:
+            job.status = FAILED
+            job.error = str(e)
+            print(f"ERROR in ingestion job {job.id}: {e}")
+        finally:
+            job.finished_at = time.time()
+            job.path.unlink(missing_ok=True)
+    
+    def _prune(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(len(finished) - self.history, 0)]:
+            del self._jobs[job_id]
+
+
+ingestion_jobs = IngestionJobQueue(INGEST_WORKERS, INGEST_UPLOAD_DIR, INGEST_JOB_HISTORY)
@@ -0,0 +1,114 @@
+"""
+Lazily created, process-wide clients.
+
+Connecting to Pinecone and building Gemini clients used to happen at
+import time, so every cold start (e.g. a new Vercel instance) paid for it
+before the app could answer anything. Each client is now a Lazy: it is
+created on first use, exactly once even when concurrent requests race for
+it, and can be created ahead of time by warm_up() from the app's lifespan
+hook. /api/health reports the state of every registered client.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Callable, Dict, Generic, Optional, TypeVar
+
+
+T = TypeVar("T")
+
+# Every Lazy, by name, for warm_up() and health reporting
+registry: Dict[str, "Lazy"] = {}
+
+
+class Lazy(Generic[T]):
+    """Thread-safe lazily built singleton with readiness state."""
+    
+    def __init__(self, name: str, factory: Callable[[], T]):
+        """
+        Args:
+            name: Component name shown by /api/health
+            factory: Zero-argument function building the value
+        """
+        self.name = name
+        self.factory = factory
+        
+        self._value: Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+        
+        self.error: Optional[str] = None
+        self.init_seconds: Optional[float] = None
+        
+        registry[name] = self
+    
+    @property
+    def ready(self) -> bool:
+        return self._ready
+    
+    def get(self) -> T:
+        """Return the value, building it on first use (a failed build is retried next call)."""
+        if self._ready:
+            return self._value
+        
+        with self._lock:
+            if not self._ready:
+                start = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.error = str(e)
+                    raise
+                self.init_seconds = time.perf_counter() - start
+                self.error = None
+                self._ready = True
+        
+        return self._value
+    
+    async def aget(self) -> T:
+        """Async get; a first build runs on a worker thread so the event loop keeps serving."""
+        if self._ready:
+            return self._value
+        return await asyncio.to_thread(self.get)
+    
+    def reset(self):
+        """Drop the value so the next get() builds a new one (e.g. after its client was closed)."""
+        with self._lock:
+            self._value = None
+            self._ready = False
+            self.init_seconds = None
+    
+    def set(self, value: T):
+        """Replace the value (offline benchmarks install fakes this way)."""
+        with self._lock:
+            self._value = value
+            self.error = None
+            self._ready = True
+    
+    def status(self) -> dict:
+        return {
+            "ready": self._ready,
+            "error": self.error,
+            "init_seconds": round(self.init_seconds, 3) if self.init_seconds is not None else None
+        }
+
+
+def warm_up():
+    """Build every registered client now instead of on the first request."""
+    for lazy in list(registry.values()):
+        try:
+            lazy.get()
+        except Exception as e:
+            print(f"WARNING: could not initialize {lazy.name}: {e}")
+
+
+def start_warm_up() -> threading.Thread:
+    """Run warm_up() on a background thread (startup does not wait for it)."""
+    thread = threading.Thread(target=warm_up, name="warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def readiness() -> dict:
+    """State of every registered client."""
+    return {name: lazy.status() for name, lazy in registry.items()}
@@ -0,0 +1,302 @@
+"""
+Shared, pooled Gemini chat clients.
+
+Every model gets one google-genai Client over one pooled httpx transport
+(a sync and an async client, HTTP/2 when the h2 package is installed), so
+the planner, summarizer and verifier reuse the same warm connections
+instead of each opening their own. Roles get their own chat model object
+carrying per-role settings (model, temperature, output limit, timeout),
+all backed by their model's shared client.
+
+langchain-google-genai has no way to pass a Client in, so each chat model
+has the Client it built for itself closed and replaced by the pooled one
+(ModelPool.attach). That relies on the 4.x ChatGoogleGenerativeAI keeping
+its Client in the `client` field; requirements.txt pins that major version
+and attach() refuses to run against anything else.
+
+Per-model concurrency is capped in one place (LLM_MAX_CONCURRENCY): with
+HTTP/2 many requests share a single connection, so the connection limit
+alone does not bound how many calls are in flight.
+
+Roles can be tuned with LLM_ROLE_SETTINGS, e.g.
+    LLM_ROLE_SETTINGS="verifier.model=gemini-2.5-flash-lite,summarizer.timeout=90"
+"""
+
+import asyncio
+import os
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from .lazy import Lazy
+
+
+LLM_MODEL = os.getenv("LLM_MODEL", "gemini-2.5-flash")
+
+# Connection pool per model
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() == "true"
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", "10"))
+LLM_KEEPALIVE_SECONDS = float(os.getenv("LLM_KEEPALIVE_SECONDS", "60"))
+LLM_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_CONNECT_TIMEOUT_SECONDS", "10"))
+
+# Default per-call timeout (roles can override it)
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "60"))
+
+# Calls in flight per model across all roles and requests (0 = unlimited)
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "0"))
+
+LLM_ROLE_SETTINGS = os.getenv("LLM_ROLE_SETTINGS", "")
+
+# langchain-google-genai major version the client swap is written against
+LANGCHAIN_GOOGLE_GENAI_MAJOR = 4
+
+ROLE_DEFAULTS: Dict[str, Dict[str, Any]] = {
+    "planner": {"model": LLM_MODEL, "temperature": 0.0, "timeout": LLM_TIMEOUT_SECONDS,
+                "max_output_tokens": None},
+    "summarizer": {"model": LLM_MODEL, "temperature": 0.0, "timeout": LLM_TIMEOUT_SECONDS,
+                   "max_output_tokens": None},
+    "verifier": {"model": LLM_MODEL, "temperature": 0.0, "timeout": LLM_TIMEOUT_SECONDS,
+                 "max_output_tokens": None},
+}
+
+ROLE_SETTING_TYPES = {"model": str, "temperature": float, "timeout": float, "max_output_tokens": int}
+
+
+def parse_role_settings(spec: str) -> Dict[str, Dict[str, Any]]:
+    """Parse LLM_ROLE_SETTINGS ("role.key=value,...") into {role: {key: value}}."""
+    settings: Dict[str, Dict[str, Any]] = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = entry.partition("=")
+        role, _, key = name.strip().partition(".")
+        if key not in ROLE_SETTING_TYPES:
+            raise ValueError(f"Unknown LLM role setting {name!r}; use one of {list(ROLE_SETTING_TYPES)}")
+        settings.setdefault(role, {})[key] = ROLE_SETTING_TYPES[key](value.strip())
+    return settings
+
+
+def http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def chat_user_agent() -> str:
+    """The user-agent header ChatGoogleGenerativeAI puts on its own Client."""
+    from langchain_google_genai._common import get_user_agent
+    
+    _, user_agent = get_user_agent("ChatGoogleGenerativeAI")
+    return user_agent
+
+
+class ModelPool:
+    """One pooled HTTP transport and google-genai Client for a model."""
+    
+    def __init__(self, model: str, api_key: Optional[str]):
+        from google import genai
+        from google.genai.types import HttpOptions
+        
+        self.model = model
+        self.http2 = LLM_HTTP2 and http2_available()
+        if LLM_HTTP2 and not self.http2:
+            print("WARNING: LLM_HTTP2 is on but the h2 package is missing; using HTTP/1.1")
+        
+        limits = httpx.Limits(
+            max_connections=LLM_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=LLM_KEEPALIVE_SECONDS
+        )
+        # Per-call timeouts are set on each request by the chat model
+        timeout = httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS)
+        
+        self.http_client = httpx.Client(http2=self.http2, limits=limits, timeout=timeout)
+        self.async_http_client = httpx.AsyncClient(http2=self.http2, limits=limits, timeout=timeout)
+        self.client = genai.Client(
+            api_key=api_key,
+            # Same headers, base URL and API version the chat model would use
+            http_options=HttpOptions(
+                headers={"user-agent": chat_user_agent()},
+                httpx_client=self.http_client,
+                httpx_async_client=self.async_http_client
+            )
+        )
+    
+    def attach(self, llm):
+        """
+        Point a chat model at this pool's Client.
+        
+        The Client the model built in its validator is closed first, so no
+        per-role transport is left behind.
+        
+        Args:
+            llm: A freshly built ChatGoogleGenerativeAI
+        
+        Raises:
+            RuntimeError: If the installed langchain-google-genai is not the
+                major version this swap was written against
+        """
+        from importlib.metadata import version
+        from google import genai
+        
+        installed = version("langchain-google-genai")
+        own_client = getattr(llm, "client", None)
+        if int(installed.split(".")[0]) != LANGCHAIN_GOOGLE_GENAI_MAJOR or not isinstance(own_client, genai.Client):
+            raise RuntimeError(
+                f"langchain-google-genai {installed} is not supported: the pooled client "
+                f"swap needs {LANGCHAIN_GOOGLE_GENAI_MAJOR}.x (see requirements.txt)"
+            )
+        
+        own_client.close()
+        llm.client = self.client
+    
+    def stats(self) -> dict:
+        return {
+            "http2": self.http2,
+            "max_connections": LLM_MAX_CONNECTIONS,
+            "max_keepalive_connections": LLM_MAX_KEEPALIVE_CONNECTIONS,
+            "keepalive_seconds": LLM_KEEPALIVE_SECONDS
+        }
+    
+    async def aclose(self):
+        await self.async_http_client.aclose()
+        self.http_client.close()
+
+
+class LLMRegistry:
+    """Chat models per role, sharing one ModelPool per model."""
+    
+    def __init__(self, role_settings: Optional[Dict[str, Dict[str, Any]]] = None,
+                 max_concurrency: int = 0):
+        self.role_settings = role_settings or {}
+        self.max_concurrency = max_concurrency
+        
+        self._pools: Dict[str, ModelPool] = {}
+        self._models: Dict[str, Any] = {}
+        self._holders: List[Lazy] = []
+        self._lock = threading.Lock()
+        
+        # One semaphore per (event loop, model), like the retrieval semaphores
+        self._semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Semaphore]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self.in_flight: Dict[str, int] = {}
+    
+    def settings(self, role: str) -> Dict[str, Any]:
+        """Effective settings of a role (defaults, then LLM_ROLE_SETTINGS overrides)."""
+        defaults = ROLE_DEFAULTS.get(role, ROLE_DEFAULTS["planner"])
+        return {**defaults, **self.role_settings.get(role, {})}
+    
+    def pool(self, model: str) -> ModelPool:
+        with self._lock:
+            pool = self._pools.get(model)
+            if pool is None:
+                pool = self._pools[model] = ModelPool(model, os.getenv("GOOGLE_API_KEY"))
+            return pool
+    
+    def chat_model(self, role: str):
+        """
+        The chat model of a role, created on first use.
+        
+        Args:
+            role: "planner", "summarizer" or "verifier"
+        
+        Returns:
+            ChatGoogleGenerativeAI backed by the role's model pool
+        """
+        from langchain_google_genai import ChatGoogleGenerativeAI
+        
+        with self._lock:
+            llm = self._models.get(role)
+        if llm is not None:
+            return llm
+        
+        settings = self.settings(role)
+        pool = self.pool(settings["model"])
+        
+        # Quota errors are retried by the shared rate limiter (see invoke_llm),
+        # not by the client, so every concurrent caller backs off together
+        llm = ChatGoogleGenerativeAI(
+            model=settings["model"],
+            temperature=settings["temperature"],
+            max_output_tokens=settings["max_output_tokens"],
+            timeout=settings["timeout"],
+            max_retries=1,
+            convert_system_message_to_human=True
+        )
+        pool.attach(llm)
+        
+        with self._lock:
+            return self._models.setdefault(role, llm)
+    
+    def lazy_chat_model(self, name: str, role: str) -> Lazy:
+        """
+        A Lazy holding a role's chat model, built on first use.
+        
+        aclose() resets the holder, so a model used after shutdown (e.g. by
+        an app restarted in the same process) is rebuilt on a new pool
+        instead of calling through closed connections.
+        
+        Args:
+            name: Component name shown by /api/health
+            role: "planner", "summarizer" or "verifier"
+        """
+        lazy = Lazy(name, lambda: self.chat_model(role))
+        with self._lock:
+            self._holders.append(lazy)
+        return lazy
+    
+    @asynccontextmanager
+    async def slot(self, model: str):
+        """Hold one of the model's LLM_MAX_CONCURRENCY call slots."""
+        if self.max_concurrency <= 0:
+            yield
+            return
+        
+        loop = asyncio.get_running_loop()
+        semaphores = self._semaphores.setdefault(loop, {})
+        semaphore = semaphores.get(model)
+        if semaphore is None:
+            semaphore = semaphores[model] = asyncio.Semaphore(self.max_concurrency)
+        
+        async with semaphore:
+            self.in_flight[model] = self.in_flight.get(model, 0) + 1
+            try:
+                yield
+            finally:
+                self.in_flight[model] -= 1
+    
+    def stats(self) -> dict:
+        with self._lock:
+            pools = dict(self._pools)
+            roles = list(self._models)
+        return {
+            "max_concurrency": self.max_concurrency,
+            "roles": {role: self.settings(role) for role in roles},
+            "pools": {model: pool.stats() for model, pool in pools.items()},
+            "in_flight": dict(self.in_flight)
+        }
+    
+    async def aclose(self):
+        """Close every pooled connection (app shutdown)."""
+        with self._lock:
+            pools = list(self._pools.values())
+            models = list(self._models.values())
+            self._pools.clear()
+            self._models.clear()
+            holders = list(self._holders)
+        
+        # Holders set to something else (fakes in benchmarks) keep their value
+        for lazy in holders:
+            if lazy.ready and any(lazy.get() is model for model in models):
+                lazy.reset()
+        
+        for pool in pools:
+            await pool.aclose()
+
+
+llm_registry = LLMRegistry(parse_role_settings(LLM_ROLE_SETTINGS), LLM_MAX_CONCURRENCY)
@@ -0,0 +1,304 @@
+"""
+Per-stage latency, token and cache instrumentation for the QA pipeline.
+
+Every QA request runs inside track_request(), which puts a RequestTrace in
+a context variable. The graph nodes (wrapped by instrument_node), LLM
+calls, retrievals and cache lookups record into the current trace and into
+process-wide counters and histograms at the same time:
+
+- the trace is returned per request in QAResponse.debug (QARequest.debug)
+- the process-wide metrics are served in the Prometheus text format by
+  /api/metrics
+
+LangGraph runs each node in a copy of the caller's context, so the trace
+set by the endpoint is visible inside the nodes without threading it
+through the graph state.
+"""
+
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Awaitable, Callable, Dict, Iterator, Optional, Tuple
+
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def format_labels(names: Tuple[str, ...], values: Tuple[str, ...]) -> str:
+    """Prometheus label set, e.g. {stage="planning"} (empty without labels)."""
+    if not names:
+        return ""
+    escaped = (
+        str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        for value in values
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in zip(names, escaped)) + "}"
+
+
+class Counter:
+    """Monotonic counter with labels."""
+    
+    kind = "counter"
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+    
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = dict(self._values)
+        for label_values, value in sorted(values.items()):
+            yield f"{self.name}{format_labels(self.labels, label_values)} {value:g}"
+
+
+class Histogram:
+    """Cumulative-bucket histogram with labels."""
+    
+    kind = "histogram"
+    
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.buckets = buckets
+        
+        # label values -> [per-bucket counts (+inf last), sum]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, *label_values: str):
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            counts = entry[0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[i] += 1
+                    break
+            else:
+                counts[-1] += 1
+            entry[1] += value
+    
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+        
+        names = self.labels + ("le",)
+        for label_values, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                yield f"{self.name}_bucket{format_labels(names, label_values + (le,))} {cumulative}"
+            labels = format_labels(self.labels, label_values)
+            yield f"{self.name}_sum{labels} {total:.6f}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class MetricsRegistry:
+    """Process-wide metrics, rendered in the Prometheus text format."""
+    
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+    
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help_text, labels))
+    
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help_text, labels))
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+request_count = metrics.counter(
+    "qa_requests_total", "QA requests by endpoint and outcome", ("endpoint", "outcome"))
+request_seconds = metrics.histogram(
+    "qa_request_duration_seconds", "End-to-end QA request latency", ("endpoint", "outcome"))
+stage_seconds = metrics.histogram(
+    "qa_stage_duration_seconds", "Wall time of each QA pipeline stage", ("stage",))
+llm_calls = metrics.counter(
+    "llm_calls_total", "Chat model calls", ("stage", "model"))
+llm_seconds = metrics.histogram(
+    "llm_call_duration_seconds", "Chat model call latency, including rate limiting", ("stage",))
+llm_prompt_tokens = metrics.counter(
+    "llm_prompt_tokens_total", "Prompt tokens sent to chat models", ("stage", "model"))
+llm_completion_tokens = metrics.counter(
+    "llm_completion_tokens_total", "Completion tokens returned by chat models", ("stage", "model"))
+retrieval_searches = metrics.counter(
+    "retrieval_searches_total", "Retrieval searches by kind (dense or keyword)", ("kind",))
+retrieval_embedding_calls = metrics.counter(
+    "retrieval_embedding_calls_total", "Batched query embedding calls made by retrieval")
+retrieval_chunks = metrics.counter(
+    "retrieval_chunks_total", "Chunks returned by retrieval (retrieved, or unique after fusion)", ("kind",))
+retrieval_errors = metrics.counter(
+    "retrieval_errors_total", "Retrieval failures answered with fewer results instead of an error", ("kind",))
+cache_lookups = metrics.counter(
+    "cache_lookups_total", "Cache lookups by cache and result", ("cache", "result"))
+
+
+class RequestTrace:
+    """Timings and counters of one QA request (QAResponse.debug)."""
+    
+    def __init__(self, endpoint: str):
+        self.endpoint = endpoint
+        self.outcome = "answered"
+        self.started = time.perf_counter()
+        self.total_seconds: Optional[float] = None
+        
+        self.stages: Dict[str, float] = {}
+        self.llm: Dict[str, dict] = {}
+        self.retrieval = {"searches": 0, "keyword_searches": 0, "embedding_calls": 0,
+                          "chunks": 0, "unique_chunks": 0, "errors": 0}
+        self.cache: Dict[str, dict] = {}
+    
+    def to_dict(self) -> dict:
+        total = self.total_seconds
+        if total is None:
+            total = time.perf_counter() - self.started
+        return {
+            "total_seconds": round(total, 4),
+            "stages": {stage: round(seconds, 4) for stage, seconds in self.stages.items()},
+            "llm": self.llm,
+            "retrieval": self.retrieval,
+            "cache": self.cache
+        }
+
+
+current_trace: contextvars.ContextVar[Optional[RequestTrace]] = contextvars.ContextVar(
+    "current_trace", default=None
+)
+current_stage: contextvars.ContextVar[str] = contextvars.ContextVar("current_stage", default="none")
+
+
+@contextmanager
+def track_request(endpoint: str) -> Iterator[RequestTrace]:
+    """
+    Trace one QA request; set trace.outcome (e.g. "cached") before it ends.
+    
+    Args:
+        endpoint: Endpoint label ("qa", "qa_stream")
+    
+    Yields:
+        The request's RequestTrace
+    """
+    trace = RequestTrace(endpoint)
+    token = current_trace.set(trace)
+    try:
+        yield trace
+    except BaseException:
+        trace.outcome = "error"
+        raise
+    finally:
+        trace.total_seconds = time.perf_counter() - trace.started
+        request_count.inc(endpoint, trace.outcome)
+        request_seconds.observe(trace.total_seconds, endpoint, trace.outcome)
+        try:
+            current_trace.reset(token)
+        except ValueError:
+            # A streaming response finalized from another context
+            pass
+
+
+@contextmanager
+def track_stage(stage: str):
+    """Time a pipeline stage into the stage histogram and the current trace."""
+    token = current_stage.set(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(seconds, stage)
+        trace = current_trace.get()
+        if trace is not None:
+            trace.stages[stage] = trace.stages.get(stage, 0.0) + seconds
+        current_stage.reset(token)
+
+
+def instrument_node(stage: str, node: Callable[[dict], Awaitable[dict]]) -> Callable[[dict], Awaitable[dict]]:
+    """Wrap an async graph node so each run is timed as `stage`."""
+    @functools.wraps(node)
+    async def instrumented(state: dict) -> dict:
+        with track_stage(stage):
+            return await node(state)
+    
+    return instrumented
+
+
+def record_llm_call(model: str, seconds: float, prompt_tokens: int, completion_tokens: int):
+    """Record one chat model call under the current stage."""
+    stage = current_stage.get()
+    llm_calls.inc(stage, model)
+    llm_seconds.observe(seconds, stage)
+    llm_prompt_tokens.inc(stage, model, amount=prompt_tokens)
+    llm_completion_tokens.inc(stage, model, amount=completion_tokens)
+    
+    trace = current_trace.get()
+    if trace is not None:
+        entry = trace.llm.setdefault(stage, {
+            "model": model, "calls": 0, "seconds": 0.0,
+            "prompt_tokens": 0, "completion_tokens": 0
+        })
+        entry["calls"] += 1
+        entry["seconds"] = round(entry["seconds"] + seconds, 4)
+        entry["prompt_tokens"] += prompt_tokens
+        entry["completion_tokens"] += completion_tokens
+
+
+def record_retrieval(searches: int, keyword_searches: int, embedding_calls: int,
+                     chunks: int, unique_chunks: int):
+    """Record the searches and chunk counts of one retrieval stage."""
+    retrieval_searches.inc("dense", amount=searches - keyword_searches)
+    retrieval_searches.inc("keyword", amount=keyword_searches)
+    retrieval_embedding_calls.inc(amount=embedding_calls)
+    retrieval_chunks.inc("retrieved", amount=chunks)
+    retrieval_chunks.inc("unique", amount=unique_chunks)
+    
+    trace = current_trace.get()
+    if trace is not None:
+        counts = trace.retrieval
+        counts["searches"] += searches
+        counts["keyword_searches"] += keyword_searches
+        counts["embedding_calls"] += embedding_calls
+        counts["chunks"] += chunks
+        counts["unique_chunks"] += unique_chunks
+
+
+def record_retrieval_error(kind: str):
+    """Record a retrieval failure the pipeline absorbed (timeout, failed search or embedding)."""
+    retrieval_errors.inc(kind)
+    
+    trace = current_trace.get()
+    if trace is not None:
+        trace.retrieval["errors"] += 1
+
+
+def record_cache(cache: str, hit: bool):
+    """Record a lookup in one of the caches (answer, planner, embedding)."""
+    cache_lookups.inc(cache, "hit" if hit else "miss")
+    
+    trace = current_trace.get()
+    if trace is not None:
+        entry = trace.cache.setdefault(cache, {"hits": 0, "misses": 0})
+        entry["hits" if hit else "misses"] += 1
@@ -0,0 +1,393 @@
+"""
+Shared rate limiting for Gemini calls.
+
+Every quota (a model + endpoint pair such as "gemini-2.5-flash:generate")
+gets one QuotaLimiter per process, holding a requests-per-minute and a
+tokens-per-minute token bucket. Callers reserve capacity before each call
+and only wait as long as the buckets require. Calls that still fail with
+RESOURCE_EXHAUSTED (429) or UNAVAILABLE (503) are retried with jittered
+exponential backoff, and the failure drains the shared request bucket so
+concurrent callers slow down too.
+
+Limits come from LLM_RPM / LLM_TPM and EMBEDDING_RPM / EMBEDDING_TPM, and
+can be set per quota with RATE_LIMITS, e.g.
+    RATE_LIMITS="gemini-2.5-flash:generate=1000/1000000,gemini-embedding-001:embed=3000/1000000"
+A limit of 0 disables that bucket (backoff still applies).
+
+Background work (document embeddings for ingestion and indexing scripts)
+has lower priority than interactive query embeddings: it never borrows
+from future capacity and leaves EMBEDDING_QUERY_RESERVE of each embedding
+bucket untouched, so a large ingestion batch cannot push /api/qa queries
+into the future. A background charge bigger than a bucket admits at once
+is taken in parts over several refills.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Awaitable, Callable, Dict, Tuple, TypeVar
+
+
+# Gemini free tier: 100 embedded texts per minute, 30k tokens per minute
+EMBEDDING_RPM = float(os.getenv("EMBEDDING_RPM", "100"))
+EMBEDDING_TPM = float(os.getenv("EMBEDDING_TPM", "30000"))
+
+# Chat models are unlimited unless configured for the account's tier
+LLM_RPM = float(os.getenv("LLM_RPM", "0"))
+LLM_TPM = float(os.getenv("LLM_TPM", "0"))
+
+RATE_LIMITS = os.getenv("RATE_LIMITS", "")
+
+# Share of the embedding quota background work may never use (kept for queries)
+EMBEDDING_QUERY_RESERVE = float(os.getenv("EMBEDDING_QUERY_RESERVE", "0.2"))
+
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "5"))
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "2"))
+RATE_LIMIT_MAX_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_MAX_BACKOFF_SECONDS", "60"))
+
+# Quota and overload errors, as HTTP status codes and google.rpc status names
+RETRYABLE_STATUS_CODES = (429, 503)
+RETRYABLE_STATUSES = ("RESOURCE_EXHAUSTED", "UNAVAILABLE")
+
+T = TypeVar("T")
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket.
+    
+    Holds up to `per_minute` tokens and refills continuously at
+    per_minute / 60 tokens per second, so callers run at full speed
+    until the bucket is empty and are then spaced evenly instead of
+    sleeping a fixed interval.
+    """
+    
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.capacity = max(per_minute, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+        
+        self.waited_seconds = 0.0
+    
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+    
+    def _refill(self, now: float):
+        rate = self.per_minute / 60
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * rate)
+        self._updated = now
+    
+    def reserve(self, tokens: float = 1) -> float:
+        """
+        Take tokens from the bucket, possibly going into debt.
+        
+        Requests larger than the bucket are charged in full: the excess
+        is taken as debt, so the caller waits until all of it has been
+        refilled instead of exceeding the rate.
+        
+        Args:
+            tokens: Tokens needed (requests)
+        
+        Returns:
+            Seconds the caller must wait before proceeding
+        """
+        if not self.enabled:
+            return 0.0
+        
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens -= tokens
+            if self._tokens >= 0:
+                return 0.0
+            delay = -self._tokens / (self.per_minute / 60)
+            self.waited_seconds += delay
+            return delay
+    
+    def background_room(self, keep: float = 0.0) -> float:
+        """Most tokens a single reserve_background() call can take."""
+        return max(self.capacity - keep, 1.0)
+    
+    def reserve_background(self, tokens: float = 1, keep: float = 0.0) -> float:
+        """
+        Take tokens only if `keep` tokens stay available afterwards.
+        
+        Unlike reserve(), never goes into debt: when the tokens are not
+        there yet, nothing is taken and the caller retries after the
+        returned delay. A full bucket always admits the request.
+        
+        Args:
+            tokens: Tokens needed (requests), at most background_room(keep)
+            keep: Tokens left in the bucket for higher-priority callers
+        
+        Returns:
+            0 when the tokens were taken, otherwise seconds to wait before retrying
+        
+        Raises:
+            ValueError: If tokens can never fit; split the charge instead
+        """
+        if not self.enabled:
+            return 0.0
+        if tokens > self.background_room(keep):
+            raise ValueError(f"{tokens} tokens exceed the {self.background_room(keep)} a background reservation can take")
+        
+        with self._lock:
+            self._refill(time.monotonic())
+            missing = min(tokens + keep, self.capacity) - self._tokens
+            if missing <= 0:
+                self._tokens -= tokens
+                return 0.0
+            delay = missing / (self.per_minute / 60)
+            self.waited_seconds += delay
+            return delay
+    
+    def refund(self, tokens: float):
+        """Return tokens taken by a reservation that did not go ahead."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + tokens)
+    
+    def drain(self):
+        """Empty the bucket (the API reported the quota as exhausted)."""
+        if not self.enabled:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0)
+    
+    def acquire(self, tokens: float = 1):
+        """Block until `tokens` requests may be sent."""
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            self._refill(time.monotonic())
+            return {
+                "per_minute": self.per_minute,
+                "available": round(max(self._tokens, 0.0), 2),
+                "waited_seconds": round(self.waited_seconds, 2)
+            }
+
+
+def is_retryable_error(error: Exception) -> bool:
+    """
+    True for quota (429 RESOURCE_EXHAUSTED) and overload (503 UNAVAILABLE) errors.
+    
+    Reads the status fields the SDKs set (google-genai APIError.code and
+    .status, google-api-core .code, HTTP .status_code), on the error or on
+    the error it was raised from: langchain re-raises google-genai errors
+    as its own exception types.
+    """
+    while error is not None:
+        code = getattr(error, "code", None) or getattr(error, "status_code", None)
+        if code in RETRYABLE_STATUS_CODES or getattr(error, "status", None) in RETRYABLE_STATUSES:
+            return True
+        error = error.__cause__
+    return False
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough Gemini token count (about 4 characters per token)."""
+    return len(text) // 4 + 1
+
+
+class QuotaLimiter:
+    """Requests-per-minute and tokens-per-minute buckets for one quota, plus backoff."""
+    
+    def __init__(self, name: str, rpm: float, tpm: float,
+                 max_retries: int = 5, backoff_seconds: float = 2.0,
+                 max_backoff_seconds: float = 60.0, background_reserve: float = 0.0):
+        self.name = name
+        self.requests = RateLimiter(rpm)
+        self.tokens = RateLimiter(tpm)
+        # Fraction of each bucket background calls leave for interactive ones
+        self.background_reserve = background_reserve
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        
+        self.calls = 0
+        self.retries = 0
+    
+    def reserve(self, requests: float = 1, tokens: float = 0) -> float:
+        self.calls += 1
+        return max(self.requests.reserve(requests), self.tokens.reserve(tokens))
+    
+    def reserve_background(self, requests: float = 1, tokens: float = 0) -> float:
+        """
+        Low-priority reservation of both buckets; 0 once taken, else seconds to wait and retry.
+        
+        Each amount must fit in one reservation (see background_part).
+        """
+        delay = self.requests.reserve_background(
+            requests, self.requests.capacity * self.background_reserve
+        )
+        if delay > 0:
+            return delay
+        
+        delay = self.tokens.reserve_background(
+            tokens, self.tokens.capacity * self.background_reserve
+        )
+        if delay > 0:
+            self.requests.refund(requests)
+            return delay
+        
+        return 0.0
+    
+    def background_part(self, requests: float, tokens: float) -> Tuple[float, float]:
+        """The share of a background charge the next reservation takes (all of it if it fits)."""
+        if self.requests.enabled:
+            requests = min(requests, self.requests.background_room(self.requests.capacity * self.background_reserve))
+        if self.tokens.enabled:
+            tokens = min(tokens, self.tokens.background_room(self.tokens.capacity * self.background_reserve))
+        return requests, tokens
+    
+    def _wait_background(self, requests: float, tokens: float):
+        # Charges bigger than the buckets admit at once are taken part by part
+        while True:
+            part = self.background_part(requests, tokens)
+            delay = self.reserve_background(*part)
+            if delay > 0:
+                time.sleep(delay)
+                continue
+            requests, tokens = requests - part[0], tokens - part[1]
+            if requests <= 0 and tokens <= 0:
+                self.calls += 1
+                return
+    
+    async def _await_background(self, requests: float, tokens: float):
+        while True:
+            part = self.background_part(requests, tokens)
+            delay = self.reserve_background(*part)
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            requests, tokens = requests - part[0], tokens - part[1]
+            if requests <= 0 and tokens <= 0:
+                self.calls += 1
+                return
+    
+    def backoff_delay(self, attempt: int) -> float:
+        """Jittered exponential backoff for retry number `attempt` (0-based)."""
+        ceiling = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+        return random.uniform(ceiling / 2, ceiling)
+    
+    def _should_retry(self, error: Exception, attempt: int) -> bool:
+        if attempt >= self.max_retries or not is_retryable_error(error):
+            return False
+        self.retries += 1
+        self.requests.drain()
+        return True
+    
+    def call(self, fn: Callable[[], T], requests: float = 1, tokens: float = 0,
+             background: bool = False) -> T:
+        """
+        Run a blocking API call under the quota.
+        
+        Args:
+            fn: Zero-argument function making one API call
+            requests: Requests the call counts for
+            tokens: Estimated input tokens of the call
+            background: Low priority (see reserve_background)
+        
+        Returns:
+            Whatever fn returns
+        """
+        attempt = 0
+        while True:
+            if background:
+                self._wait_background(requests, tokens)
+            else:
+                delay = self.reserve(requests, tokens)
+                if delay > 0:
+                    time.sleep(delay)
+            try:
+                return fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                wait = self.backoff_delay(attempt)
+                print(f"⚠️ {self.name} rate limited, retrying in {wait:.1f}s ({e.__class__.__name__})")
+                time.sleep(wait)
+                attempt += 1
+    
+    async def acall(self, fn: Callable[[], Awaitable[T]], requests: float = 1,
+                    tokens: float = 0, background: bool = False) -> T:
+        """Async version of call; fn returns a new awaitable per attempt."""
+        attempt = 0
+        while True:
+            if background:
+                await self._await_background(requests, tokens)
+            else:
+                delay = self.reserve(requests, tokens)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            try:
+                return await fn()
+            except Exception as e:
+                if not self._should_retry(e, attempt):
+                    raise
+                wait = self.backoff_delay(attempt)
+                print(f"⚠️ {self.name} rate limited, retrying in {wait:.1f}s ({e.__class__.__name__})")
+                await asyncio.sleep(wait)
+                attempt += 1
+    
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests.stats(),
+            "tokens": self.tokens.stats(),
+            "calls": self.calls,
+            "retries": self.retries,
+            "background_reserve": self.background_reserve
+        }
+
+
+def parse_rate_limits(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse RATE_LIMITS ("name=rpm/tpm,...") into {name: (rpm, tpm)}."""
+    limits = {}
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, values = entry.partition("=")
+        rpm, _, tpm = values.partition("/")
+        limits[name.strip()] = (float(rpm or 0), float(tpm or 0))
+    return limits
+
+
+configured_limits = parse_rate_limits(RATE_LIMITS)
+
+rate_limiters: Dict[str, QuotaLimiter] = {}
+rate_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(model: str, endpoint: str) -> QuotaLimiter:
+    """
+    Process-wide limiter for one model endpoint, created on first use.
+    
+    Every caller of the same quota (API requests, ingestion jobs, scripts)
+    shares the limiter returned for it.
+    
+    Args:
+        model: Model name, e.g. "gemini-2.5-flash" (a "models/" prefix is ignored)
+        endpoint: "generate" or "embed"
+    """
+    name = f"{model.split('/')[-1]}:{endpoint}"
+    
+    with rate_limiters_lock:
+        limiter = rate_limiters.get(name)
+        if limiter is None:
+            default = (EMBEDDING_RPM, EMBEDDING_TPM) if endpoint == "embed" else (LLM_RPM, LLM_TPM)
+            rpm, tpm = configured_limits.get(name, default)
+            limiter = rate_limiters[name] = QuotaLimiter(
+                name, rpm, tpm,
+                max_retries=RATE_LIMIT_MAX_RETRIES,
+                backoff_seconds=RATE_LIMIT_BACKOFF_SECONDS,
+                max_backoff_seconds=RATE_LIMIT_MAX_BACKOFF_SECONDS,
+                background_reserve=EMBEDDING_QUERY_RESERVE if endpoint == "embed" else 0.0
+            )
+        return limiter
@@ -0,0 +1,164 @@
+"""Common interface for vector store backends."""
+
+import asyncio
+from abc import ABC, abstractmethod
+from typing import BinaryIO, List, Tuple, Union
+
+from langchain_core.documents import Document
+
+from .bm25 import BM25Index, get_bm25_index
+
+
+class VectorStoreBackend(ABC):
+    """
+    Interface shared by the Pinecone and local vector store managers.
+    
+    Subclasses set self.embeddings (an embeddings object exposing
+    embed_queries / aembed_queries) and implement the abstract methods;
+    the query helpers below are built on top of them.
+    """
+    
+    embeddings = None
+    
+    # Key of this index in the ingestion manifest (None: no incremental indexing)
+    manifest_target = None
+    
+    @property
+    def keyword_index(self) -> BM25Index:
+        """BM25 index over the same chunks (kept per manifest target)."""
+        return get_bm25_index(self.manifest_target)
+    
+    @abstractmethod
+    def search_by_vector_with_score(self, embedding: List[float],
+                                    k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Semantic search with a precomputed embedding, keeping similarity scores.
+        
+        Returned documents carry their vector ID in doc.id.
+        
+        Args:
+            embedding: Query embedding
+            k: Number of results
+            
+        Returns:
+            List of (document, similarity) pairs, best first
+        """
+    
+    @abstractmethod
+    def add_documents(self, documents: List[Document], save_keyword_index: bool = True):
+        """
+        Embed and add documents to the store (and to the BM25 keyword index).
+        
+        Args:
+            documents: List of documents to index; doc.id is used as vector ID when set
+            save_keyword_index: Persist the BM25 index afterwards (batch writers save once at the end)
+        """
+    
+    @abstractmethod
+    def delete_documents(self, ids: List[str], save_keyword_index: bool = True):
+        """
+        Delete vectors (and their BM25 entries) by ID.
+        
+        Args:
+            ids: Vector IDs; unknown IDs are ignored
+            save_keyword_index: Persist the BM25 index afterwards
+        """
+    
+    @abstractmethod
+    def stats(self) -> dict:
+        """Backend name, dimension, vector count and cache statistics."""
+    
+    async def asearch_by_vector_with_score(self, embedding: List[float],
+                                           k: int = 4) -> List[Tuple[Document, float]]:
+        """Async version of search_by_vector_with_score."""
+        return await asyncio.to_thread(self.search_by_vector_with_score, embedding, k)
+    
+    async def aclose(self):
+        """Release async clients held by the backend (called at app shutdown)."""
+    
+    def index_pdf(self, pdf: Union[str, BinaryIO], filename: str = None, **kwargs) -> dict:
+        """
+        Stream a PDF into the store page by page (see ingestion.py).
+        
+        Args:
+            pdf: Path or seekable binary file object
+            filename: Name stored in chunk metadata
+            **kwargs: on_progress / cancel_event, passed to index_pdf_stream
+            
+        Returns:
+            Dict with pages, chunks and file_hash
+        """
+        from .ingestion import index_pdf_stream
+        
+        return index_pdf_stream(self, pdf, filename, **kwargs)
+    
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """
+        Embed several search queries in a single batch call.
+        
+        Args:
+            queries: Search queries
+            
+        Returns:
+            One embedding per query, in the same order
+        """
+        print(f" Embedding {len(queries)} queries in one batch...")
+        
+        return self.embeddings.embed_queries(queries)
+    
+    async def aembed_queries(self, queries: List[str]) -> List[List[float]]:
+        """Async version of embed_queries."""
+        print(f" Embedding {len(queries)} queries in one batch...")
+        
+        return await self.embeddings.aembed_queries(queries)
+    
+    def search_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """
+        Semantic search with a precomputed query embedding.
+        
+        Args:
+            embedding: Query embedding
+            k: Number of results
+            
+        Returns:
+            List of relevant documents
+        """
+        return [doc for doc, _ in self.search_by_vector_with_score(embedding, k=k)]
+    
+    async def asearch_by_vector(self, embedding: List[float], k: int = 4) -> List[Document]:
+        """Async version of search_by_vector."""
+        return [doc for doc, _ in await self.asearch_by_vector_with_score(embedding, k=k)]
+    
+    def search(self, query: str, k: int = 4) -> List[Document]:
+        """
+        Semantic search for a single query.
+        
+        Args:
+            query: Search query
+            k: Number of results
+            
+        Returns:
+            List of relevant documents
+        """
+        print(f" Searching for: {query[:60]}...")
+        
+        results = self.search_by_vector(self.embeddings.embed_queries([query])[0], k=k)
+        
+        print(f" Found {len(results)} relevant documents")
+        
+        return results
+    
+    def search_many(self, queries: List[str], k: int = 4) -> List[List[Document]]:
+        """
+        Multi-query semantic search with one embedding call.
+        
+        Args:
+            queries: Search queries
+            k: Number of results per query
+            
+        Returns:
+            One result list per query, in the same order
+        """
+        vectors = self.embed_queries(queries)
+        
+        return [self.search_by_vector(vector, k=k) for vector in vectors]
@@ -0,0 +1,391 @@
+"""
+Local BM25 keyword index over the indexed chunks.
+
+Postings are stored compactly per term as parallel arrays of uint32 doc
+numbers and uint16 term frequencies. The index is built incrementally:
+add_documents() appends postings for new chunks, and re-adding an
+existing ID tombstones its old postings. On disk an index directory holds:
+    postings.npz   vocabulary, CSR postings (offsets/doc numbers/tfs), doc lengths
+    docs.jsonl     one {"id", "text", "metadata"} line per doc number
+
+save() appends the documents added since the last save to docs.jsonl
+(tombstones live in postings.npz), and compacts the index - dropping
+tombstoned documents and renumbering the rest - once tombstones exceed
+BM25_COMPACT_RATIO of all documents.
+
+Every vector index (the manifest target: a Pinecone index and namespace,
+or a local index directory) has its own keyword index, in a subdirectory
+of BM25_INDEX_DIR (see get_bm25_index).
+"""
+
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import threading
+from array import array
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+# Root directory; each manifest target gets a subdirectory
+BM25_INDEX_DIR = os.getenv("BM25_INDEX_DIR", "bm25_index")
+
+# Compact on save once this share of the stored documents is tombstoned
+BM25_COMPACT_RATIO = float(os.getenv("BM25_COMPACT_RATIO", "0.25"))
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "but", "by", "can", "do", "does",
+    "for", "from", "has", "have", "how", "i", "in", "into", "is", "it", "its",
+    "of", "on", "or", "so", "than", "that", "the", "their", "them", "then",
+    "there", "these", "they", "this", "to", "was", "we", "were", "what", "when",
+    "where", "which", "while", "who", "why", "will", "with", "you", "your"
+}
+
+# Question words mark natural-language questions, which need dense search
+QUESTION_WORDS = {"how", "what", "why", "when", "where", "which", "who", "does", "do", "is", "are", "can"}
+
+
+def stem(term: str) -> str:
+    """Minimal plural folding ("databases" -> "database")."""
+    if len(term) > 3 and term.endswith("s") and not term.endswith("ss"):
+        return term[:-1]
+    return term
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase alphanumeric terms without stopwords."""
+    return [
+        stem(t) for t in TOKEN_PATTERN.findall(text.lower())
+        if t not in STOPWORDS and len(t) > 1
+    ]
+
+
+def is_keyword_query(query: str, max_terms: int = 6) -> bool:
+    """
+    True for short keyword-style queries ("vector database scalability")
+    that lexical search can answer without an embedding call.
+    """
+    words = TOKEN_PATTERN.findall(query.lower())
+    if not words or len(words) > max_terms or "?" in query:
+        return False
+    return not QUESTION_WORDS.intersection(words)
+
+
+class BM25Index:
+    """Incremental in-memory BM25 index with optional on-disk persistence."""
+
+    def __init__(self, path: Optional[str] = None, k1: float = 1.2, b: float = 0.75):
+        self.path = Path(path) if path else None
+        self.k1 = k1
+        self.b = b
+
+        self._lock = threading.Lock()
+        self._reset()
+
+        if self.path is not None and (self.path / "postings.npz").exists():
+            self._load()
+
+    def _reset(self):
+        self.vocab: Dict[str, int] = {}
+        self.postings_docs: List[array] = []
+        self.postings_tfs: List[array] = []
+        self.doc_lengths = array("I")
+        self.docs: List[dict] = []
+        self.doc_of: Dict[str, int] = {}
+        self.deleted = set()
+        self.total_length = 0
+        self._loaded_mtime = None
+        # Documents already in docs.jsonl; the rest are appended on save
+        self._saved_docs = 0
+        self._rewrite_docs = True
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.docs) - len(self.deleted)
+
+    def add_documents(self, ids: List[str], texts: List[str], metadatas: List[dict]):
+        """
+        Index chunks (an existing ID replaces its previous version).
+
+        Args:
+            ids: Chunk/vector IDs, shared with the vector store
+            texts: Chunk texts
+            metadatas: Chunk metadata dicts
+        """
+        with self._lock:
+            for chunk_id, text, metadata in zip(ids, texts, metadatas):
+                old = self.doc_of.get(chunk_id)
+                if old is not None:
+                    self.deleted.add(old)
+                    self.total_length -= self.doc_lengths[old]
+
+                doc_number = len(self.docs)
+                self.docs.append({"id": chunk_id, "text": text, "metadata": metadata})
+                self.doc_of[chunk_id] = doc_number
+
+                terms = tokenize(text)
+                self.doc_lengths.append(len(terms))
+                self.total_length += len(terms)
+
+                counts: Dict[str, int] = {}
+                for term in terms:
+                    counts[term] = counts.get(term, 0) + 1
+
+                for term, tf in counts.items():
+                    term_id = self.vocab.get(term)
+                    if term_id is None:
+                        term_id = len(self.vocab)
+                        self.vocab[term] = term_id
+                        self.postings_docs.append(array("I"))
+                        self.postings_tfs.append(array("H"))
+                    self.postings_docs[term_id].append(doc_number)
+                    self.postings_tfs[term_id].append(min(tf, 65535))
+
+    def delete(self, ids: List[str]):
+        """Tombstone chunks by ID (unknown IDs are ignored)."""
+        with self._lock:
+            for chunk_id in ids:
+                doc_number = self.doc_of.pop(chunk_id, None)
+                if doc_number is not None and doc_number not in self.deleted:
+                    self.deleted.add(doc_number)
+                    self.total_length -= self.doc_lengths[doc_number]
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        BM25 top-k search.
+
+        Args:
+            query: Search query
+            k: Number of results
+
+        Returns:
+            List of (document, BM25 score), best first
+        """
+        self.refresh()
+
+        with self._lock:
+            n = self.num_docs
+            if n == 0:
+                return []
+
+            avg_length = max(self.total_length / n, 1)
+            lengths = np.frombuffer(self.doc_lengths, dtype=np.uint32).astype(np.float32)
+            norm = self.k1 * (1 - self.b + self.b * lengths / avg_length)
+            scores = np.zeros(len(self.docs), dtype=np.float32)
+
+            for term in set(tokenize(query)):
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    continue
+                docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+                tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint16).astype(np.float32)
+                idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm[docs])
+
+            if self.deleted:
+                scores[list(self.deleted)] = 0
+
+            hits = np.flatnonzero(scores)
+            if len(hits) == 0:
+                return []
+            best = hits[np.argsort(-scores[hits])[:k]]
+
+            return [(self._document(int(i)), float(scores[i])) for i in best]
+
+    def _compact(self):
+        """Drop tombstoned documents and renumber the rest (caller holds the lock)."""
+        live = np.ones(len(self.docs), dtype=bool)
+        live[list(self.deleted)] = False
+        renumber = (np.cumsum(live) - 1).astype(np.uint32)
+
+        vocab: Dict[str, int] = {}
+        postings_docs: List[array] = []
+        postings_tfs: List[array] = []
+        for term, term_id in self.vocab.items():
+            docs = np.frombuffer(self.postings_docs[term_id], dtype=np.uint32)
+            keep = live[docs]
+            if not keep.any():
+                continue
+            tfs = np.frombuffer(self.postings_tfs[term_id], dtype=np.uint16)
+            vocab[term] = len(postings_docs)
+            postings_docs.append(array("I", renumber[docs[keep]].tobytes()))
+            postings_tfs.append(array("H", tfs[keep].tobytes()))
+
+        self.vocab = vocab
+        self.postings_docs = postings_docs
+        self.postings_tfs = postings_tfs
+        self.doc_lengths = array("I", np.frombuffer(self.doc_lengths, dtype=np.uint32)[live].tobytes())
+        self.docs = [doc for doc, keep in zip(self.docs, live) if keep]
+        self.doc_of = {doc["id"]: i for i, doc in enumerate(self.docs)}
+        self.deleted = set()
+        self._rewrite_docs = True
+
+    def _document(self, doc_number: int) -> Document:
+        doc = self.docs[doc_number]
+        return Document(id=doc["id"], page_content=doc["text"], metadata=doc["metadata"])
+
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+
+    def save(self):
+        """Write the index to self.path (postings as CSR arrays), compacting it when due."""
+        if self.path is None:
+            return
+
+        with self._lock:
+            self.path.mkdir(parents=True, exist_ok=True)
+
+            if self.deleted and len(self.deleted) > BM25_COMPACT_RATIO * len(self.docs):
+                self._compact()
+
+            # Another process saved since we loaded: our doc numbers no longer
+            # match its docs.jsonl, so write the whole file
+            postings_path = self.path / "postings.npz"
+            on_disk = postings_path.stat().st_mtime if postings_path.exists() else None
+            if on_disk != self._loaded_mtime:
+                self._rewrite_docs = True
+
+            terms = sorted(self.vocab, key=self.vocab.get)
+            lengths = [len(p) for p in self.postings_docs]
+            offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+            np.cumsum(lengths, out=offsets[1:])
+
+            doc_numbers = np.concatenate(
+                [np.frombuffer(p, dtype=np.uint32) for p in self.postings_docs]
+            ) if terms else np.zeros(0, dtype=np.uint32)
+            tfs = np.concatenate(
+                [np.frombuffer(p, dtype=np.uint16) for p in self.postings_tfs]
+            ) if terms else np.zeros(0, dtype=np.uint16)
+
+            # Until the postings are written, docs.jsonl may hold lines they
+            # do not cover; a failed save makes the next one rewrite it
+            rewrite, self._rewrite_docs = self._rewrite_docs, True
+            docs_path = self.path / "docs.jsonl"
+            if rewrite:
+                tmp_docs = self.path / "docs.tmp.jsonl"
+                with open(tmp_docs, "w", encoding="utf-8") as f:
+                    for doc in self.docs:
+                        f.write(json.dumps(doc) + "\n")
+                os.replace(tmp_docs, docs_path)
+            else:
+                with open(docs_path, "a", encoding="utf-8") as f:
+                    for doc in self.docs[self._saved_docs:]:
+                        f.write(json.dumps(doc) + "\n")
+
+            tmp_path = self.path / "postings.tmp.npz"
+            np.savez(
+                tmp_path,
+                terms=np.array(terms, dtype=str),
+                offsets=offsets,
+                doc_numbers=doc_numbers,
+                tfs=tfs,
+                doc_lengths=np.frombuffer(self.doc_lengths, dtype=np.uint32),
+                deleted=np.array(sorted(self.deleted), dtype=np.uint32)
+            )
+            os.replace(tmp_path, postings_path)
+            self._loaded_mtime = postings_path.stat().st_mtime
+            self._saved_docs = len(self.docs)
+            self._rewrite_docs = False
+
+    def clear(self):
+        """Drop every document and delete the files (after the vector index was wiped)."""
+        with self._lock:
+            self._reset()
+            if self.path is not None and self.path.exists():
+                shutil.rmtree(self.path)
+
+    def refresh(self):
+        """Reload from disk if another process (e.g. an indexing script) saved a newer version."""
+        if self.path is None:
+            return
+        try:
+            mtime = (self.path / "postings.npz").stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._loaded_mtime:
+            self._load()
+
+    def _load(self):
+        postings_path = self.path / "postings.npz"
+
+        with self._lock:
+            mtime = postings_path.stat().st_mtime
+            data = np.load(postings_path)
+            self._reset()
+
+            offsets = data["offsets"]
+            doc_numbers = data["doc_numbers"]
+            tfs = data["tfs"]
+            for term_id, term in enumerate(data["terms"].tolist()):
+                start, end = offsets[term_id], offsets[term_id + 1]
+                self.vocab[term] = term_id
+                self.postings_docs.append(array("I", doc_numbers[start:end].tobytes()))
+                self.postings_tfs.append(array("H", tfs[start:end].tobytes()))
+
+            self.doc_lengths = array("I", data["doc_lengths"].tobytes())
+            self.deleted = set(data["deleted"].tolist())
+
+            stray_lines = False
+            with open(self.path / "docs.jsonl", encoding="utf-8") as f:
+                for line in f:
+                    if len(self.docs) == len(self.doc_lengths):
+                        # Appended by a save that never wrote its postings
+                        stray_lines = True
+                        break
+                    if line.strip():
+                        doc = json.loads(line)
+                        if len(self.docs) not in self.deleted:
+                            self.doc_of[doc["id"]] = len(self.docs)
+                        self.docs.append(doc)
+            self._saved_docs = len(self.docs)
+            self._rewrite_docs = stray_lines
+
+            self.total_length = sum(
+                length for i, length in enumerate(self.doc_lengths) if i not in self.deleted
+            )
+            self._loaded_mtime = mtime
+
+    def stats(self) -> dict:
+        return {
+            "documents": self.num_docs,
+            "terms": len(self.vocab),
+            "postings": sum(len(p) for p in self.postings_docs)
+        }
+
+
+def bm25_index_dir(target: str) -> Path:
+    """Directory of a manifest target's keyword index, e.g. bm25_index/pinecone_ikms-rag-1a2b3c4d."""
+    name = re.sub(r"[^A-Za-z0-9.-]+", "_", target).strip("_")[-60:]
+    digest = hashlib.sha256(target.encode("utf-8")).hexdigest()[:8]
+    return Path(BM25_INDEX_DIR) / f"{name}-{digest}"
+
+
+_indexes: Dict[Optional[str], BM25Index] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_bm25_index(target: Optional[str]) -> BM25Index:
+    """
+    The process-wide keyword index of a vector index.
+
+    Args:
+        target: Manifest target of the vector index (see manifest.py);
+            None gives an in-memory index that is never saved
+
+    Returns:
+        The BM25Index for that target, loaded from disk on first use
+    """
+    with _indexes_lock:
+        index = _indexes.get(target)
+        if index is None:
+            index = _indexes[target] = BM25Index(bm25_index_dir(target) if target else None)
+        return index
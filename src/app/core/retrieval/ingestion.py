@@ -0,0 +1,294 @@
+"""
+Streaming PDF ingestion.
+
+A PDF is read page by page with pypdf, each page is split into chunks as
+soon as it is read, and chunks are embedded and upserted in bounded
+batches. At most one page of text and one batch of chunks/vectors are held
+in memory, whatever the size of the PDF.
+
+Chunk IDs are content-addressed (see manifest.py), the same scheme as the
+indexing scripts. Re-indexing a file only embeds chunks whose IDs are not
+yet recorded in the index manifest and deletes the ones that disappeared;
+an unchanged file is skipped after hashing it.
+"""
+
+import glob
+import hashlib
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from pathlib import Path
+from typing import BinaryIO, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+from pypdf import PdfReader
+
+from .manifest import chunk_id, index_manifest
+
+
+CHUNK_SIZE = int(os.getenv("CHUNK_SIZE", "1000"))
+CHUNK_OVERLAP = int(os.getenv("CHUNK_OVERLAP", "200"))
+
+# Chunks embedded and upserted per call
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "32"))
+
+# Processes parsing PDFs during bulk ingestion (default: one per core)
+PARSE_WORKERS = int(os.getenv("PARSE_WORKERS", "0")) or os.cpu_count() or 1
+
+
+def create_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        separators=["\n\n", "\n", ". ", " ", ""]
+    )
+
+
+def file_sha256(stream: BinaryIO) -> str:
+    """Hash a seekable binary stream in blocks and rewind it."""
+    sha256 = hashlib.sha256()
+    stream.seek(0)
+    for block in iter(lambda: stream.read(1 << 20), b""):
+        sha256.update(block)
+    stream.seek(0)
+    return sha256.hexdigest()
+
+
+def iter_pdf_pages(reader: PdfReader) -> Iterator[Tuple[int, str]]:
+    """Yield (page number, text) one page at a time."""
+    for page_number, page in enumerate(reader.pages):
+        yield page_number, page.extract_text() or ""
+
+
+def iter_pdf_chunks(reader: PdfReader, source: str, file_hash: str,
+                    splitter: RecursiveCharacterTextSplitter) -> Iterator[Document]:
+    """
+    Chunk a PDF incrementally, page by page.
+    
+    Args:
+        reader: Open PdfReader
+        source: File name recorded in chunk metadata
+        file_hash: SHA-256 of the file, recorded in chunk metadata
+        splitter: Text splitter
+    
+    Yields:
+        Chunk documents with an ID and page/source metadata
+    """
+    total_pages = len(reader.pages)
+    chunk_index = 0
+    
+    for page_number, text in iter_pdf_pages(reader):
+        for chunk_text in splitter.split_text(text):
+            yield Document(
+                id=chunk_id(source, page_number, chunk_text),
+                page_content=chunk_text,
+                metadata={
+                    "source": source,
+                    "source_file": source,
+                    "page": page_number,
+                    "total_pages": total_pages,
+                    "file_hash": file_hash,
+                    "chunk_index": chunk_index
+                }
+            )
+            chunk_index += 1
+
+
+# ----------------------------------------------------------------------
+# Bulk parsing
+# ----------------------------------------------------------------------
+
+def resolve_pdf_paths(pattern: str) -> List[str]:
+    """PDF files under a directory (recursively) or matching a glob, sorted."""
+    if os.path.isdir(pattern):
+        paths = (str(path) for path in Path(pattern).rglob("*") if path.suffix.lower() == ".pdf")
+    else:
+        paths = glob.glob(pattern, recursive=True)
+    return sorted(path for path in paths if path.lower().endswith(".pdf") and os.path.isfile(path))
+
+
+def parse_pdf_file(path: str, known_hash: Optional[str] = None) -> dict:
+    """
+    Parse and chunk one PDF. Top-level so it can run in a worker process.
+    
+    Args:
+        path: PDF path
+        known_hash: Hash of the version already indexed; when it matches,
+            the file is not parsed
+    
+    Returns:
+        Dict with path, source, file_hash, pages and chunks (None when unchanged)
+    """
+    source = os.path.basename(path)
+    with open(path, "rb") as stream:
+        file_hash = file_sha256(stream)
+        if file_hash == known_hash:
+            return {"path": path, "source": source, "file_hash": file_hash, "pages": None, "chunks": None}
+        
+        reader = PdfReader(stream)
+        chunks = list(iter_pdf_chunks(reader, source, file_hash, create_splitter()))
+    
+    for chunk in chunks:
+        chunk.metadata["source_path"] = path
+    
+    return {"path": path, "source": source, "file_hash": file_hash,
+            "pages": len(reader.pages), "chunks": chunks}
+
+
+def iter_parsed_pdfs(paths: Iterable[str], known_hashes: Optional[Dict[str, str]] = None,
+                     workers: int = PARSE_WORKERS) -> Iterator[dict]:
+    """
+    Parse PDFs in a process pool, yielding results as they complete.
+    
+    At most 2 x workers files are in flight, so parsed chunks never pile
+    up faster than the consumer (the embedding stage) takes them.
+    
+    Args:
+        paths: PDF paths
+        known_hashes: {source file name: indexed file hash}, to skip unchanged files
+        workers: Worker processes
+    
+    Yields:
+        parse_pdf_file results (a failed file yields a dict with an "error")
+    """
+    known_hashes = known_hashes or {}
+    paths = iter(paths)
+    
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        
+        def submit_next() -> bool:
+            path = next(paths, None)
+            if path is None:
+                return False
+            known = known_hashes.get(os.path.basename(path))
+            pending[executor.submit(parse_pdf_file, path, known)] = path
+            return True
+        
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+        
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path = pending.pop(future)
+                try:
+                    yield future.result()
+                except Exception as e:
+                    yield {"path": path, "source": os.path.basename(path), "error": str(e)}
+                submit_next()
+
+
+class IngestionCancelled(Exception):
+    """Raised between batches when an ingestion job is cancelled."""
+
+
+def index_pdf_stream(manager, pdf: Union[str, BinaryIO], filename: str = None,
+                     batch_size: int = INGEST_BATCH_SIZE,
+                     on_progress: Optional[Callable[..., None]] = None,
+                     cancel_event: Optional[threading.Event] = None) -> dict:
+    """
+    Index a PDF into a vector store backend with bounded memory.
+    
+    Args:
+        manager: VectorStoreBackend to write to
+        pdf: Path or seekable binary file object
+        filename: Name stored in chunk metadata (defaults to the path's name)
+        batch_size: Chunks embedded and upserted per call
+        on_progress: Called with pages_total/pages_parsed/chunks_embedded/
+            vectors_upserted/vectors_deleted keyword arguments as work completes
+        cancel_event: When set, stops before the next batch (IngestionCancelled)
+    
+    Returns:
+        Dict with pages, chunks (all chunks of the file), added, deleted
+        (chunks written/removed by this run) and file_hash
+    """
+    if isinstance(pdf, str):
+        with open(pdf, "rb") as stream:
+            return index_pdf_stream(
+                manager, stream, filename or os.path.basename(pdf), batch_size,
+                on_progress, cancel_event
+            )
+    
+    report = on_progress or (lambda **counters: None)
+    
+    filename = filename or getattr(pdf, "name", None) or "upload.pdf"
+    file_hash = file_sha256(pdf)
+    reader = PdfReader(pdf)
+    pages = len(reader.pages)
+    report(pages_total=pages)
+    
+    # Chunks already in this index from an earlier version of the file
+    target = manager.manifest_target
+    indexed = index_manifest.chunk_ids(target, filename) if target else set()
+    
+    if target and index_manifest.file_hash(target, filename) == file_hash:
+        print(f" {filename} is unchanged since it was last indexed; skipping")
+        report(pages_parsed=pages)
+        return {"pages": pages, "chunks": len(indexed), "added": 0, "deleted": 0,
+                "file_hash": file_hash}
+    
+    print(f" Indexing {filename}: {pages} pages, batches of {batch_size} chunks")
+    
+    seen = set()
+    written = set()
+    added = 0
+    batch = []
+    
+    def flush():
+        nonlocal added, batch
+        if cancel_event is not None and cancel_event.is_set():
+            raise IngestionCancelled(f"Cancelled after {added} chunks")
+        manager.add_documents(batch, save_keyword_index=False)
+        written.update(doc.id for doc in batch)
+        added += len(batch)
+        report(
+            pages_parsed=batch[-1].metadata["page"] + 1,
+            chunks_embedded=added,
+            vectors_upserted=added
+        )
+        batch = []
+    
+    completed = False
+    try:
+        for doc in iter_pdf_chunks(reader, filename, file_hash, create_splitter()):
+            if doc.id in seen:
+                continue
+            seen.add(doc.id)
+            if doc.id in indexed:
+                continue
+            batch.append(doc)
+            if len(batch) >= batch_size:
+                flush()
+        
+        if batch:
+            flush()
+        
+        # Chunks the new version of the file no longer produces
+        stale = sorted(indexed - seen)
+        if stale:
+            manager.delete_documents(stale, save_keyword_index=False)
+            report(vectors_deleted=len(stale))
+        completed = True
+    finally:
+        # Persist the keyword index once instead of after every batch
+        # (also after a cancel, so it matches the vectors already upserted)
+        manager.keyword_index.save()
+        
+        if target:
+            if completed:
+                index_manifest.record(target, filename, file_hash, seen)
+            else:
+                # Partial run: record what is in the index; the missing
+                # file hash makes the next run re-check every chunk
+                index_manifest.record(target, filename, None, indexed | written)
+    
+    report(pages_parsed=pages)
+    
+    print(f" Indexed {len(seen)} chunks from {pages} pages "
+          f"({added} embedded, {len(stale)} deleted)")
+    
+    return {"pages": pages, "chunks": len(seen), "added": added, "deleted": len(stale),
+            "file_hash": file_hash}
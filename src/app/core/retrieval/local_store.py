@@ -0,0 +1,813 @@
+"""
+Local in-process vector index (NumPy, memory-mapped).
+
+Layout of an index directory:
+    meta.json        dimension, embedding model, vector count
+    vectors.f32      float32 matrix (count x dimension), L2-normalized
+    records.jsonl    one {"row", "id", "text", "metadata"} line per write
+    ivf_centroids.npy / ivf_assign.i32   optional IVF (inverted file) index
+    codes.f32 / codes.i8 + codes_scale.f32 / codes.b1   optional search codes
+
+Vectors are appended to the end of vectors.f32 and the matrix is opened
+with np.memmap, so only the pages touched by a search are loaded into
+memory. Writing an existing ID overwrites its row in place.
+
+Writers (the API and local_embed.py) hold an exclusive lock on the
+directory's .lock file while they write, and meta.json is replaced last.
+Searches check meta.json and pick up another process's writes: appended
+records are read incrementally and the cached matrix and codes reopened.
+
+Two-stage search ranks candidates by compact in-memory codes, then
+rescores a shortlist of LOCAL_INDEX_RESCORE_FACTOR x k rows with the exact
+float vectors read from vectors.f32. Codes can be
+    - quantized ("int8": one byte per dimension plus a per-vector scale,
+      ~4x smaller; "binary": one sign bit per dimension, 32x smaller)
+    - truncated to a Matryoshka prefix of search_dimension dimensions,
+      renormalized (embedding models trained with Matryoshka
+      representation learning keep most of their accuracy in a prefix)
+    - or both.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Set, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from .base import VectorStoreBackend
+from .manifest import local_target
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: writers in one process are still serialized by the thread lock
+    fcntl = None
+
+
+# Search settings
+LOCAL_INDEX_SEARCH = os.getenv("LOCAL_INDEX_SEARCH", "auto").lower()
+LOCAL_INDEX_NPROBE = int(os.getenv("LOCAL_INDEX_NPROBE", "8"))
+LOCAL_QUERY_PREFIX = os.getenv("LOCAL_QUERY_PREFIX", "")
+
+# Build an IVF index automatically once the corpus reaches this size
+IVF_MIN_VECTORS = int(os.getenv("IVF_MIN_VECTORS", "10000"))
+
+# Codes kept in memory for candidate search: "none", "int8" or "binary"
+# (empty: new indexes are not quantized, existing ones keep their setting)
+LOCAL_INDEX_QUANTIZATION = os.getenv("LOCAL_INDEX_QUANTIZATION", "").lower()
+
+# Candidates rescored with float vectors per requested result (0 = per-mode default)
+LOCAL_INDEX_RESCORE_FACTOR = int(os.getenv("LOCAL_INDEX_RESCORE_FACTOR", "0"))
+
+# Dimensions of the (renormalized) vector prefix used for candidate search
+# (0: new indexes search the full vectors, existing ones keep their setting)
+LOCAL_INDEX_SEARCH_DIM = int(os.getenv("LOCAL_INDEX_SEARCH_DIM", "0"))
+
+QUANTIZATIONS = ("none", "int8", "binary")
+DEFAULT_RESCORE_FACTORS = {"none": 4, "int8": 4, "binary": 16}
+
+# Rows scored per block (keeps temporary float copies of int8 codes in cache)
+SCAN_BLOCK_ROWS = 4096
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """L2-normalize each row so inner product equals cosine similarity."""
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def truncate_rows(vectors: np.ndarray, dimension: int) -> np.ndarray:
+    """Keep the first `dimension` values of each row and renormalize (Matryoshka truncation)."""
+    return normalize_rows(np.asarray(vectors, dtype=np.float32)[..., :dimension])
+
+
+def quantize_int8(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric int8 scalar quantization with one scale per vector.
+    
+    Returns:
+        (codes of shape (n, dimension), scales of shape (n, 1)); codes x scale
+        approximates the vectors
+    """
+    vectors = np.asarray(vectors, dtype=np.float32)
+    scales = np.maximum(np.abs(vectors).max(axis=1, keepdims=True), 1e-12) / 127
+    codes = np.clip(np.rint(vectors / scales), -127, 127).astype(np.int8)
+    return codes, scales.astype(np.float32)
+
+
+def quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    """Sign bits, packed 8 dimensions per byte: shape (n, ceil(dimension / 8))."""
+    return np.packbits(np.asarray(vectors) > 0, axis=1)
+
+
+if hasattr(np, "bitwise_count"):
+    def popcount(bits: np.ndarray) -> np.ndarray:
+        return np.bitwise_count(bits)
+else:
+    POPCOUNT_TABLE = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+    
+    def popcount(bits: np.ndarray) -> np.ndarray:
+        return POPCOUNT_TABLE[bits]
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k highest scores, best first."""
+    if k >= len(scores):
+        return np.argsort(-scores)
+    part = np.argpartition(-scores, k)[:k]
+    return part[np.argsort(-scores[part])]
+
+
+class LocalVectorIndex:
+    """Memory-mapped float32 vector matrix with exact, IVF and two-stage top-k search."""
+    
+    def __init__(self, path: str, dimension: Optional[int] = None,
+                 model: Optional[str] = None, quantization: Optional[str] = None,
+                 search_dimension: Optional[int] = None):
+        """
+        Open (or create) an index directory.
+        
+        Args:
+            path: Index directory
+            dimension: Vector dimension, required when creating a new index
+            model: Name of the embedding model that produced the vectors
+            quantization: "none", "int8" or "binary"; an existing index
+                stored differently is re-encoded (None keeps its setting)
+            search_dimension: Prefix dimensions used for candidate search
+                (0: full vectors; None keeps the index's setting)
+        """
+        self.path = Path(path)
+        self.meta_path = self.path / "meta.json"
+        self.vectors_path = self.path / "vectors.f32"
+        self.records_path = self.path / "records.jsonl"
+        self.centroids_path = self.path / "ivf_centroids.npy"
+        self.assign_path = self.path / "ivf_assign.i32"
+        self.lock_path = self.path / ".lock"
+        
+        self._lock = threading.Lock()
+        self._matrix: Optional[np.ndarray] = None
+        self._codes: Optional[List[np.ndarray]] = None
+        self._ivf_lists: Optional[List[np.ndarray]] = None
+        # meta.json version loaded, and bytes of records.jsonl applied
+        self._meta_version = None
+        self._records_offset = 0
+        
+        if self.meta_path.exists():
+            self._meta_version = self._stat_meta()
+            self.meta = json.loads(self.meta_path.read_text())
+        else:
+            if dimension is None:
+                raise ValueError(f"No local index at {self.path}; dimension is required to create one")
+            self.path.mkdir(parents=True, exist_ok=True)
+            self.meta = {"dimension": dimension, "model": model, "count": 0,
+                         "quantization": quantization or "none",
+                         "search_dimension": search_dimension or 0}
+            self._save_meta()
+        
+        if dimension is not None and dimension != self.dimension:
+            raise ValueError(
+                f"Dimension mismatch: local index is {self.dimension}, got {dimension}"
+            )
+        
+        self.records: List[dict] = []
+        self.row_of: Dict[str, int] = {}
+        self.deleted_rows: Set[int] = set()
+        self._load_records()
+        
+        self.centroids: Optional[np.ndarray] = None
+        if self.centroids_path.exists():
+            self.centroids = np.load(self.centroids_path)
+        
+        if (quantization is not None and quantization != self.quantization) or \
+                (search_dimension is not None and search_dimension != self.search_dimension):
+            self.encode(quantization, search_dimension)
+    
+    @property
+    def dimension(self) -> int:
+        return self.meta["dimension"]
+    
+    @property
+    def model(self) -> Optional[str]:
+        return self.meta.get("model")
+    
+    @property
+    def count(self) -> int:
+        return self.meta["count"]
+    
+    @property
+    def size(self) -> int:
+        """Live (non-deleted) vectors."""
+        return self.count - len(self.deleted_rows)
+    
+    @property
+    def has_ivf(self) -> bool:
+        return self.centroids is not None
+    
+    @property
+    def quantization(self) -> str:
+        return self.meta.get("quantization", "none")
+    
+    @property
+    def search_dimension(self) -> int:
+        """Dimensions compared in the candidate stage (the full dimension unless truncated)."""
+        return min(self.meta.get("search_dimension") or self.dimension, self.dimension)
+    
+    @property
+    def two_stage(self) -> bool:
+        """True when candidates are ranked by codes and rescored with float vectors."""
+        return self.quantization != "none" or self.search_dimension < self.dimension
+    
+    @property
+    def bytes_per_vector(self) -> int:
+        """Memory a vector takes during search (codes, or the float row for single-stage search)."""
+        if not self.two_stage:
+            return self.dimension * 4
+        return sum(np.dtype(dtype).itemsize * width for _, dtype, width in self._code_specs())
+    
+    # ------------------------------------------------------------------
+    # Writes
+    # ------------------------------------------------------------------
+    
+    def add(self, ids: List[str], vectors, texts: List[str], metadatas: List[dict]):
+        """
+        Add or overwrite vectors.
+        
+        Args:
+            ids: Vector IDs (an existing ID overwrites its row)
+            vectors: Embeddings, shape (n, dimension)
+            texts: Chunk texts
+            metadatas: Chunk metadata dicts
+        """
+        vectors = normalize_rows(vectors).reshape(-1, self.dimension)
+        
+        # An ID repeated within the batch keeps its last vector, text and metadata
+        last = {vector_id: i for i, vector_id in enumerate(ids)}
+        if len(last) < len(ids):
+            keep = sorted(last.values())
+            ids = [ids[i] for i in keep]
+            vectors = vectors[keep]
+            texts = [texts[i] for i in keep]
+            metadatas = [metadatas[i] for i in keep]
+        
+        with self._write_lock():
+            rows = []
+            new_rows = []
+            overwrites = []
+            for i, vector_id in enumerate(ids):
+                row = self.row_of.get(vector_id)
+                if row is None:
+                    row = self.count + len(new_rows)
+                    new_rows.append(i)
+                else:
+                    overwrites.append((i, row))
+                rows.append(row)
+            
+            # Append new vectors in one write, overwrite existing ones in place
+            new_vectors = vectors[new_rows]
+            with open(self.vectors_path, "ab") as f:
+                f.write(new_vectors.tobytes())
+            
+            if overwrites:
+                with open(self.vectors_path, "r+b") as f:
+                    for i, row in overwrites:
+                        f.seek(row * self.dimension * 4)
+                        f.write(vectors[i].tobytes())
+            
+            self._append_records([
+                {"row": row, "id": vector_id, "text": text, "metadata": metadata}
+                for vector_id, row, text, metadata in zip(ids, rows, texts, metadatas)
+            ])
+            
+            if self.two_stage:
+                self._write_codes(new_vectors, [(row, vectors[i]) for i, row in overwrites])
+            
+            if self.has_ivf:
+                self._assign_rows(rows, vectors)
+            
+            # Last, so readers never see a count the other files do not cover yet
+            self.meta["count"] += len(new_rows)
+            self._save_meta()
+            
+            self._matrix = None
+    
+    def delete(self, ids: List[str]):
+        """
+        Delete vectors by ID (unknown IDs are ignored).
+        
+        Rows are tombstoned in records.jsonl and zeroed in vectors.f32;
+        searches skip them.
+        """
+        with self._write_lock():
+            rows = [self.row_of[vector_id] for vector_id in ids if vector_id in self.row_of]
+            if not rows:
+                return
+            
+            zeros = np.zeros(self.dimension, dtype=np.float32).tobytes()
+            with open(self.vectors_path, "r+b") as f:
+                for row in rows:
+                    f.seek(row * self.dimension * 4)
+                    f.write(zeros)
+            
+            self._append_records([
+                {"row": row, "id": self.records[row]["id"], "deleted": True}
+                for row in rows
+            ])
+            # Tells other processes to reload
+            self._save_meta()
+            
+            self._matrix = None
+    
+    def encode(self, quantization: Optional[str] = None, search_dimension: Optional[int] = None):
+        """
+        Change how search codes are stored, re-encoding every stored vector.
+        
+        Args:
+            quantization: "none", "int8" or "binary" (None keeps the current one)
+            search_dimension: Prefix dimensions for candidate search, 0 for
+                the full vectors (None keeps the current one)
+        """
+        quantization = quantization or self.quantization
+        if quantization not in QUANTIZATIONS:
+            raise ValueError(f"Unknown quantization {quantization!r}; use one of {QUANTIZATIONS}")
+        if search_dimension is None:
+            search_dimension = self.meta.get("search_dimension", 0)
+        if search_dimension < 0 or search_dimension > self.dimension:
+            raise ValueError(f"search_dimension must be between 0 and {self.dimension}")
+        
+        matrix = self.matrix()
+        
+        with self._write_lock():
+            for path, _, _ in self._code_specs():
+                path.unlink(missing_ok=True)
+            self.meta["quantization"] = quantization
+            self.meta["search_dimension"] = search_dimension
+            
+            if self.two_stage:
+                for i in range(0, len(matrix), SCAN_BLOCK_ROWS):
+                    self._write_codes(np.asarray(matrix[i:i + SCAN_BLOCK_ROWS]), [])
+            
+            self._save_meta()
+            self._codes = None
+        
+        if len(matrix) and self.two_stage:
+            print(f" Encoded {len(matrix)} vectors as {quantization} codes of "
+                  f"{self.search_dimension} dimensions ({self.bytes_per_vector} bytes per vector)")
+    
+    def build_ivf(self, nlist: Optional[int] = None, iterations: int = 10, seed: int = 0):
+        """
+        Train IVF centroids (spherical k-means) and assign every vector.
+        
+        Args:
+            nlist: Number of clusters (default: sqrt(count))
+            iterations: k-means iterations
+            seed: Random seed for centroid initialization
+        """
+        matrix = self.matrix()
+        if len(matrix) == 0:
+            return
+        
+        nlist = min(nlist or max(1, int(np.sqrt(len(matrix)))), len(matrix))
+        rng = np.random.default_rng(seed)
+        
+        # Train on a sample to keep build time bounded on large corpora
+        sample_size = min(len(matrix), nlist * 256)
+        sample = np.asarray(matrix[np.sort(rng.choice(len(matrix), sample_size, replace=False))])
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.mean(axis=0)
+            centroids = normalize_rows(centroids)
+        
+        with self._write_lock():
+            self.centroids = centroids
+            np.save(self.centroids_path, centroids)
+            
+            assign = np.concatenate([
+                np.argmax(np.asarray(matrix[i:i + 65536]) @ centroids.T, axis=1)
+                for i in range(0, len(matrix), 65536)
+            ]).astype(np.int32)
+            assign.tofile(self.assign_path)
+            self._ivf_lists = None
+            self._save_meta()
+        
+        print(f" Built IVF index: {nlist} lists over {len(matrix)} vectors")
+    
+    # ------------------------------------------------------------------
+    # Reads
+    # ------------------------------------------------------------------
+    
+    def matrix(self) -> np.ndarray:
+        """The (count x dimension) memory-mapped vector matrix."""
+        matrix = self._matrix
+        if matrix is None:
+            with self._lock:
+                if self.count == 0:
+                    matrix = np.zeros((0, self.dimension), dtype=np.float32)
+                else:
+                    matrix = np.memmap(
+                        self.vectors_path, dtype=np.float32, mode="r",
+                        shape=(self.count, self.dimension)
+                    )
+                self._matrix = matrix
+        return matrix
+    
+    def codes(self) -> List[np.ndarray]:
+        """The in-memory search codes (float prefixes, int8 codes and scales, or packed sign bits)."""
+        codes = self._codes
+        if codes is None:
+            with self._lock:
+                # A writer may have appended rows it has not counted yet
+                codes = [
+                    np.fromfile(path, dtype=dtype, count=self.count * width).reshape(self.count, width)
+                    if self.count else np.zeros((0, width), dtype=dtype)
+                    for path, dtype, width in self._code_specs()
+                ]
+                self._codes = codes
+        return codes
+    
+    def search(self, query, k: int = 4, mode: str = LOCAL_INDEX_SEARCH,
+               nprobe: int = LOCAL_INDEX_NPROBE,
+               rescore_factor: int = LOCAL_INDEX_RESCORE_FACTOR) -> List[Tuple[int, float]]:
+        """
+        Top-k cosine search.
+        
+        Args:
+            query: Query embedding
+            k: Number of results
+            mode: "exact", "ivf", or "auto" (IVF when built, else exact)
+            nprobe: IVF lists to scan
+            rescore_factor: Two-stage index only: candidates rescored with
+                float vectors per result (0 = default for the quantization)
+        
+        Returns:
+            List of (row, similarity), best first
+        """
+        self.refresh()
+        matrix = self.matrix()
+        if len(matrix) == 0:
+            return []
+        
+        query = normalize_rows(query).reshape(-1)
+        
+        candidates = None
+        use_ivf = mode == "ivf" or (mode == "auto" and self.has_ivf)
+        if use_ivf and self.has_ivf:
+            candidates = self._ivf_candidates(query, nprobe)
+            if self.deleted_rows:
+                candidates = candidates[~np.isin(candidates, list(self.deleted_rows))]
+        
+        if self.two_stage:
+            factor = rescore_factor or DEFAULT_RESCORE_FACTORS[self.quantization]
+            return self._two_stage_search(query, k, candidates, factor)
+        
+        if candidates is not None:
+            scores = np.asarray(matrix[candidates]) @ query
+            best = top_k(scores, k)
+            return [(int(candidates[i]), float(scores[i])) for i in best]
+        
+        scores = np.asarray(matrix @ query)
+        if self.deleted_rows:
+            scores[list(self.deleted_rows)] = -np.inf
+        best = top_k(scores, min(k, self.size))
+        return [(int(i), float(scores[i])) for i in best]
+    
+    def refresh(self):
+        """Pick up writes another process (e.g. local_embed.py) saved since the last check."""
+        try:
+            version = self._stat_meta()
+        except FileNotFoundError:
+            return
+        if version != self._meta_version:
+            with self._lock:
+                self._reload()
+    
+    def document(self, row: int) -> Document:
+        """The stored chunk at a row, as a LangChain Document."""
+        record = self.records[row]
+        return Document(id=record["id"], page_content=record["text"], metadata=record["metadata"])
+    
+    # ------------------------------------------------------------------
+    # Internals
+    # ------------------------------------------------------------------
+    
+    def _two_stage_search(self, query: np.ndarray, k: int,
+                          candidates: Optional[np.ndarray], factor: int) -> List[Tuple[int, float]]:
+        """Rank rows by their codes, then rescore the best k x factor with float vectors."""
+        rows = candidates if candidates is not None else np.arange(self.count)
+        scores = self._code_scores(query, candidates)
+        if candidates is None and self.deleted_rows:
+            scores[list(self.deleted_rows)] = -np.inf
+        
+        live = len(rows) if candidates is not None else self.size
+        # Sorted rows read the memory-mapped float matrix sequentially
+        shortlist = np.sort(rows[top_k(scores, min(k * factor, live))])
+        
+        exact = np.asarray(self.matrix()[shortlist]) @ query
+        best = top_k(exact, min(k, len(shortlist)))
+        return [(int(shortlist[i]), float(exact[i])) for i in best]
+    
+    def _code_scores(self, query: np.ndarray, rows: Optional[np.ndarray]) -> np.ndarray:
+        """Approximate similarity of the query to every row (or the given rows) from codes."""
+        codes = self.codes()
+        if rows is not None:
+            codes = [code[rows] for code in codes]
+        n = len(codes[0])
+        scores = np.empty(n, dtype=np.float32)
+        query = truncate_rows(query, self.search_dimension)
+        
+        if self.quantization == "none":
+            prefixes = codes[0]
+            for i in range(0, n, SCAN_BLOCK_ROWS):
+                block = slice(i, i + SCAN_BLOCK_ROWS)
+                scores[block] = prefixes[block] @ query
+        elif self.quantization == "int8":
+            values, scales = codes
+            for i in range(0, n, SCAN_BLOCK_ROWS):
+                block = slice(i, i + SCAN_BLOCK_ROWS)
+                scores[block] = (values[block].astype(np.float32) @ query) * scales[block, 0]
+        else:
+            bits = codes[0]
+            query_bits = quantize_binary(query[None, :])[0]
+            for i in range(0, n, SCAN_BLOCK_ROWS):
+                block = slice(i, i + SCAN_BLOCK_ROWS)
+                # Fewer differing sign bits = more similar
+                scores[block] = -popcount(bits[block] ^ query_bits).sum(axis=1, dtype=np.int32)
+        
+        return scores
+    
+    def _code_specs(self) -> List[Tuple[Path, type, int]]:
+        """(file, dtype, values per row) of each code array of the current encoding."""
+        width = self.search_dimension
+        if self.quantization == "int8":
+            return [(self.path / "codes.i8", np.int8, width),
+                    (self.path / "codes_scale.f32", np.float32, 1)]
+        if self.quantization == "binary":
+            return [(self.path / "codes.b1", np.uint8, (width + 7) // 8)]
+        if width < self.dimension:
+            return [(self.path / "codes.f32", np.float32, width)]
+        return []
+    
+    def _encode(self, vectors: np.ndarray) -> List[np.ndarray]:
+        vectors = truncate_rows(vectors, self.search_dimension)
+        if self.quantization == "none":
+            return [vectors]
+        if self.quantization == "int8":
+            return list(quantize_int8(vectors))
+        return [quantize_binary(vectors)]
+    
+    def _write_codes(self, new_vectors: np.ndarray, overwrites: List[Tuple[int, np.ndarray]]):
+        """Append codes for new rows and re-encode overwritten rows in place."""
+        specs = self._code_specs()
+        
+        for (path, _, _), codes in zip(specs, self._encode(new_vectors)):
+            with open(path, "ab") as f:
+                f.write(codes.tobytes())
+        
+        if overwrites:
+            rows = [row for row, _ in overwrites]
+            encoded = self._encode(np.stack([vector for _, vector in overwrites]))
+            for (path, dtype, width), codes in zip(specs, encoded):
+                row_bytes = np.dtype(dtype).itemsize * width
+                with open(path, "r+b") as f:
+                    for row, code in zip(rows, codes):
+                        f.seek(row * row_bytes)
+                        f.write(code.tobytes())
+        
+        self._codes = None
+    
+    def _ivf_candidates(self, query: np.ndarray, nprobe: int) -> np.ndarray:
+        lists = self._ivf_lists
+        if lists is None:
+            assign = np.fromfile(self.assign_path, dtype=np.int32, count=self.count)
+            order = np.argsort(assign, kind="stable")
+            bounds = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1))
+            lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+            self._ivf_lists = lists
+        
+        probe = top_k(self.centroids @ query, nprobe)
+        return np.sort(np.concatenate([lists[c] for c in probe]))
+    
+    def _assign_rows(self, rows: List[int], vectors: np.ndarray):
+        """Assign new/overwritten rows to their nearest IVF centroid."""
+        assign = np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int32)
+        with open(self.assign_path, "r+b" if self.assign_path.exists() else "wb") as f:
+            for row, cluster in zip(rows, assign):
+                f.seek(row * 4)
+                f.write(cluster.tobytes())
+        self._ivf_lists = None
+    
+    def _set_record(self, record: dict):
+        row = record["row"]
+        if row == len(self.records):
+            self.records.append(record)
+        else:
+            self.records[row] = record
+        
+        if record.get("deleted"):
+            self.deleted_rows.add(row)
+            if self.row_of.get(record["id"]) == row:
+                del self.row_of[record["id"]]
+        else:
+            self.deleted_rows.discard(row)
+            self.row_of[record["id"]] = row
+    
+    def _load_records(self):
+        """Apply the records appended since the last load (all of them the first time)."""
+        if not self.records_path.exists():
+            return
+        if self.records_path.stat().st_size < self._records_offset:
+            # The index was rebuilt from scratch
+            self.records, self.row_of, self.deleted_rows = [], {}, set()
+            self._records_offset = 0
+        with open(self.records_path, "rb") as f:
+            f.seek(self._records_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Still being written
+                    break
+                self._records_offset += len(line)
+                if line.strip():
+                    self._set_record(json.loads(line))
+    
+    def _append_records(self, records: List[dict]):
+        with open(self.records_path, "ab") as f:
+            for record in records:
+                f.write(json.dumps(record).encode("utf-8") + b"\n")
+                self._set_record(record)
+            self._records_offset = f.tell()
+    
+    def _stat_meta(self) -> Tuple[int, int]:
+        # meta.json is replaced on every write, so its inode changes too
+        stat = self.meta_path.stat()
+        return stat.st_ino, stat.st_mtime_ns
+    
+    def _reload(self):
+        """Re-read meta.json and new records, and drop cached arrays (caller holds self._lock)."""
+        version = self._stat_meta()
+        if version == self._meta_version:
+            return
+        self._meta_version = version
+        self.meta = json.loads(self.meta_path.read_text())
+        self._load_records()
+        self.centroids = np.load(self.centroids_path) if self.centroids_path.exists() else None
+        self._matrix = None
+        self._codes = None
+        self._ivf_lists = None
+    
+    @contextmanager
+    def _write_lock(self):
+        """Serialize writes across threads and processes, starting from the latest state on disk."""
+        with self._lock, open(self.lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            self._reload()
+            yield
+            # Closing the file releases the lock
+    
+    def _save_meta(self):
+        tmp_path = self.meta_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.meta, indent=2))
+        os.replace(tmp_path, self.meta_path)
+        self._meta_version = self._stat_meta()
+
+
+class SentenceTransformerEmbeddings:
+    """
+    Query/document embeddings from a local sentence-transformers model.
+    
+    Used when the local index was built by local_embed.py, so queries are
+    embedded with the same model as the stored chunks (fully offline).
+    Outputs larger than the index dimension are truncated and renormalized
+    like local_embed.py truncates the stored vectors (EMBED_DIM).
+    """
+    
+    query_cache = None
+    
+    def __init__(self, model_name: str, dimension: Optional[int] = None,
+                 query_prefix: str = LOCAL_QUERY_PREFIX):
+        from sentence_transformers import SentenceTransformer
+        
+        self.model_name = model_name
+        self.dimension = dimension
+        self.query_prefix = query_prefix
+        self.model = SentenceTransformer(model_name)
+    
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        embeddings = self.model.encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+        if self.dimension and embeddings.shape[1] > self.dimension:
+            embeddings = truncate_rows(embeddings, self.dimension)
+        return embeddings.tolist()
+    
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        return self.embed_queries([text])[0]
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_documents([self.query_prefix + text for text in texts])
+    
+    async def aembed_query(self, text: str, **kwargs) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+    
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_queries, texts)
+
+
+class LocalVectorStoreManager(VectorStoreBackend):
+    """Vector store backend over a LocalVectorIndex (no network for search)."""
+    
+    def __init__(self, path: str):
+        """
+        Open the local index, creating an empty Gemini-compatible one if needed.
+        
+        Query embeddings come from the model recorded in meta.json.
+        """
+        from .vector_store import EMBEDDING_DIM, EMBEDDING_MODEL, create_gemini_embeddings
+        
+        print(f"\n Opening local vector index: {path}")
+        
+        self.index = LocalVectorIndex(
+            path,
+            dimension=None if Path(path, "meta.json").exists() else EMBEDDING_DIM,
+            model=EMBEDDING_MODEL,
+            quantization=LOCAL_INDEX_QUANTIZATION or None,
+            search_dimension=LOCAL_INDEX_SEARCH_DIM or None
+        )
+        self.index_name = str(self.index.path)
+        self.manifest_target = local_target(path)
+        
+        if self.index.model in (None, EMBEDDING_MODEL):
+            self.embeddings = create_gemini_embeddings()
+        else:
+            self.embeddings = SentenceTransformerEmbeddings(self.index.model, self.index.dimension)
+        
+        print(f" Local index: {self.index.size} vectors, dim {self.index.dimension}, "
+              f"model {self.index.model}, IVF {'on' if self.index.has_ivf else 'off'}, "
+              f"quantization {self.index.quantization}, "
+              f"search dim {self.index.search_dimension}")
+        
+        if self.index.size == 0:
+            print(" Index is empty. Run local_embed.py with VECTOR_BACKEND=local to add documents.")
+    
+    def search_by_vector_with_score(self, embedding: List[float],
+                                    k: int = 4) -> List[Tuple[Document, float]]:
+        return [
+            (self.index.document(row), score)
+            for row, score in self.index.search(embedding, k=k)
+        ]
+    
+    async def asearch_by_vector_with_score(self, embedding: List[float],
+                                           k: int = 4) -> List[Tuple[Document, float]]:
+        # A large or cold (memory-mapped) index can take a while; keep the loop free
+        return await asyncio.to_thread(self.search_by_vector_with_score, embedding, k)
+    
+    def add_documents(self, documents: List[Document], save_keyword_index: bool = True):
+        texts = [doc.page_content for doc in documents]
+        ids = [
+            doc.id or hashlib.sha1(text.encode("utf-8")).hexdigest()
+            for doc, text in zip(documents, texts)
+        ]
+        
+        print(f" Adding {len(documents)} documents to local index...")
+        
+        metadatas = [dict(doc.metadata) for doc in documents]
+        vectors = self.embeddings.embed_documents(texts)
+        self.index.add(ids, vectors, texts, metadatas)
+        
+        self.keyword_index.add_documents(ids, texts, metadatas)
+        if save_keyword_index:
+            self.keyword_index.save()
+        
+        if not self.index.has_ivf and self.index.count >= IVF_MIN_VECTORS:
+            self.index.build_ivf()
+    
+    def delete_documents(self, ids: List[str], save_keyword_index: bool = True):
+        self.index.delete(ids)
+        
+        self.keyword_index.delete(ids)
+        if save_keyword_index:
+            self.keyword_index.save()
+    
+    def stats(self) -> dict:
+        self.index.refresh()
+        return {
+            "backend": "local",
+            "index_name": self.index_name,
+            "dimension": self.index.dimension,
+            "total_vectors": self.index.size,
+            "model": self.index.model,
+            "ivf": self.index.has_ivf,
+            "quantization": self.index.quantization,
+            "search_dimension": self.index.search_dimension,
+            "bytes_per_vector": self.index.bytes_per_vector,
+            "embedding_cache": self.embeddings.query_cache.stats() if self.embeddings.query_cache else None
+        }
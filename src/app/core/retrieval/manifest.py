@@ -0,0 +1,112 @@
+"""
+Index manifest for incremental, content-addressed re-indexing.
+
+Chunk IDs are derived from the source file name and the chunk's page and
+text, so an unchanged chunk keeps its ID across runs and edits to a file
+only produce new IDs for the chunks that changed. The manifest records,
+per index ("target") and source file, the file hash and the chunk IDs
+last written. Indexers use it to:
+    - skip a file whose hash is unchanged (no parsing, no embedding)
+    - embed and upsert only chunk IDs missing from the manifest
+    - delete chunk IDs the new version of the file no longer produces
+"""
+
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Iterable, List, Optional, Set
+
+
+INDEX_MANIFEST_PATH = os.getenv("INDEX_MANIFEST_PATH", "index_manifest.json")
+
+
+def chunk_id(source: str, page, text: str) -> str:
+    """Content-addressed vector ID: <source hash>_<page + text hash>."""
+    source_hash = hashlib.sha256(source.encode("utf-8")).hexdigest()[:12]
+    content_hash = hashlib.sha256(f"{page}\n{text}".encode("utf-8")).hexdigest()[:20]
+    return f"{source_hash}_{content_hash}"
+
+
+def pinecone_target(index_name: str, namespace: str = "") -> str:
+    return f"pinecone:{index_name}:{namespace or ''}"
+
+
+def local_target(path: str) -> str:
+    return f"local:{os.path.abspath(path)}"
+
+
+class IndexManifest:
+    """JSON file of {target: {source: {"file_hash", "chunk_ids"}}}."""
+    
+    def __init__(self, path: str = INDEX_MANIFEST_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self.data = {}
+        self._loaded_mtime = None
+        self._refresh()
+    
+    def _refresh(self):
+        """Reload if another process (an indexing script or the API) saved a newer version."""
+        try:
+            mtime = self.path.stat().st_mtime
+        except FileNotFoundError:
+            return
+        if mtime != self._loaded_mtime:
+            self.data = json.loads(self.path.read_text(encoding="utf-8"))
+            self._loaded_mtime = mtime
+    
+    def file_hash(self, target: str, source: str) -> Optional[str]:
+        """Hash of the fully indexed version of a source (None if never completed)."""
+        with self._lock:
+            self._refresh()
+            return self.data.get(target, {}).get(source, {}).get("file_hash")
+    
+    def chunk_ids(self, target: str, source: str) -> Set[str]:
+        """Chunk IDs currently indexed for a source."""
+        with self._lock:
+            self._refresh()
+            return set(self.data.get(target, {}).get(source, {}).get("chunk_ids", []))
+    
+    def record(self, target: str, source: str, file_hash: Optional[str],
+               chunk_ids: Iterable[str]):
+        """
+        Record the chunks indexed for a source and save the manifest.
+        
+        Args:
+            target: Index the chunks were written to
+            source: Source file name
+            file_hash: File hash, or None when indexing stopped part way
+                (the next run then re-checks every chunk)
+            chunk_ids: Chunk IDs now present in the index
+        """
+        with self._lock:
+            self._refresh()
+            self.data.setdefault(target, {})[source] = {
+                "file_hash": file_hash,
+                "chunk_ids": sorted(chunk_ids)
+            }
+            self._save()
+    
+    def clear(self, target: str):
+        """Forget every source of an index (after the index itself was wiped)."""
+        with self._lock:
+            self._refresh()
+            if self.data.pop(target, None) is not None:
+                self._save()
+    
+    def sources(self, target: str) -> List[str]:
+        with self._lock:
+            self._refresh()
+            return list(self.data.get(target, {}))
+    
+    def _save(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        tmp_path.write_text(json.dumps(self.data), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+        self._loaded_mtime = self.path.stat().st_mtime
+
+
+index_manifest = IndexManifest(INDEX_MANIFEST_PATH)
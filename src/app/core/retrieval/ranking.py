@@ -0,0 +1,58 @@
+"""Deduplication and rank fusion for multi-query retrieval results."""
+
+import hashlib
+from typing import Dict, List, Tuple
+
+from langchain_core.documents import Document
+
+
+# Standard RRF damping constant (Cormack et al.)
+RRF_K = 60
+
+
+def document_key(doc: Document) -> str:
+    """
+    Stable identity for a chunk: its vector ID, or a content hash when
+    the store did not return one.
+    """
+    if doc.id:
+        return doc.id
+    return hashlib.sha1(doc.page_content.encode("utf-8")).hexdigest()
+
+
+def reciprocal_rank_fusion(result_lists: List[List[Tuple[Document, float]]],
+                           k: int = RRF_K) -> List[Document]:
+    """
+    Merge ranked result lists from several queries into one list.
+    
+    Each chunk scores sum(1 / (k + rank)) over the lists it appears in,
+    so chunks found by several sub-questions rise to the top and appear
+    only once.
+    
+    Args:
+        result_lists: One list of (document, similarity) per query,
+            best match first
+        k: RRF damping constant
+        
+    Returns:
+        Deduplicated documents, best first. metadata["rrf_score"] holds the
+        fused score and metadata["score"] the best raw similarity.
+    """
+    fused: Dict[str, float] = {}
+    best: Dict[str, Tuple[Document, float]] = {}
+    
+    for results in result_lists:
+        for rank, (doc, score) in enumerate(results, 1):
+            key = document_key(doc)
+            fused[key] = fused.get(key, 0.0) + 1.0 / (k + rank)
+            if key not in best or score > best[key][1]:
+                best[key] = (doc, score)
+    
+    ranked = []
+    for key in sorted(fused, key=fused.get, reverse=True):
+        doc, score = best[key]
+        metadata = dict(doc.metadata, rrf_score=round(fused[key], 6), score=score)
+        ranked.append(Document(id=doc.id, page_content=doc.page_content, metadata=metadata))
+    
+    return ranked
+
@@ -2,6 +2,11 @@
 
 from langchain_core.documents import Document
 from typing import List, Dict, Tuple
+import re
+
+
+# Words/numbers, and runs of the same punctuation mark (e.g. "====")
+TOKEN_PATTERN = re.compile(r"\w+|([^\w\s])\1*")
 
 
 def serialize_chunks_with_ids(docs: List[Document]) -> Tuple[str, Dict[str, dict]]:
@@ -27,11 +32,7 @@ def serialize_chunks_with_ids(docs: List[Document]) -> Tuple[str, Dict[str, dict
         context_parts.append(chunk_text)
         
         # Store citation info
-        citation_map[chunk_id] = {
-            "page": page,
-            "source": source,
-            "snippet": doc.page_content[:150] + "..." if len(doc.page_content) > 150 else doc.page_content
-        }
+        citation_map[chunk_id] = make_citation(doc)
     
     formatted_context = "\n" + "="*60 + "\n".join(context_parts)
     
@@ -55,4 +56,66 @@ def serialize_chunks_simple(docs: List[Document]) -> str:
         chunk_text = f"Chunk {i+1} (Page {page}):\n{doc.page_content}\n"
         context_parts.append(chunk_text)
     
-    return "\n" + "="*60 + "\n".join(context_parts)
\ No newline at end of file
+    return "\n" + "="*60 + "\n".join(context_parts)
+
+def make_citation(doc: Document) -> dict:
+    """Citation entry (page, source, snippet) for a document."""
+    return {
+        "page": doc.metadata.get("page", "unknown"),
+        "source": doc.metadata.get("source", "unknown"),
+        "snippet": doc.page_content[:150] + "..." if len(doc.page_content) > 150 else doc.page_content
+    }
+
+
+def count_tokens(text: str) -> int:
+    """
+    Fast local approximation of an LLM token count.
+    
+    Counts words and punctuation runs, adding one token per 8 extra
+    characters of long pieces, which tracks BPE tokenizers closely enough
+    for prompt budgeting without loading a tokenizer.
+    """
+    return sum(1 + len(match.group()) // 8 for match in TOKEN_PATTERN.finditer(text))
+
+
+def build_context(docs: List[Document], token_budget: int) -> Tuple[str, Dict[str, dict]]:
+    """
+    Pack ranked chunks into a context string bounded by a token budget.
+    
+    Chunks are taken in rank order (best first); a chunk that does not fit
+    is skipped so smaller lower-ranked chunks can still use the space.
+    
+    Args:
+        docs: Ranked LangChain Documents, best first
+        token_budget: Maximum approximate tokens for the whole context
+        
+    Returns:
+        Tuple of (formatted_context, citation_map)
+    """
+    context_parts = []
+    citation_map = {}
+    used = 0
+    separator = "=" * 60
+    separator_tokens = count_tokens(separator)
+    
+    for doc in docs:
+        chunk_id = f"C{len(context_parts) + 1}"
+        page = doc.metadata.get("page", "unknown")
+        source = doc.metadata.get("source", "unknown")
+        
+        chunk_text = f"[{chunk_id}] (Page {page}, {source})\n{doc.page_content}"
+        tokens = count_tokens(chunk_text) + separator_tokens
+        
+        if used + tokens > token_budget:
+            continue
+        
+        context_parts.append(chunk_text)
+        citation_map[chunk_id] = make_citation(doc)
+        used += tokens
+    
+    if not context_parts:
+        return "No relevant information found in the database.", {}
+    
+    formatted_context = "\n\n" + (separator + "\n\n").join(context_parts)
+    
+    return formatted_context, citation_map
@@ -4,21 +4,347 @@ from pinecone import Pinecone
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 from langchain_pinecone import PineconeVectorStore
 from langchain_core.documents import Document
-from typing import List
+from .base import VectorStoreBackend
+from .manifest import pinecone_target
+from ..lazy import Lazy
+from ..metrics import record_cache
+from ..ratelimit import QuotaLimiter, estimate_tokens, get_rate_limiter
+from collections import OrderedDict
+from array import array
+from typing import Any, List, Optional, Tuple
+import asyncio
+import hashlib
+import math
+import sqlite3
+import threading
+import weakref
 import os
 
 
+EMBEDDING_MODEL = "gemini-embedding-001"
+
+# Matryoshka prefix kept from the 3072-dim Gemini embeddings (must match the index)
+EMBEDDING_DIM = int(os.getenv("EMBEDDING_DIM", "768"))
+
+# Backend selection: "pinecone" or "local"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "pinecone").lower()
+LOCAL_INDEX_DIR = os.getenv("LOCAL_INDEX_DIR", "local_index")
+
+# Query embedding cache settings
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "")
+
+
+class EmbeddingCache:
+    """
+    Two-tier cache for query embeddings.
+    
+    The memory tier is an LRU bounded to max_entries. The optional disk
+    tier is a SQLite file of float32 vectors that survives restarts;
+    disk hits are promoted back into memory.
+    
+    Lookups and stores take a batch of texts: the disk tier is read with
+    one query and written in one transaction per batch. The async
+    versions serve the memory tier on the event loop and run SQLite in a
+    worker thread, so a slow disk never stalls other requests.
+    """
+    
+    def __init__(self, model: str, dimension: int, max_entries: int = 2048,
+                 db_path: Optional[str] = None):
+        self.model = model
+        self.dimension = dimension
+        self.max_entries = max_entries
+        self.db_path = db_path or None
+        
+        self._memory: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        # Separate lock so memory lookups never wait behind disk I/O
+        self._db_lock = threading.Lock()
+        self._db = None
+        
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        
+        if self.db_path:
+            self._db = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key TEXT PRIMARY KEY, vector BLOB NOT NULL)"
+            )
+            self._db.commit()
+    
+    def make_key(self, text: str) -> str:
+        """Build a cache key from normalized text, model name and dimension."""
+        normalized = " ".join(text.lower().split())
+        raw = f"{self.model}|{self.dimension}|{normalized}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    
+    def get(self, text: str) -> Optional[List[float]]:
+        """Return the cached embedding for text, or None on a miss."""
+        return self.get_many([text])[0]
+    
+    def get_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """
+        Look up several texts at once.
+        
+        Args:
+            texts: Query texts
+        
+        Returns:
+            One embedding per text, None for misses
+        """
+        keys = [self.make_key(text) for text in texts]
+        results = self._read_memory(keys)
+        
+        on_disk = {}
+        missing = [key for key, vector in zip(keys, results) if vector is None]
+        if missing and self._db is not None:
+            on_disk = self._read_disk(missing)
+        
+        return self._finish_lookup(keys, results, on_disk)
+    
+    async def aget_many(self, texts: List[str]) -> List[Optional[List[float]]]:
+        """Async get_many: memory hits on the loop, disk reads in a worker thread."""
+        keys = [self.make_key(text) for text in texts]
+        results = self._read_memory(keys)
+        
+        on_disk = {}
+        missing = [key for key, vector in zip(keys, results) if vector is None]
+        if missing and self._db is not None:
+            on_disk = await asyncio.to_thread(self._read_disk, missing)
+        
+        return self._finish_lookup(keys, results, on_disk)
+    
+    def put(self, text: str, vector: List[float]):
+        """Store an embedding in memory and, if enabled, on disk."""
+        self.put_many([text], [vector])
+    
+    def put_many(self, texts: List[str], vectors: List[List[float]]):
+        """Store embeddings in memory and, if enabled, on disk in one transaction."""
+        rows = self._write_memory(texts, vectors)
+        if self._db is not None:
+            self._write_disk(rows)
+    
+    async def aput_many(self, texts: List[str], vectors: List[List[float]]):
+        """Async put_many: the disk write runs in a worker thread."""
+        rows = self._write_memory(texts, vectors)
+        if self._db is not None:
+            await asyncio.to_thread(self._write_disk, rows)
+    
+    def _read_memory(self, keys: List[str]) -> List[Optional[List[float]]]:
+        with self._lock:
+            results = []
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                results.append(vector)
+            return results
+    
+    def _read_disk(self, keys: List[str]) -> dict:
+        # Stay well below SQLite's limit on bound parameters
+        found = {}
+        with self._db_lock:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                rows = self._db.execute(
+                    "SELECT key, vector FROM embeddings WHERE key IN "
+                    f"({', '.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                found.update((key, array("f", blob).tolist()) for key, blob in rows)
+        return found
+    
+    def _finish_lookup(self, keys: List[str], results: list, on_disk: dict) -> list:
+        """Fill in disk hits, promote them into memory and count the lookups."""
+        with self._lock:
+            for i, key in enumerate(keys):
+                if results[i] is not None:
+                    self.memory_hits += 1
+                elif key in on_disk:
+                    results[i] = on_disk[key]
+                    self._remember(key, results[i])
+                    self.disk_hits += 1
+                else:
+                    self.misses += 1
+        
+        for vector in results:
+            record_cache("embedding", vector is not None)
+        return results
+    
+    def _write_memory(self, texts: List[str], vectors: List[List[float]]) -> list:
+        rows = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = self.make_key(text)
+                self._remember(key, vector)
+                rows.append((key, array("f", vector).tobytes()))
+        return rows
+    
+    def _write_disk(self, rows: list):
+        with self._db_lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)", rows
+            )
+    
+    def _remember(self, key: str, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+    
+    def stats(self) -> dict:
+        """Hit/miss counters and tier sizes."""
+        disk_entries = None
+        if self._db is not None:
+            with self._db_lock:
+                disk_entries = self._db.execute(
+                    "SELECT COUNT(*) FROM embeddings"
+                ).fetchone()[0]
+        
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            hits = self.memory_hits + self.disk_hits
+            
+            return {
+                "model": self.model,
+                "dimension": self.dimension,
+                "memory_entries": len(self._memory),
+                "max_memory_entries": self.max_entries,
+                "disk_entries": disk_entries,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0
+            }
+
+
+def truncate_embedding(embedding: List[float], dimension: int = EMBEDDING_DIM) -> List[float]:
+    """
+    Keep the first `dimension` values of a Matryoshka embedding, renormalized.
+    
+    Only the full 3072-dim Gemini output is unit length; a plain prefix has
+    a smaller norm that differs per text, which skews dot-product scores.
+    """
+    prefix = embedding[:dimension]
+    norm = math.sqrt(sum(value * value for value in prefix))
+    if norm == 0:
+        return list(prefix)
+    return [value / norm for value in prefix]
+
+
 class TruncatedGoogleEmbeddings(GoogleGenerativeAIEmbeddings):
-    """Wraps Gemini embeddings to ensure 768 dimensions for Pinecone."""
-    def embed_documents(self, texts: List[str]) -> List[List[float]]:
-        embeddings = super().embed_documents(texts)
-        return [emb[:768] for emb in embeddings]
+    """Wraps Gemini embeddings to return renormalized EMBEDDING_DIM-dim prefixes."""
+    
+    # Optional EmbeddingCache for query embeddings
+    query_cache: Any = None
+    
+    def embed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        embed = super().embed_documents
+        embeddings = self._rate_limiter().call(
+            lambda: embed(texts, **kwargs), **self._quota_cost(texts, **kwargs)
+        )
+        return [truncate_embedding(emb) for emb in embeddings]
+        
+    def embed_query(self, text: str, **kwargs) -> List[float]:
+        if self.query_cache is not None and not kwargs:
+            return self.embed_queries([text])[0]
+        
+        embed = super().embed_query
+        embedding = self._rate_limiter().call(
+            lambda: embed(text, **kwargs), **self._quota_cost([text], task_type="RETRIEVAL_QUERY")
+        )
+        return truncate_embedding(embedding)
+    
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Embed search queries, using the query cache when configured.
+        
+        Cache misses are embedded together in one batch call.
+        """
+        if self.query_cache is None:
+            return self.embed_documents(texts, task_type="RETRIEVAL_QUERY")
+        
+        results = self.query_cache.get_many(texts)
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            vectors = self.embed_documents(missing_texts, task_type="RETRIEVAL_QUERY")
+            self.query_cache.put_many(missing_texts, vectors)
+            for i, vector in zip(missing, vectors):
+                results[i] = vector
+        
+        return results
+    
+    async def aembed_documents(self, texts: List[str], **kwargs) -> List[List[float]]:
+        embed = super().aembed_documents
+        embeddings = await self._rate_limiter().acall(
+            lambda: embed(texts, **kwargs), **self._quota_cost(texts, **kwargs)
+        )
+        return [truncate_embedding(emb) for emb in embeddings]
+    
+    async def aembed_query(self, text: str, **kwargs) -> List[float]:
+        if self.query_cache is not None and not kwargs:
+            return (await self.aembed_queries([text]))[0]
+        
+        embed = super().aembed_query
+        embedding = await self._rate_limiter().acall(
+            lambda: embed(text, **kwargs), **self._quota_cost([text], task_type="RETRIEVAL_QUERY")
+        )
+        return truncate_embedding(embedding)
+    
+    async def aembed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Async version of embed_queries."""
+        if self.query_cache is None:
+            return await self.aembed_documents(texts, task_type="RETRIEVAL_QUERY")
+        
+        results = await self.query_cache.aget_many(texts)
+        missing = [i for i, vector in enumerate(results) if vector is None]
+        
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            vectors = await self.aembed_documents(missing_texts, task_type="RETRIEVAL_QUERY")
+            await self.query_cache.aput_many(missing_texts, vectors)
+            for i, vector in zip(missing, vectors):
+                results[i] = vector
         
-    def embed_query(self, text: str) -> List[float]:
-        embedding = super().embed_query(text)
-        return embedding[:768]
+        return results
+    
+    def _rate_limiter(self) -> QuotaLimiter:
+        return get_rate_limiter(self.model, "embed")
+    
+    @staticmethod
+    def _quota_cost(texts: List[str], task_type: Optional[str] = None, **kwargs) -> dict:
+        # Each embedded text counts as one request against the embedding quota;
+        # document batches (ingestion) yield to query embeddings
+        return {
+            "requests": len(texts),
+            "tokens": sum(estimate_tokens(text) for text in texts),
+            "background": task_type != "RETRIEVAL_QUERY"
+        }
+
+
+def create_gemini_embeddings() -> TruncatedGoogleEmbeddings:
+    """Gemini query/document embeddings with the query embedding cache attached."""
+    embeddings = TruncatedGoogleEmbeddings(
+        model=EMBEDDING_MODEL,
+        google_api_key=os.getenv("GOOGLE_API_KEY")
+    )
+    
+    # Cache repeated query embeddings (memory LRU + optional SQLite file)
+    embeddings.query_cache = EmbeddingCache(
+        model=EMBEDDING_MODEL,
+        dimension=EMBEDDING_DIM,
+        max_entries=EMBEDDING_CACHE_SIZE,
+        db_path=EMBEDDING_CACHE_PATH
+    )
+    
+    return embeddings
 
-class PineconeVectorStoreManager:
+
+class PineconeVectorStoreManager(VectorStoreBackend):
     """Manages Pinecone vector store with Gemini embeddings."""
     
     def __init__(self):
@@ -28,12 +354,10 @@ class PineconeVectorStoreManager:
         # Initialize Pinecone
         self.pc = Pinecone(api_key=os.getenv("PINECONE_API_KEY"))
         self.index_name = os.getenv("PINECONE_INDEX_NAME", "ikms-rag")
+        self.manifest_target = pinecone_target(self.index_name)
 
-        # Use Truncated Gemini embeddings (forces 768 dims)
-        self.embeddings = TruncatedGoogleEmbeddings(
-            model="gemini-embedding-001",
-            google_api_key=os.getenv("GOOGLE_API_KEY")
-        )
+        # Use Truncated Gemini embeddings (renormalized EMBEDDING_DIM-dim prefixes)
+        self.embeddings = create_gemini_embeddings()
         
         # Connect to Pinecone index
         self.vector_store = PineconeVectorStore(
@@ -41,8 +365,16 @@ class PineconeVectorStoreManager:
             embedding=self.embeddings
         )
         
+        # Async searches use one long-lived index client per event loop:
+        # langchain_pinecone's own async client closes its shared session
+        # as soon as the first of several concurrent queries finishes
+        self._async_stores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PineconeVectorStore]" = (
+            weakref.WeakKeyDictionary()
+        )
+        
         # Get index stats
         index = self.pc.Index(self.index_name)
+        self.index_host = index.config.host
         stats = index.describe_index_stats()
         total_vectors = stats.get("total_vector_count", 0)
         
@@ -72,33 +404,148 @@ class PineconeVectorStoreManager:
         
         return results
     
-    def add_documents(self, documents: List[Document]):
+    def search_by_vector_with_score(self, embedding: List[float],
+                                    k: int = 4) -> List[Tuple[Document, float]]:
+        """
+        Semantic search with a precomputed embedding, keeping similarity scores.
+        
+        Returned documents carry their Pinecone vector ID in doc.id.
+        
+        Args:
+            embedding: Query embedding
+            k: Number of results
+            
+        Returns:
+            List of (document, similarity) pairs, best first
+        """
+        return self.vector_store.similarity_search_by_vector_with_score(embedding, k=k)
+    
+    async def asearch_by_vector_with_score(self, embedding: List[float],
+                                           k: int = 4) -> List[Tuple[Document, float]]:
+        """Async version of search_by_vector_with_score."""
+        store = await self._async_store()
+        return await store.asimilarity_search_by_vector_with_score(embedding, k=k)
+    
+    async def _async_store(self) -> PineconeVectorStore:
+        """
+        The running event loop's async store, with its index client kept open.
+        
+        An open store skips langchain_pinecone's per-call client context,
+        so concurrent searches share one aiohttp session until aclose().
+        """
+        loop = asyncio.get_running_loop()
+        store = self._async_stores.get(loop)
+        if store is not None:
+            return store
+        
+        store = PineconeVectorStore(
+            index=self.pc.IndexAsyncio(host=self.index_host),
+            embedding=self.embeddings
+        )
+        await store.__aenter__()
+        
+        existing = self._async_stores.setdefault(loop, store)
+        if existing is not store:
+            await store.aclose()
+        return existing
+    
+    async def aclose(self):
+        """Close the running event loop's async index client (app shutdown)."""
+        store = self._async_stores.pop(asyncio.get_running_loop(), None)
+        if store is not None:
+            await store.aclose()
+    
+    def add_documents(self, documents: List[Document], save_keyword_index: bool = True):
         """
         Add documents to Pinecone (with FREE Gemini embeddings).
         
         Args:
-            documents: List of documents to index
+            documents: List of documents to index; doc.id is used as vector ID when set
+            save_keyword_index: Persist the BM25 index afterwards
         """
         print(f" Adding {len(documents)} documents to Pinecone...")
         print("Generating embeddings with Gemini (FREE)...")
         
-        self.vector_store.add_documents(documents)
+        ids = self.vector_store.add_documents(documents)
+        
+        # Keep the BM25 keyword index in sync (same IDs as Pinecone)
+        self.keyword_index.add_documents(
+            ids,
+            [doc.page_content for doc in documents],
+            [dict(doc.metadata) for doc in documents]
+        )
+        if save_keyword_index:
+            self.keyword_index.save()
         
         print(f"Successfully indexed {len(documents)} documents!")
+    
+    def delete_documents(self, ids: List[str], save_keyword_index: bool = True):
+        """
+        Delete vectors from Pinecone by ID.
+        
+        Args:
+            ids: Vector IDs
+            save_keyword_index: Persist the BM25 index afterwards
+        """
+        if not ids:
+            return
+        
+        print(f" Deleting {len(ids)} stale vectors from Pinecone...")
+        
+        self.vector_store.delete(ids=ids)
+        
+        self.keyword_index.delete(ids)
+        if save_keyword_index:
+            self.keyword_index.save()
        
     
+    def stats(self) -> dict:
+        """Pinecone index statistics plus embedding cache counters."""
+        index = self.pc.Index(self.index_name)
+        stats = index.describe_index_stats()
+        
+        return {
+            "backend": "pinecone",
+            "index_name": self.index_name,
+            "dimension": stats.get("dimension"),
+            "total_vectors": stats.get("total_vector_count", 0),
+            "namespaces": stats.get("namespaces", {}),
+            "embedding_cache": self.embeddings.query_cache.stats()
+        }
+    
     def get_retriever(self, k: int = 4):
         """Get LangChain retriever interface."""
         return self.vector_store.as_retriever(search_kwargs={"k": k})
 
 
-# Initialize global instance
-print("\n" + "="*60)
-print("Starting IKMS Query Planner ..")
-print("="*60)
+def create_vector_store_manager() -> VectorStoreBackend:
+    """
+    Build the vector store backend selected by VECTOR_BACKEND.
+    
+    - pinecone (default): remote Pinecone index, Gemini query embeddings
+    - local: in-process NumPy index in LOCAL_INDEX_DIR (see local_store.py)
+    """
+    print("\n" + "="*60)
+    print("Starting IKMS Query Planner ..")
+    print("="*60)
+    
+    if VECTOR_BACKEND == "local":
+        from .local_store import LocalVectorStoreManager
+        manager = LocalVectorStoreManager(LOCAL_INDEX_DIR)
+    else:
+        manager = PineconeVectorStoreManager()
+    
+    print("="*60)
+    print(" System ready for queries!")
+    print("="*60 + "\n")
+    
+    return manager
+
+
+# Global instance, connected on first use (or by the API's startup warm-up)
+vector_store_manager: Lazy[VectorStoreBackend] = Lazy("vector_store", create_vector_store_manager)
 
-vector_store_manager = PineconeVectorStoreManager()
 
-print("="*60)
-print(" System ready for queries!")
-print("="*60 + "\n")
\ No newline at end of file
+def get_vector_store_manager() -> VectorStoreBackend:
+    """The process-wide vector store backend, created on first call."""
+    return vector_store_manager.get()
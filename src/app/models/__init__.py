@@ -1,12 +1,14 @@
 """Pydantic models for API requests and responses."""
 
 from pydantic import BaseModel
-from typing import List, Optional
+from typing import Dict, List, Optional
 
 
 class QARequest(BaseModel):
     """Request model for QA endpoint."""
     question: str
+    # Include per-stage timings, token counts and cache hits in the response
+    debug: bool = False
 
 
 class QAResponse(BaseModel):
@@ -15,4 +17,9 @@ class QAResponse(BaseModel):
     plan: Optional[str] = None
     sub_questions: Optional[List[str]] = None
     answer: str
-    context: Optional[str] = None
\ No newline at end of file
+    context: Optional[str] = None
+    citations: Optional[Dict[str, dict]] = None
+    verified: bool = False
+    cached: bool = False
+    # Per-request timings and counters (only when requested with debug=true)
+    debug: Optional[dict] = None
\ No newline at end of file
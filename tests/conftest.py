@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+# Importing the app must never need real keys
+os.environ.setdefault("GOOGLE_API_KEY", "test")
+os.environ.setdefault("PINECONE_API_KEY", "test")
@@ -0,0 +1,101 @@
+"""
+BM25 keyword index: one index per manifest target, and clearing it.
+"""
+
+import warnings
+
+from src.app.core.retrieval import bm25
+from src.app.core.retrieval.manifest import local_target, pinecone_target
+
+
+def test_targets_get_separate_directories(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "BM25_INDEX_DIR", str(tmp_path))
+    monkeypatch.setattr(bm25, "_indexes", {})
+    
+    pinecone = bm25.get_bm25_index(pinecone_target("ikms-rag"))
+    namespace = bm25.get_bm25_index(pinecone_target("ikms-rag", "team-a"))
+    local = bm25.get_bm25_index(local_target(str(tmp_path / "local_index")))
+    
+    assert len({pinecone.path, namespace.path, local.path}) == 3
+    assert all(index.path.parent == tmp_path for index in (pinecone, namespace, local))
+    assert bm25.get_bm25_index(pinecone_target("ikms-rag")) is pinecone
+    
+    pinecone.add_documents(["a"], ["vector database scalability"], [{}])
+    pinecone.save()
+    
+    assert local.search("vector database") == []
+    assert [doc.id for doc, _ in pinecone.search("vector database")] == ["a"]
+
+
+def test_clear_removes_documents_and_files(tmp_path):
+    index = bm25.BM25Index(tmp_path / "index")
+    index.add_documents(["a", "b"], ["vector database", "graph database"], [{}, {}])
+    index.save()
+    
+    index.clear()
+    
+    assert index.search("database") == []
+    assert not (tmp_path / "index").exists()
+    assert bm25.BM25Index(tmp_path / "index").num_docs == 0
+
+
+def test_save_appends_new_documents(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "BM25_COMPACT_RATIO", 1.0)
+    index = bm25.BM25Index(tmp_path)
+    index.add_documents(["a"], ["vector database"], [{}])
+    index.save()
+    index.add_documents(["b"], ["graph database"], [{}])
+    index.delete(["a"])
+    # Mark the saved line: a rewrite would replace it
+    docs_path = tmp_path / "docs.jsonl"
+    docs_path.write_text(docs_path.read_text().replace("vector database", "vector databasE"))
+    
+    index.save()
+    
+    # Tombstones live in postings.npz; existing lines are left as they are
+    lines = docs_path.read_text().splitlines()
+    assert "vector databasE" in lines[0] and len(lines) == 2
+    assert [doc.id for doc, _ in bm25.BM25Index(tmp_path).search("database")] == ["b"]
+
+
+def test_save_compacts_tombstones(tmp_path, monkeypatch):
+    monkeypatch.setattr(bm25, "BM25_COMPACT_RATIO", 0.4)
+    index = bm25.BM25Index(tmp_path)
+    index.add_documents(["a", "b", "c"], ["vector database", "graph database", "vector search"], [{}, {}, {}])
+    index.save()
+    index.add_documents(["a"], ["vector store"], [{}])
+    index.delete(["b"])
+    index.save()
+    
+    assert len(index.docs) == 2 and not index.deleted
+    assert "graph" not in index.vocab
+    
+    reloaded = bm25.BM25Index(tmp_path)
+    assert len((tmp_path / "docs.jsonl").read_text().splitlines()) == 2
+    assert reloaded.num_docs == 2
+    assert sorted(doc.page_content for doc, _ in reloaded.search("vector")) == ["vector search", "vector store"]
+    assert reloaded.search("graph") == []
+
+
+def test_load_ignores_lines_of_an_unfinished_save(tmp_path):
+    index = bm25.BM25Index(tmp_path)
+    index.add_documents(["a"], ["vector database"], [{}])
+    index.save()
+    with open(tmp_path / "docs.jsonl", "a") as f:
+        f.write('{"id": "x", "text": "stray", "metadata": {}}\n')
+    
+    reloaded = bm25.BM25Index(tmp_path)
+    reloaded.add_documents(["b"], ["graph database"], [{}])
+    reloaded.save()
+    
+    assert sorted(doc.id for doc, _ in bm25.BM25Index(tmp_path).search("database")) == ["a", "b"]
+
+
+def test_search_over_documents_without_terms(tmp_path):
+    index = bm25.BM25Index(tmp_path)
+    index.add_documents(["a", "b"], ["the and of", "a"], [{}, {}])
+    
+    # Every document has length 0: no division by a zero average length
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        assert index.search("the vector database") == []
@@ -0,0 +1,59 @@
+"""
+EmbeddingCache: batched disk tier and async lookups off the event loop.
+"""
+
+import asyncio
+import threading
+import time
+
+from src.app.core.retrieval.vector_store import EmbeddingCache
+
+
+def make_cache(tmp_path, max_entries=16):
+    return EmbeddingCache("model", 4, max_entries=max_entries, db_path=str(tmp_path / "cache.db"))
+
+
+def test_put_many_writes_one_transaction(tmp_path):
+    cache = make_cache(tmp_path)
+    statements = []
+    cache._db.set_trace_callback(statements.append)
+    
+    cache.put_many(["a", "b", "c"], [[1.0, 0, 0, 0], [0, 1.0, 0, 0], [0, 0, 1.0, 0]])
+    
+    assert sum(statement == "COMMIT" for statement in statements) == 1
+    assert cache.stats()["disk_entries"] == 3
+
+
+def test_disk_hits_survive_restart(tmp_path):
+    make_cache(tmp_path).put_many(["vector database"], [[0.5, 0.5, 0.5, 0.5]])
+    
+    cache = make_cache(tmp_path)
+    results = asyncio.run(cache.aget_many(["Vector  database", "unknown"]))
+    
+    assert results == [[0.5, 0.5, 0.5, 0.5], None]
+    assert (cache.disk_hits, cache.misses) == (1, 1)
+    # Promoted into memory
+    assert cache.get("vector database") == [0.5, 0.5, 0.5, 0.5]
+    assert cache.memory_hits == 1
+
+
+def test_async_lookup_does_not_block_the_loop(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.put_many(["cached"], [[1.0, 0, 0, 0]])
+    
+    async def main():
+        # Hold the disk tier like a slow write would
+        cache._db_lock.acquire()
+        threading.Timer(0.3, cache._db_lock.release).start()
+        
+        start = time.perf_counter()
+        disk_lookup = asyncio.create_task(cache.aget_many(["not in memory"]))
+        await asyncio.sleep(0.01)
+        
+        # Memory hits and other coroutines keep running meanwhile
+        assert await cache.aget_many(["cached"]) == [[1.0, 0, 0, 0]]
+        assert time.perf_counter() - start < 0.2
+        
+        assert await disk_lookup == [None]
+    
+    asyncio.run(main())
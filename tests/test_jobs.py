@@ -0,0 +1,37 @@
+"""
+Ingestion jobs invalidate the answer cache after every batch, not only
+when the job finishes.
+"""
+
+from src.app.core.answer_cache import answer_cache
+from src.app.core.jobs import COMPLETED, IngestionJob, IngestionJobQueue
+
+
+class BatchingManager:
+    """Indexes two batches and then deletes stale chunks, recording the cache generation."""
+    
+    def __init__(self):
+        self.generations = []
+    
+    def index_pdf(self, path, filename, on_progress, cancel_event):
+        self.generations.append(answer_cache.generation)
+        for added in (32, 64):
+            on_progress(chunks_embedded=added, vectors_upserted=added)
+            self.generations.append(answer_cache.generation)
+        on_progress(vectors_deleted=5)
+        self.generations.append(answer_cache.generation)
+        on_progress(pages_parsed=10)
+        self.generations.append(answer_cache.generation)
+
+
+def test_answer_cache_cleared_after_each_batch(tmp_path):
+    queue = IngestionJobQueue(upload_dir=str(tmp_path))
+    job = IngestionJob("a.pdf", tmp_path / "a.pdf")
+    manager = BatchingManager()
+    
+    queue._run(manager, job)
+    
+    start = manager.generations[0]
+    assert manager.generations == [start, start + 1, start + 2, start + 3, start + 3]
+    assert job.status == COMPLETED
+    assert (job.vectors_upserted, job.vectors_deleted) == (64, 5)
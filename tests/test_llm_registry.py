@@ -0,0 +1,64 @@
+"""
+LLMRegistry: role models share one pooled client and are rebuilt after aclose().
+"""
+
+import asyncio
+
+import pytest
+
+from src.app.core.lazy import registry
+from src.app.core.llm import LLMRegistry, chat_user_agent
+
+
+def test_chat_models_are_rebuilt_after_aclose(monkeypatch):
+    llms = LLMRegistry()
+    planner = llms.lazy_chat_model("test_planner_llm", "planner")
+    monkeypatch.delitem(registry, "test_planner_llm")
+    
+    first = planner.get()
+    first_pool = llms.pool(first.model)
+    asyncio.run(llms.aclose())
+    
+    assert first_pool.async_http_client.is_closed
+    assert not planner.ready
+    
+    second = planner.get()
+    assert second is not first
+    assert second.client is not first.client
+    assert not llms.pool(second.model).async_http_client.is_closed
+    asyncio.run(llms.aclose())
+
+
+def test_aclose_keeps_values_set_from_outside(monkeypatch):
+    llms = LLMRegistry()
+    planner = llms.lazy_chat_model("test_fake_llm", "planner")
+    monkeypatch.delitem(registry, "test_fake_llm")
+    fake = object()
+    planner.set(fake)
+    
+    asyncio.run(llms.aclose())
+    
+    assert planner.get() is fake
+
+
+def test_role_models_share_the_pooled_client(monkeypatch):
+    llms = LLMRegistry()
+    planner = llms.chat_model("planner")
+    verifier = llms.chat_model("verifier")
+    pool = llms.pool(planner.model)
+    
+    assert planner.client is pool.client and verifier.client is pool.client
+    headers = pool.client._api_client._http_options.headers
+    assert headers["user-agent"].endswith(chat_user_agent())
+    asyncio.run(llms.aclose())
+
+
+def test_attach_refuses_unknown_langchain_versions(monkeypatch):
+    import importlib.metadata
+    
+    llms = LLMRegistry()
+    monkeypatch.setattr(importlib.metadata, "version", lambda name: "5.0.0")
+    
+    with pytest.raises(RuntimeError, match="5.0.0"):
+        llms.chat_model("planner")
+    asyncio.run(llms.aclose())
@@ -0,0 +1,37 @@
+"""
+Open-loop load generation measures latency from the scheduled send time.
+"""
+
+import argparse
+import asyncio
+import random
+import time
+
+import httpx
+
+from benchmarks.loadgen import endpoint_cycle, run_open_step
+
+
+def test_open_loop_latency_counts_generator_stalls():
+    async def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/api/qa" and not handler.stalled:
+            # Block the event loop: requests due meanwhile are sent late
+            handler.stalled = True
+            time.sleep(0.3)
+        return httpx.Response(200, json={"answer": "ok"})
+    
+    handler.stalled = False
+    args = argparse.Namespace(duration=0, requests=10, arrival="uniform", max_in_flight=0)
+    
+    async def main():
+        transport = httpx.MockTransport(handler)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadgen") as client:
+            questions = iter(["What is a vector database?"] * 10)
+            return await run_open_step(client, questions, endpoint_cycle("qa"), 50, args, random.Random(0))
+    
+    report = asyncio.run(main()).report()
+    
+    assert report["ok"] == 10
+    assert report["max_send_lag_ms"] >= 200
+    # Requests due every 20 ms during the 300 ms stall waited for it too
+    assert report["latency"]["qa"]["p50_ms"] >= 100
@@ -0,0 +1,50 @@
+"""
+Searching a local index whose vectors were truncated (EMBED_DIM) below
+the output size of its sentence-transformers model.
+"""
+
+import asyncio
+import hashlib
+import sys
+import types
+
+import numpy as np
+
+from src.app.core.retrieval.local_store import LocalVectorIndex, LocalVectorStoreManager, truncate_rows
+
+
+class FakeSentenceTransformer:
+    """Deterministic 768-dim "model": one random unit vector per text."""
+    
+    def __init__(self, model_name: str):
+        self.model_name = model_name
+    
+    def encode(self, texts, normalize_embeddings=True, convert_to_numpy=True):
+        rows = []
+        for text in texts:
+            seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+            rows.append(np.random.default_rng(seed).normal(size=768))
+        vectors = np.array(rows, dtype=np.float32)
+        return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_truncated_index_is_searched_with_truncated_queries(tmp_path, monkeypatch):
+    monkeypatch.setitem(
+        sys.modules, "sentence_transformers",
+        types.SimpleNamespace(SentenceTransformer=FakeSentenceTransformer)
+    )
+    monkeypatch.setattr("src.app.core.retrieval.local_store.LOCAL_QUERY_PREFIX", "")
+    
+    # What local_embed.py writes with EMBED_DIM=256 for a 768-dim model
+    texts = ["vector databases", "graph databases", "relational databases"]
+    index = LocalVectorIndex(str(tmp_path), dimension=256, model="nomic-ai/nomic-embed-text-v1.5")
+    index.add(["a", "b", "c"], truncate_rows(FakeSentenceTransformer("").encode(texts), 256),
+              texts, [{}, {}, {}])
+    
+    manager = LocalVectorStoreManager(str(tmp_path))
+    embedding = asyncio.run(manager.aembed_queries(["graph databases"]))[0]
+    results = asyncio.run(manager.asearch_by_vector_with_score(embedding, k=1))
+    
+    assert len(embedding) == 256
+    assert results[0][0].id == "b"
+    assert results[0][1] > 0.99
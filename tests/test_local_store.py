@@ -0,0 +1,81 @@
+"""
+LocalVectorIndex writes: duplicate IDs in a batch, and writes made by
+another process (another LocalVectorIndex on the same directory).
+"""
+
+import asyncio
+import time
+
+import numpy as np
+
+from src.app.core.retrieval.local_store import LocalVectorIndex, LocalVectorStoreManager
+
+
+def unit(*values):
+    return np.array(values, dtype=np.float32)
+
+
+def test_duplicate_id_in_batch_keeps_last_row(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimension=3)
+    index.add(["a", "b", "a"], np.stack([unit(1, 0, 0), unit(0, 1, 0), unit(0, 0, 1)]),
+              ["first", "other", "last"], [{"n": 1}, {"n": 2}, {"n": 3}])
+    
+    assert index.count == 2
+    row, score = index.search(unit(0, 0, 1), k=1)[0]
+    assert index.document(row).id == "a"
+    assert index.document(row).page_content == "last"
+    assert index.document(row).metadata == {"n": 3}
+    assert score > 0.99
+    
+    # Same after reopening from disk
+    reopened = LocalVectorIndex(str(tmp_path))
+    assert reopened.count == 2
+    assert reopened.document(reopened.search(unit(0, 0, 1), k=1)[0][0]).page_content == "last"
+
+
+def test_reader_picks_up_another_writers_changes(tmp_path):
+    writer = LocalVectorIndex(str(tmp_path), dimension=3)
+    writer.add(["a"], unit(1, 0, 0)[None], ["a"], [{}])
+    reader = LocalVectorIndex(str(tmp_path))
+    assert reader.size == 1
+    
+    writer.add(["b", "c"], np.stack([unit(0, 1, 0), unit(0, 0, 1)]), ["b", "c"], [{}, {}])
+    hits = reader.search(unit(0, 1, 0), k=3)
+    assert reader.size == 3
+    assert reader.document(hits[0][0]).id == "b"
+    
+    writer.delete(["b"])
+    hits = reader.search(unit(0, 1, 0), k=3)
+    assert "b" not in {reader.document(row).id for row, _ in hits}
+    
+    # Writes start from the latest state, so rows never collide
+    reader.add(["d"], unit(1, 1, 0)[None], ["d"], [{}])
+    writer.add(["e"], unit(1, 0, 1)[None], ["e"], [{}])
+    final = LocalVectorIndex(str(tmp_path))
+    assert final.count == 5
+    assert sorted(final.row_of) == ["a", "c", "d", "e"]
+
+
+def test_async_search_runs_off_the_loop(tmp_path):
+    index = LocalVectorIndex(str(tmp_path), dimension=3)
+    index.add(["a"], unit(1, 0, 0)[None], ["a"], [{}])
+    search = index.search
+    
+    def slow_search(*args, **kwargs):
+        time.sleep(0.2)
+        return search(*args, **kwargs)
+    
+    index.search = slow_search
+    manager = LocalVectorStoreManager.__new__(LocalVectorStoreManager)
+    manager.index = index
+    
+    async def main():
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            manager.asearch_by_vector_with_score([1.0, 0.0, 0.0], k=1) for _ in range(3)
+        ))
+        return results, time.perf_counter() - start
+    
+    results, elapsed = asyncio.run(main())
+    assert [[doc.id for doc, _ in result] for result in results] == [["a"]] * 3
+    assert elapsed < 0.5
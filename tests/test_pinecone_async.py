@@ -0,0 +1,73 @@
+"""
+Concurrent async searches through PineconeVectorStoreManager.
+
+A local aiohttp server stands in for the Pinecone data plane, so the real
+pinecone / langchain_pinecone async clients are exercised end to end.
+"""
+
+import asyncio
+import itertools
+
+from aiohttp import web
+from langchain_core.embeddings import FakeEmbeddings
+from pinecone import Pinecone
+
+from src.app.core.retrieval.vector_store import PineconeVectorStoreManager
+
+
+async def start_fake_pinecone():
+    """Serve /query; each call answers later than the previous one."""
+    calls = itertools.count(1)
+    
+    async def query(request: web.Request) -> web.Response:
+        body = await request.json()
+        await asyncio.sleep(0.02 * next(calls))
+        return web.json_response({
+            "namespace": "",
+            "matches": [
+                {"id": f"doc_{i}", "score": 1 - i / 10, "metadata": {"text": f"chunk {i}", "page": i}}
+                for i in range(body["topK"])
+            ]
+        })
+    
+    app = web.Application()
+    app.router.add_post("/query", query)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://127.0.0.1:{port}"
+
+
+def make_manager(host: str) -> PineconeVectorStoreManager:
+    """A manager wired to `host` without the connection checks of __init__."""
+    manager = PineconeVectorStoreManager.__new__(PineconeVectorStoreManager)
+    manager.pc = Pinecone(api_key="test")
+    manager.index_host = host
+    manager.embeddings = FakeEmbeddings(size=8)
+    manager._async_stores = {}
+    return manager
+
+
+def test_concurrent_async_searches_share_one_open_session():
+    async def run():
+        runner, host = await start_fake_pinecone()
+        manager = make_manager(host)
+        try:
+            results = await asyncio.gather(
+                *(manager.asearch_by_vector_with_score([0.1] * 8, k=3) for _ in range(6))
+            )
+            # A later request on the same loop reuses the still-open client
+            again = await manager.asearch_by_vector_with_score([0.1] * 8, k=2)
+        finally:
+            await manager.aclose()
+            await runner.cleanup()
+        return results, again
+    
+    results, again = asyncio.run(run())
+    
+    assert [len(hits) for hits in results] == [3] * 6
+    assert results[0][0][0].id == "doc_0"
+    assert results[0][0][0].page_content == "chunk 0"
+    assert len(again) == 2
@@ -0,0 +1,65 @@
+"""
+Rate limiting: oversized charges are paid in full, and only quota errors are retried.
+"""
+
+import pytest
+from google.genai import errors
+from langchain_google_genai.chat_models import GoogleRateLimitError
+
+from src.app.core import ratelimit
+from src.app.core.ratelimit import QuotaLimiter, RateLimiter, is_retryable_error
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+    
+    def monotonic(self):
+        return self.now
+    
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(ratelimit, "time", clock)
+    return clock
+
+
+def test_reserve_charges_more_than_capacity_as_debt(clock):
+    limiter = RateLimiter(60)
+    
+    # 100 requests against a 60-request bucket: the 40 missing take 40s to refill
+    assert limiter.reserve(100) == pytest.approx(40)
+    assert limiter.reserve(1) == pytest.approx(41)
+
+
+def test_background_charges_are_split_across_refills(clock):
+    limiter = QuotaLimiter("embed", rpm=100, tpm=0, background_reserve=0.2)
+    
+    assert limiter.call(lambda: "done", requests=100, background=True) == "done"
+    
+    # 80 requests fit above the reserve at once; the other 20 wait for 20 more to refill
+    assert sum(clock.slept) == pytest.approx(12)
+    assert limiter.requests.stats()["available"] == pytest.approx(20)
+    assert limiter.calls == 1
+
+
+def test_retries_only_quota_and_overload_statuses():
+    quota = errors.ClientError(429, {"error": {"code": 429, "status": "RESOURCE_EXHAUSTED", "message": "quota"}})
+    overload = errors.ServerError(503, {"error": {"code": 503, "status": "UNAVAILABLE", "message": "overloaded"}})
+    internal = errors.ServerError(500, {"error": {"code": 500, "status": "INTERNAL", "message": "retry 503 times"}})
+    
+    assert is_retryable_error(quota) and is_retryable_error(overload)
+    assert not is_retryable_error(internal)
+    assert not is_retryable_error(ValueError("row 429 is RESOURCE_EXHAUSTED"))
+    
+    # langchain re-raises SDK errors as its own types
+    try:
+        raise GoogleRateLimitError("Error calling model") from quota
+    except GoogleRateLimitError as e:
+        assert is_retryable_error(e)
@@ -0,0 +1,62 @@
+"""
+run_retrievals: BM25 searches run off the event loop.
+"""
+
+import asyncio
+import threading
+import time
+
+from langchain_core.documents import Document
+
+from src.app.core.agents import agents
+from src.app.core.retrieval.bm25 import BM25Index
+from src.app.core.retrieval.vector_store import vector_store_manager
+
+
+class KeywordOnlyManager:
+    """Backend whose dense search returns nothing; only the BM25 index has documents."""
+    
+    def __init__(self):
+        self.keyword_index = BM25Index()
+        self.keyword_index.add_documents(
+            ["a", "b"], ["vector database scalability", "graph database"], [{}, {}]
+        )
+    
+    async def aembed_queries(self, queries):
+        return [[1.0, 0.0] for _ in queries]
+    
+    async def asearch_by_vector_with_score(self, embedding, k=4):
+        return [(Document(id="dense", page_content="dense"), 1.0)]
+
+
+def test_keyword_searches_do_not_block_the_loop(monkeypatch):
+    manager = KeywordOnlyManager()
+    monkeypatch.setattr(vector_store_manager, "_value", manager)
+    monkeypatch.setattr(vector_store_manager, "_ready", True)
+    monkeypatch.setattr(agents, "HYBRID_SEARCH", True)
+    
+    async def main():
+        # An ingestion thread saving the index holds its lock
+        manager.keyword_index._lock.acquire()
+        threading.Timer(0.3, manager.keyword_index._lock.release).start()
+        
+        keyword_results = []
+        retrieval = asyncio.create_task(agents.run_retrievals(
+            ["vector database scalability", "How do graph databases scale?"],
+            keyword_results=keyword_results
+        ))
+        
+        start = time.perf_counter()
+        await asyncio.sleep(0.05)
+        loop_delay = time.perf_counter() - start - 0.05
+        
+        return await retrieval, keyword_results, loop_delay
+    
+    results, keyword_results, loop_delay = asyncio.run(main())
+    
+    assert loop_delay < 0.1
+    assert [doc.id for doc, _ in results[0]][0] == "a"
+    assert [doc.id for doc, _ in results[1]] == ["dense"]
+    # Hybrid pass: BM25 ranking of the natural-language query only
+    assert len(keyword_results) == 1
+    assert [doc.id for doc, _ in keyword_results[0]][0] == "b"